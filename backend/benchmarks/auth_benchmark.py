@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Стоимость аутентификации одного запроса: Basic (PBKDF2), Bearer-токен и сессия
+
+Запуск: python benchmarks/auth_benchmark.py --repeat 50 --output auth.json
+Для каждого способа мерится отдельно вызов класса аутентификации DRF и полный
+запрос GET /api/profile/ через тестовый клиент со всеми middleware. Данные
+создаются во временной тестовой базе, хешер паролей — из настроек проекта.
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carspark_backend.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.auth.middleware import get_user
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import setup_test_environment
+from django.utils.functional import SimpleLazyObject
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.request import Request
+
+from benchmarks.catalog_benchmark import percentile
+from cars.authentication import BearerTokenAuthentication, CsrfExemptSessionAuthentication
+from cars.models import Admin
+from cars.tokens import issue_tokens, state_key
+
+EMAIL = 'auth-bench@example.com'
+PASSWORD = 'bench-password-123'
+
+
+def summary(timings):
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+    }
+
+
+def measure(func, repeat, warmup, before=None):
+    timings = []
+    for index in range(warmup + repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        func()
+        if index >= warmup:
+            timings.append((time.perf_counter() - started) * 1000)
+    return summary(timings)
+
+
+def authenticator_call(authenticator, make_request):
+    def call():
+        result = authenticator.authenticate(Request(make_request()))
+        assert result is not None, f'{type(authenticator).__name__} не аутентифицировал запрос'
+    return call
+
+
+def request_call(client, headers):
+    def call():
+        response = client.get('/api/profile/', **headers)
+        assert response.status_code == 200, response.status_code
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50, help='замеряемых вызовов на способ')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', default=None, help='JSON с результатами')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        admin = Admin.objects.create_user(username=EMAIL, email=EMAIL, password=PASSWORD)
+        tokens = issue_tokens(admin)
+        session_id = admin.auth_tokens.get().pk
+        basic = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(f'{EMAIL}:{PASSWORD}'.encode()).decode()}
+        bearer = {'HTTP_AUTHORIZATION': f'Bearer {tokens["access"]}'}
+
+        session_client = Client()
+        session_client.force_login(admin)
+        session_key = session_client.session.session_key
+        factory = RequestFactory()
+
+        def header_request(headers):
+            return lambda: factory.get('/api/profile/', **headers)
+
+        def session_request():
+            # Как SessionMiddleware и AuthenticationMiddleware: сессия и пользователь читаются заново
+            request = factory.get('/api/profile/')
+            request.session = SessionStore(session_key=session_key)
+            request.user = SimpleLazyObject(lambda: get_user(request))
+            return request
+
+        cases = {
+            'basic': (BasicAuthentication(), header_request(basic), basic, None),
+            'bearer': (BearerTokenAuthentication(), header_request(bearer), bearer, None),
+            # Промах кэша состояния: дополнительный запрос к AuthToken
+            'bearer_state_miss': (
+                BearerTokenAuthentication(), header_request(bearer), bearer,
+                lambda: cache.delete(state_key(session_id)),
+            ),
+            'session': (CsrfExemptSessionAuthentication(), session_request, {}, None),
+        }
+
+        results = {
+            'meta': {
+                'repeat': args.repeat, 'hasher': get_hasher().algorithm,
+                'iterations': getattr(get_hasher(), 'iterations', None), 'database': connection.vendor,
+                'cache': type(cache).__name__, 'django': django.get_version(),
+            },
+            'methods': {},
+        }
+        print(f'{"способ":<20}{"аутентификация p50, мс":>26}{"запрос p50, мс":>18}{"запрос p95, мс":>18}')
+        for name, (authenticator, make_request, headers, before) in cases.items():
+            client = session_client if name == 'session' else Client()
+            result = {
+                'authenticate': measure(authenticator_call(authenticator, make_request), args.repeat, args.warmup, before),
+                'request': measure(request_call(client, headers), args.repeat, args.warmup, before),
+            }
+            results['methods'][name] = result
+            print(
+                f'{name:<20}{result["authenticate"]["p50_ms"]:>26.3f}'
+                f'{result["request"]["p50_ms"]:>18.3f}{result["request"]["p95_ms"]:>18.3f}'
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    basic_ms = results['methods']['basic']['authenticate']['p50_ms']
+    bearer_ms = results['methods']['bearer']['authenticate']['p50_ms']
+    print(f'\nBearer дешевле Basic в {basic_ms / max(bearer_ms, 0.001):.0f} раз на аутентификацию')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f'Результаты записаны в {args.output}')
+
+
+if __name__ == '__main__':
+    main()
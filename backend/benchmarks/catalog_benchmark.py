@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+Задержки и число SQL-запросов основных сценариев API каталога
+
+Запуск: python benchmarks/catalog_benchmark.py --rows 100k --output results.json
+Каталог создается генератором (benchmarks/generator.py) во временной тестовой
+базе, для 1M строк лучше указать PostgreSQL через DATABASE_URL. Запросы идут
+через тестовый клиент Django со всеми middleware, кэш ответов выключен.
+Результат (p50/p95/p99 и запросы к БД на запрос) пишется в JSON и сравнивается
+с базовой линией benchmarks/baselines/catalog-<rows>.json; при регрессии скрипт
+завершается с кодом 1. --update-baseline сохраняет результат как базовую линию.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carspark_backend.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from benchmarks.generator import generate_catalog, parse_size
+from cars.cache import bump_version, get_version
+from cars.models import Car, Part
+from cars.stats import stats_key
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def size_label(rows):
+    for label, value in (('M', 1_000_000), ('k', 1_000)):
+        if rows >= value and rows % value == 0:
+            return f'{rows // value}{label}'
+    return str(rows)
+
+
+def drop_stats_cache(model, group_by=None):
+    cache.delete(stats_key(model, get_version(model), group_by))
+
+
+class Scenario:
+    """
+    Сценарий: метод, варианты URL по кругу и нужна ли авторизация.
+
+    ``before`` вызывается перед каждым запросом вне замера, например чтобы
+    сбросить кэш статистики и мерить ее пересчет.
+    """
+
+    def __init__(self, name, paths, method='get', auth=False, before=None):
+        self.name = name
+        self.paths = paths
+        self.method = method
+        self.auth = auth
+        self.before = before
+
+
+CAR_FACET_PATHS = [
+    '/api/cars/facets/?status=published',
+    '/api/cars/facets/?status=published&brand=BMW',
+    '/api/cars/facets/?status=published&fuel=diesel&city=Гент',
+    '/api/cars/facets/?search=audi',
+]
+
+
+def build_scenarios(car_ids, part_ids, rng):
+    retrieve_cars = [f'/api/cars/{pk}/' for pk in rng.sample(car_ids, min(len(car_ids), 200))]
+    return [
+        Scenario('cars_list', ['/api/cars/', '/api/cars/?page=2', '/api/cars/?compact=1']),
+        Scenario('cars_filter', [
+            '/api/cars/?brand=BMW&fuel=diesel',
+            '/api/cars/?brand=Toyota&model=RAV4',
+            '/api/cars/?transmission=manual&year=2020',
+            '/api/cars/?status=sold&fuel=electric',
+        ]),
+        Scenario('cars_search', [
+            '/api/cars/?search=bmw',
+            '/api/cars/?search=merc e-class',
+            '/api/cars/?search=WBA42',
+            '/api/cars/?search=панорама кожа',
+        ]),
+        Scenario('cars_price_eur', [
+            '/api/cars/?status=published&ordering=price_eur',
+            '/api/cars/?status=published&price_eur_min=10000&price_eur_max=20000&ordering=-price_eur',
+        ]),
+        Scenario('cars_ordering', [
+            '/api/cars/?ordering=price',
+            '/api/cars/?ordering=-year',
+            '/api/cars/?ordering=mileage',
+            '/api/cars/?ordering=-views',
+        ]),
+        Scenario('cars_retrieve', retrieve_cars),
+        Scenario(
+            'cars_increment_views',
+            [f'{path}increment_views/' for path in retrieve_cars],
+            method='post', auth=True,
+        ),
+        Scenario('cars_stats', ['/api/cars/stats/'], auth=True, before=lambda: drop_stats_cache(Car)),
+        Scenario(
+            'cars_stats_grouped', ['/api/cars/stats/?group_by=brand'], auth=True,
+            before=lambda: drop_stats_cache(Car, 'brand'),
+        ),
+        Scenario('cars_stats_cached', ['/api/cars/stats/'], auth=True),
+        # Фасеты пересчитываются: версия каталога меняется перед каждым запросом
+        Scenario('cars_facets', CAR_FACET_PATHS, before=lambda: bump_version(Car)),
+        Scenario('cars_facets_cached', CAR_FACET_PATHS),
+        Scenario(
+            'parts_facets', ['/api/parts/facets/?status=published', '/api/parts/facets/?category=Тормоза'],
+            before=lambda: bump_version(Part),
+        ),
+        Scenario('parts_list', ['/api/parts/', '/api/parts/?category=Тормоза', '/api/parts/?ordering=price']),
+        Scenario('parts_search', ['/api/parts/?search=турбина', '/api/parts/?search=фара audi']),
+        Scenario('parts_retrieve', [f'/api/parts/{pk}/' for pk in rng.sample(part_ids, min(len(part_ids), 200))]),
+    ]
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    return ordered[max(int(round(percent / 100 * len(ordered))) - 1, 0)]
+
+
+def run_scenario(scenario, clients, repeat, warmup):
+    client = clients['admin' if scenario.auth else 'anonymous']
+    timings, queries, statuses = [], [], set()
+    for index in range(warmup + repeat):
+        path = scenario.paths[index % len(scenario.paths)]
+        if scenario.before:
+            scenario.before()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(path)
+            elapsed = (time.perf_counter() - started) * 1000
+        if index < warmup:
+            continue
+        timings.append(elapsed)
+        queries.append(len(captured.captured_queries))
+        statuses.add(response.status_code)
+    return {
+        'requests': repeat,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+        'statuses': sorted(statuses),
+    }
+
+
+def compare(results, baseline, threshold, metric):
+    """
+    Сравнить с базовой линией; регрессия — рост ``metric`` больше чем на
+    ``threshold`` или любой рост числа запросов к БД.
+    """
+    regressions = []
+    print(f'\n{"сценарий":<24}{"было, мс":>12}{"стало, мс":>12}{"изменение":>12}{"запросы":>12}')
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            print(f'{name:<24}{"—":>12}{current[metric]:>12.2f}{"новый":>12}')
+            continue
+        change = current[metric] / previous[metric] - 1 if previous[metric] else 0
+        queries = f'{previous["max_queries"]}→{current["max_queries"]}'
+        slower = change > threshold
+        more_queries = current['max_queries'] > previous['max_queries']
+        mark = '  <- регрессия' if slower or more_queries else ''
+        print(f'{name:<24}{previous[metric]:>12.2f}{current[metric]:>12.2f}{change:>+11.0%}{queries:>12}{mark}')
+        if slower:
+            regressions.append(f'{name}: {metric} {previous[metric]:.2f} → {current[metric]:.2f} мс ({change:+.0%})')
+        if more_queries:
+            regressions.append(f'{name}: запросов к БД {queries}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=parse_size, default='10k', help='автомобилей: число, 10k, 100k или 1M')
+    parser.add_argument('--parts', type=parse_size, default=None, help='запчастей (по умолчанию rows / 4)')
+    parser.add_argument('--repeat', type=int, default=100, help='замеряемых запросов на сценарий')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenario', action='append', help='запустить только эти сценарии')
+    parser.add_argument('--output', default=None, help='JSON с результатами (по умолчанию catalog-<rows>.json)')
+    parser.add_argument('--baseline', default=None, help='базовая линия (по умолчанию baselines/catalog-<rows>.json)')
+    parser.add_argument('--threshold', type=float, default=0.25, help='допустимый рост задержки, доля')
+    parser.add_argument('--metric', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'], default='p50_ms',
+                        help='по какой метрике сравнивать; p50 устойчивее к шуму')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    label = size_label(args.rows)
+    parts = args.rows // 4 if args.parts is None else args.parts
+    output = args.output or f'catalog-{label}.json'
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f'catalog-{label}.json')
+
+    setup_test_environment()
+    settings.RESPONSE_CACHE_ENABLED = False
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.perf_counter()
+        admin = generate_catalog(args.rows, parts, seed=args.seed)
+        print(
+            f'{args.rows} автомобилей и {parts} запчастей создано за '
+            f'{time.perf_counter() - started:.1f} с ({connection.vendor})'
+        )
+
+        rng = random.Random(args.seed)
+        car_ids = list(Car.objects.filter(status='published').values_list('id', flat=True))
+        part_ids = list(Part.objects.filter(status='published').values_list('id', flat=True))
+        clients = {'anonymous': Client(), 'admin': Client()}
+        clients['admin'].force_login(admin)
+
+        scenarios = build_scenarios(car_ids, part_ids, rng)
+        if args.scenario:
+            scenarios = [scenario for scenario in scenarios if scenario.name in args.scenario]
+
+        results = {
+            'meta': {
+                'rows': args.rows, 'parts': parts, 'seed': args.seed, 'repeat': args.repeat,
+                'database': connection.vendor, 'python': platform.python_version(),
+                'django': django.get_version(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            },
+            'scenarios': {},
+        }
+        print(f'{"сценарий":<24}{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}{"запросы":>10}')
+        for scenario in scenarios:
+            result = run_scenario(scenario, clients, args.repeat, args.warmup)
+            results['scenarios'][scenario.name] = result
+            print(
+                f'{scenario.name:<24}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{result["p99_ms"]:>10.2f}{result["queries_per_request"]:>10g}'
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    print(f'Результаты записаны в {output}')
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f'Базовая линия обновлена: {baseline_path}')
+        return
+
+    if not os.path.exists(baseline_path):
+        print(f'Базовой линии {baseline_path} нет, сравнение пропущено (см. --update-baseline)')
+        return
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+    if baseline['meta'].get('database') != connection.vendor:
+        print(f'Внимание: базовая линия снята на {baseline["meta"].get("database")}, сейчас {connection.vendor}')
+    regressions = compare(results, baseline, args.threshold, args.metric)
+    if regressions:
+        print('\nРегрессии:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+    print('\nРегрессий нет')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+"""
+Пропускная способность WSGI и ASGI при большом числе одновременных клиентов
+
+Запуск: python benchmarks/concurrency_benchmark.py --clients 100 --requests 1000
+WSGI-сервер обслуживает синхронные эндпоинты пулом из --threads потоков (как
+gthread-воркер gunicorn), ASGI-сервер (uvicorn, один воркер) — /api/async/.
+Сценарии: список автомобилей (работа с базой) и удаление фотографии из
+хранилища, которое отвечает через --storage-latency секунд, как S3.
+Данные создаются во временной тестовой базе.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carspark_backend.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+
+from cars.images import ImageStorage
+from cars.models import Admin, Car
+from cars.pricing import set_prices_eur
+
+
+class LatencyImageStorage(ImageStorage):
+    """Хранилище, которое отвечает с задержкой сетевого запроса"""
+    latency = float(os.environ.get('BENCH_STORAGE_LATENCY', 0.1))
+
+    def url(self, key):
+        return f'https://bench/{key}'
+
+    def save(self, key, fileobj, content_type=None):
+        time.sleep(self.latency)
+        return self.url(key)
+
+    def delete(self, key):
+        time.sleep(self.latency)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI-сервер с фиксированным пулом потоков: запрос сверх пула ждет свободный поток"""
+    request_queue_size = 1024
+
+    def __init__(self, address, handler_class, threads):
+        super().__init__(address, handler_class)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def start_wsgi(threads):
+    server = PooledWSGIServer(('127.0.0.1', 0), QuietHandler, threads)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port, server.shutdown
+
+
+def start_asgi():
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('Для ASGI нужен uvicorn: pip install uvicorn')
+
+    config = uvicorn.Config(
+        get_asgi_application(), host='127.0.0.1', port=0, log_level='warning', lifespan='off', backlog=1024,
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+
+    return server.servers[0].sockets[0].getsockname()[1], stop
+
+
+def populate(rows):
+    admin = Admin.objects.create_user(username='bench@example.com', email='bench@example.com', password='bench')
+    cars = [
+        Car(
+            brand='BMW', model='X5', year=2010 + index % 14, mileage=1000 * index, transmission='automatic',
+            fuel='diesel', drive='all', vin=f'BENCH{index:012d}', condition='good', price=Decimal(20000 + index),
+            city='Брюссель', description='Описание', status='published', admin=admin,
+        )
+        for index in range(rows)
+    ]
+    set_prices_eur(cars)
+    Car.objects.bulk_create(cars)
+
+
+async def fetch(port, method, path, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(
+            f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def load(port, method, path, body, clients, requests):
+    remaining = iter(range(requests))
+    timings = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, method, path, body)
+            except (OSError, IndexError, ValueError):
+                status = None
+            if status != 200:
+                errors += 1
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    timings.sort() or timings.append(0)
+    return {
+        'rps': len(timings) / elapsed,
+        'mean': statistics.mean(timings),
+        'p95': timings[max(int(len(timings) * 0.95) - 1, 0)],
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--storage-latency', type=float, default=0.1, help='задержка ответа хранилища, с')
+    parser.add_argument('--threads', type=int, default=4, help='потоков у WSGI-сервера')
+    parser.add_argument('--rows', type=int, default=200)
+    args = parser.parse_args()
+
+    settings.ALLOWED_HOSTS = ['*']
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.IMAGE_STORAGE_BACKEND = f'{__name__}.LatencyImageStorage'
+    LatencyImageStorage.latency = args.storage_latency
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        populate(args.rows)
+        print(f'{args.clients} клиентов, {args.requests} запросов, {args.threads} потоков WSGI')
+        print(f'{"сценарий":<22}{"запросов/с":>12}{"среднее, мс":>14}{"p95, мс":>10}{"ошибок":>8}')
+        scenarios = [
+            ('список', 'GET', '/api{}/cars/', b''),
+            ('удаление фото', 'DELETE', '/api{}/images/delete/', b'{"imageKey": "bench/photo.jpg"}'),
+        ]
+        for server, start, prefix in [
+            ('WSGI', lambda: start_wsgi(args.threads), ''),
+            ('ASGI', start_asgi, '/async'),
+        ]:
+            port, stop = start()
+            try:
+                for scenario, method, path, body in scenarios:
+                    result = asyncio.run(
+                        load(port, method, path.format(prefix), body, args.clients, args.requests)
+                    )
+                    print(
+                        f'{server + ", " + scenario:<22}{result["rps"]:>12.1f}{result["mean"]:>14.1f}'
+                        f'{result["p95"]:>10.1f}{result["errors"]:>8}'
+                    )
+            finally:
+                stop()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
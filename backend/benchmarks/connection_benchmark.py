@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Накладные расходы на установку соединения с БД для GET /api/cars/
+
+Запуск: DATABASE_URL=postgresql://... python benchmarks/connection_benchmark.py --requests 500
+Поднимает WSGI-сервер в этом процессе (как gunicorn: соединения закрываются
+по сигналу request_finished) и сравнивает CONN_MAX_AGE=0 с постоянными
+соединениями. Данные создаются во временной тестовой базе.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from decimal import Decimal
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carspark_backend.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from cars.models import Admin, Car
+from cars.pricing import set_prices_eur
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def populate(rows):
+    admin = Admin.objects.create_user(username='bench@example.com', email='bench@example.com', password='bench')
+    cars = [
+        Car(
+            brand='BMW', model='X5', year=2020, mileage=1000 * index, transmission='automatic', fuel='diesel',
+            drive='all', vin=f'BENCH{index:012d}', condition='good', price=Decimal(20000 + index),
+            city='Брюссель', description='Описание', status='published', admin=admin,
+        )
+        for index in range(rows)
+    ]
+    set_prices_eur(cars)
+    Car.objects.bulk_create(cars)
+
+
+def run(url, requests):
+    opened = []
+    receiver = lambda **kwargs: opened.append(1)  # noqa: E731
+    connection_created.connect(receiver)
+    timings = []
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        connection_created.disconnect(receiver)
+    timings.sort()
+    return {
+        'connections': len(opened),
+        'mean': statistics.mean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--max-age', type=int, default=60)
+    args = parser.parse_args()
+
+    settings.ALLOWED_HOSTS = ['*']
+    settings.RESPONSE_CACHE_ENABLED = False
+    old_name = connection.creation.create_test_db(verbosity=0)
+    server = make_server('127.0.0.1', 0, get_wsgi_application(), handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/api/cars/'
+    try:
+        populate(args.rows)
+        connection.close()
+        if connection.vendor == 'sqlite':
+            print('Внимание: SQLite открывает соединение почти бесплатно, нагляден только PostgreSQL')
+        print(f'{"режим":<24}{"соединений":>12}{"среднее, мс":>14}{"p50, мс":>10}{"p95, мс":>10}')
+        modes = [('CONN_MAX_AGE=0', 0, False), (f'CONN_MAX_AGE={args.max_age}+health', args.max_age, True)]
+        for label, max_age, health_checks in modes:
+            connection.settings_dict['CONN_MAX_AGE'] = max_age
+            connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+            result = run(url, args.requests)
+            print(
+                f'{label:<24}{result["connections"]:>12}{result["mean"]:>14.2f}'
+                f'{result["p50"]:>10.2f}{result["p95"]:>10.2f}'
+            )
+    finally:
+        server.shutdown()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
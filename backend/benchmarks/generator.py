@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""
+Детерминированный генератор синтетического каталога для нагрузочных тестов
+
+Запуск: python benchmarks/generator.py --rows 100k --parts 25k
+Данные пишутся в базу из настроек (DATABASE_URL), поэтому скрипт предназначен
+для отдельной базы стенда. Бенчмарки импортируют generate_catalog() и наполняют
+временную тестовую базу. При одном и том же --seed создаются одинаковые строки.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carspark_backend.settings')
+
+import django
+
+django.setup()
+
+from django.db import connection, transaction
+
+from cars.cache import bump_version
+from cars.models import Admin, Car, Part
+from cars.pricing import set_prices_eur
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+# Год, от которого считается возраст машин; фиксирован, чтобы данные не зависели от даты запуска
+BASE_YEAR = 2025
+
+# Марка: (доля рынка, код для VIN, [(модель, цена нового в EUR, кузов)])
+BRANDS = {
+    'Volkswagen': (14, 'WVW', [('Golf', 27000, 'hatchback'), ('Passat', 36000, 'wagon'),
+                               ('Tiguan', 38000, 'suv'), ('Polo', 20000, 'hatchback')]),
+    'BMW': (11, 'WBA', [('320', 45000, 'sedan'), ('520', 58000, 'sedan'),
+                        ('X3', 52000, 'suv'), ('X5', 75000, 'suv')]),
+    'Mercedes-Benz': (11, 'WDD', [('C-Class', 48000, 'sedan'), ('E-Class', 60000, 'sedan'),
+                                  ('GLC', 55000, 'suv'), ('S-Class', 110000, 'sedan')]),
+    'Audi': (10, 'WAU', [('A3', 33000, 'hatchback'), ('A4', 43000, 'wagon'),
+                         ('A6', 58000, 'sedan'), ('Q5', 52000, 'suv')]),
+    'Toyota': (9, 'JTD', [('Corolla', 25000, 'sedan'), ('Camry', 33000, 'sedan'),
+                          ('RAV4', 36000, 'suv'), ('Yaris', 19000, 'hatchback')]),
+    'Skoda': (7, 'TMB', [('Octavia', 28000, 'wagon'), ('Superb', 38000, 'sedan'), ('Kodiaq', 40000, 'suv')]),
+    'Ford': (7, 'WF0', [('Focus', 24000, 'hatchback'), ('Mondeo', 30000, 'wagon'), ('Kuga', 32000, 'suv')]),
+    'Renault': (6, 'VF1', [('Clio', 19000, 'hatchback'), ('Megane', 24000, 'hatchback'),
+                           ('Kadjar', 28000, 'suv')]),
+    'Peugeot': (6, 'VF3', [('208', 20000, 'hatchback'), ('308', 25000, 'hatchback'), ('3008', 32000, 'suv')]),
+    'Opel': (5, 'W0L', [('Corsa', 18000, 'hatchback'), ('Astra', 23000, 'hatchback'),
+                        ('Insignia', 31000, 'wagon')]),
+    'Volvo': (4, 'YV1', [('V60', 45000, 'wagon'), ('XC60', 52000, 'suv'), ('XC90', 70000, 'suv')]),
+    'Tesla': (2, '5YJ', [('Model 3', 45000, 'sedan'), ('Model Y', 50000, 'suv')]),
+    'Porsche': (1, 'WP0', [('Cayenne', 95000, 'suv'), ('911', 130000, 'coupe')]),
+}
+
+FUELS = [('petrol', 45), ('diesel', 35), ('hybrid', 10), ('electric', 5), ('gas', 5)]
+TRANSMISSIONS = [('automatic', 55), ('manual', 35), ('robot', 7), ('variator', 3)]
+DRIVES = [('front', 60), ('all', 30), ('rear', 10)]
+STATUSES = [('published', 85), ('sold', 10), ('draft', 5)]
+CITIES = [('Брюссель', 30), ('Антверпен', 20), ('Гент', 15), ('Льеж', 12), ('Шарлеруа', 10), ('Брюгге', 8),
+          ('Намюр', 5)]
+COLORS = ['черный', 'белый', 'серый', 'серебристый', 'синий', 'красный', 'зеленый']
+WORDS = ['пробег', 'владелец', 'сервисная', 'книжка', 'кожа', 'панорама', 'подогрев', 'камера', 'круиз',
+         'ксенон', 'навигация', 'парктроник', 'климат', 'диски', 'гараж', 'обслужен', 'не', 'бит', 'торг']
+
+# Категория: [(название, цена в EUR)]
+PART_CATEGORIES = {
+    'Двигатель': [('Турбина', 900), ('Генератор', 350), ('Стартер', 250), ('ГБЦ', 1200)],
+    'Тормоза': [('Тормозные колодки', 60), ('Тормозной диск', 90), ('Суппорт', 180)],
+    'Подвеска': [('Амортизатор', 120), ('Рычаг', 80), ('Пружина', 50)],
+    'Кузов': [('Фара', 400), ('Бампер', 300), ('Зеркало', 150), ('Капот', 350)],
+    'Электрика': [('Аккумулятор', 140), ('Датчик ABS', 45), ('Блок управления', 500)],
+    'Салон': [('Сиденье', 250), ('Руль', 200), ('Панель приборов', 300)],
+}
+PART_CONDITIONS = [('used', 60), ('new', 30), ('refurbished', 10)]
+
+
+def parse_size(value):
+    """Количество строк: число или 10k / 100k / 1M"""
+    if value in SIZES:
+        return SIZES[value]
+    suffix = value[-1:].lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(suffix)
+    try:
+        return int(value[:-1]) * multiplier if multiplier else int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Некорректное количество строк: {value}')
+
+
+class Weighted:
+    """Выбор по весам через накопленные суммы, посчитанные один раз"""
+
+    def __init__(self, pairs):
+        pairs = list(pairs)
+        self.values = [value for value, _weight in pairs]
+        self.cum_weights = list(accumulate(weight for _value, weight in pairs))
+
+    def pick(self, rng):
+        return rng.choices(self.values, cum_weights=self.cum_weights)[0]
+
+
+class CatalogGenerator:
+    """
+    Строки каталога с правдоподобными распределениями.
+
+    Марки выбираются по долям рынка, возраст машин убывает экспоненциально
+    (новых объявлений больше), пробег растет с возрастом, а цена — это цена
+    новой модели с амортизацией 15% в год и логнормальным разбросом.
+    Просмотры распределены по Парето: у немногих объявлений их очень много.
+    Все значения берутся из одного ``random.Random(seed)``, поэтому строка
+    с номером N одинакова при каждом запуске.
+    """
+
+    def __init__(self, seed=42):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.brands = Weighted((brand, weight) for brand, (weight, _code, _models) in BRANDS.items())
+        self.fuels = Weighted(FUELS)
+        self.transmissions = Weighted(TRANSMISSIONS)
+        self.drives = Weighted(DRIVES)
+        self.statuses = Weighted(STATUSES)
+        self.cities = Weighted(CITIES)
+        self.part_conditions = Weighted(PART_CONDITIONS)
+
+    def views(self):
+        return min(int((self.rng.paretovariate(1.2) - 1) * 40), 100_000)
+
+    def description(self, *words):
+        return ' '.join(list(words) + self.rng.choices(WORDS, k=self.rng.randint(8, 20)))
+
+    def car(self, index, admin):
+        rng = self.rng
+        brand = self.brands.pick(rng)
+        _weight, code, models = BRANDS[brand]
+        model, new_price, body_type = rng.choice(models)
+        age = min(int(rng.expovariate(1 / 5)), 20)
+        mileage = max(int(rng.gauss(15000, 5000) * age), 0) + rng.randint(0, 5000)
+        fuel = 'electric' if brand == 'Tesla' else self.fuels.pick(rng)
+        price = new_price * 0.85 ** age * rng.lognormvariate(0, 0.12)
+        condition = 'excellent' if age < 3 else rng.choice(['good', 'good', 'fair', 'poor'] if age > 10 else
+                                                           ['excellent', 'good', 'good', 'fair'])
+        return Car(
+            brand=brand, model=model, year=BASE_YEAR - age, mileage=mileage,
+            transmission='automatic' if fuel == 'electric' else self.transmissions.pick(rng),
+            fuel=fuel, drive=self.drives.pick(rng), body_type=body_type, color=rng.choice(COLORS),
+            power=int(new_price / 300 * rng.uniform(0.8, 1.2)),
+            engine_volume=None if fuel == 'electric' else round(rng.uniform(1.0, 3.0), 1),
+            euro_standard='Euro 6' if age < 10 else 'Euro 5',
+            vin=f'{code}{self.seed % 100:02d}{index:012d}', condition=condition,
+            customs=rng.random() < 0.9, vat=rng.random() < 0.3, owners=1 + age // 4 + rng.randint(0, 1),
+            price=Decimal(max(round(price, -2), 500)), negotiable=rng.random() < 0.6,
+            city=self.cities.pick(rng), description=self.description(brand, model),
+            status=self.statuses.pick(rng), views=self.views(), admin=admin,
+        )
+
+    def part(self, index, admin):
+        rng = self.rng
+        category = rng.choice(list(PART_CATEGORIES))
+        name, base_price = rng.choice(PART_CATEGORIES[category])
+        brand = self.brands.pick(rng)
+        model = rng.choice(BRANDS[brand][2])[0]
+        year_from = BASE_YEAR - rng.randint(3, 20)
+        condition = self.part_conditions.pick(rng)
+        price = base_price * (1 if condition == 'new' else 0.55) * rng.lognormvariate(0, 0.25)
+        return Part(
+            name=f'{name} {brand} {model}', brand=brand, model=model, year_from=year_from,
+            year_to=min(year_from + rng.randint(3, 8), BASE_YEAR), category=category, condition=condition,
+            price=Decimal(max(round(price), 5)), negotiable=rng.random() < 0.3, city=self.cities.pick(rng),
+            description=self.description(name, brand, model), status=self.statuses.pick(rng),
+            views=self.views(), admin=admin,
+        )
+
+
+def bulk_insert(model, make, count, admin, batch_size):
+    for start in range(0, count, batch_size):
+        batch = [make(index, admin) for index in range(start, min(start + batch_size, count))]
+        set_prices_eur(batch)
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+
+
+def generate_catalog(cars, parts=0, seed=42, admin=None, batch_size=5000):
+    """
+    Создать ``cars`` автомобилей и ``parts`` запчастей через ``bulk_create``.
+
+    Владелец всех объявлений — ``admin`` или служебный администратор
+    ``bench@example.com``. Каждая пачка вставляется отдельной транзакцией,
+    поэтому память не растет с размером каталога. Возвращает администратора.
+    """
+    if admin is None:
+        admin = Admin.objects.filter(username='bench@example.com').first() or Admin.objects.create_user(
+            username='bench@example.com', email='bench@example.com', password='bench', is_staff=True,
+        )
+    generator = CatalogGenerator(seed)
+    bulk_insert(Car, generator.car, cars, admin, batch_size)
+    bulk_insert(Part, generator.part, parts, admin, batch_size)
+    # bulk_create не посылает post_save, поэтому кэш сбрасываем сами
+    bump_version(Car)
+    bump_version(Part)
+    return admin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=parse_size, default='10k', help='автомобилей: число, 10k, 100k или 1M')
+    parser.add_argument('--parts', type=parse_size, default=None, help='запчастей (по умолчанию rows / 4)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    parts = args.rows // 4 if args.parts is None else args.parts
+    started = time.perf_counter()
+    generate_catalog(args.rows, parts, seed=args.seed, batch_size=args.batch_size)
+    print(
+        f'{args.rows} автомобилей и {parts} запчастей создано за '
+        f'{time.perf_counter() - started:.1f} с ({connection.vendor})'
+    )
+
+
+if __name__ == '__main__':
+    main()
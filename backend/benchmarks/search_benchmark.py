@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Сравнение полнотекстового поиска с исходным SearchFilter (ILIKE '%term%')
+
+Запуск: python benchmarks/search_benchmark.py --rows 100000
+Данные создаются во временной тестовой базе, рабочая база не затрагивается.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carspark_backend.settings')
+
+import django
+
+django.setup()
+
+from django.db import connection
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cars.models import Admin, Car
+from cars.pricing import set_prices_eur
+from cars.search import CatalogSearchFilter
+
+BRANDS = {
+    'BMW': ['X5', 'X3', '320', '520', 'M5'],
+    'Mercedes-Benz': ['E-Class', 'C-Class', 'GLE', 'S-Class'],
+    'Audi': ['A4', 'A6', 'Q5', 'Q7'],
+    'Volkswagen': ['Golf', 'Passat', 'Tiguan'],
+    'Toyota': ['Camry', 'RAV4', 'Corolla'],
+}
+WORDS = ['пробег', 'владелец', 'сервисная', 'книжка', 'кожа', 'панорама', 'подогрев', 'камера', 'круиз', 'ксенон']
+QUERIES = ['bmw', 'merc e-class', 'WBA1', 'панорама', 'golf кожа']
+
+
+class SearchView:
+    search_fields = ['brand', 'model', 'vin', 'description']
+
+
+def populate(rows):
+    rng = random.Random(42)
+    admin = Admin.objects.create_user(username='bench@example.com', email='bench@example.com', password='bench')
+    brands = list(BRANDS)
+    batch = []
+    for index in range(rows):
+        brand = rng.choice(brands)
+        batch.append(Car(
+            brand=brand, model=rng.choice(BRANDS[brand]), year=rng.randint(2005, 2024),
+            mileage=rng.randint(0, 300000), transmission='automatic', fuel='diesel', drive='all',
+            vin=f'{brand[:2].upper()}{rng.choice("ABCD")}{index:014d}', condition='good',
+            price=Decimal(rng.randint(3000, 90000)), city='Брюссель', status='published',
+            description=' '.join(rng.choices(WORDS, k=30)), admin=admin,
+        ))
+        if len(batch) == 5000:
+            set_prices_eur(batch)
+            Car.objects.bulk_create(batch)
+            batch = []
+    set_prices_eur(batch)
+    Car.objects.bulk_create(batch)
+
+
+def measure(backend, query, repeat):
+    request = Request(APIRequestFactory().get('/api/cars/', {'search': query}))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        queryset = backend.filter_queryset(request, Car.objects.all(), SearchView())
+        queryset.count()
+        list(queryset[:20])
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.perf_counter()
+        populate(args.rows)
+        print(f'{args.rows} автомобилей создано за {time.perf_counter() - started:.1f} с ({connection.vendor})')
+        print(f'{"запрос":<16}{"ILIKE, мс":>12}{"FTS, мс":>12}{"ускорение":>12}')
+        for query in QUERIES:
+            icontains = measure(SearchFilter(), query, args.repeat)
+            fulltext = measure(CatalogSearchFilter(), query, args.repeat)
+            print(f'{query:<16}{icontains:>12.1f}{fulltext:>12.1f}{icontains / fulltext:>11.1f}x')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
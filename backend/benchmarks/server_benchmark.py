@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Смоук-тест нагрузки на gunicorn: пропускная способность растет с числом воркеров
+
+Запуск: python benchmarks/server_benchmark.py --workers 1,2,4 --clients 32 --requests 2000
+Поднимает gunicorn с gunicorn.conf.py на временной SQLite-базе (каталог из
+benchmarks/generator.py) для каждого числа воркеров и нагружает его. Сценарий
+list — список автомобилей (упирается в CPU), storage — удаление фотографии из
+хранилища с задержкой как у S3 (упирается в ожидание). Ожидаемое ускорение —
+min(воркеры, CPU) * --efficiency для list и воркеры * --efficiency для storage;
+если оно не достигнуто, скрипт завершается с кодом 1. Воркер gthread принимает
+соединения жадно, поэтому при всплеске запросов на одном CPU нагрузка между
+воркерами распределяется неровно — отсюда запас в --efficiency.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.concurrency_benchmark import load
+from carspark_backend.server import cpu_limit
+
+SCENARIOS = {
+    'list': ('GET', '/api/cars/', b''),
+    'storage': ('DELETE', '/api/images/delete/', b'{"imageKey": "bench/photo.jpg"}'),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f'gunicorn завершился с кодом {process.returncode}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/', timeout=1)
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    sys.exit('gunicorn не ответил за отведенное время')
+
+
+def run_server(env, workers, threads, worker_class):
+    port = free_port()
+    env = dict(
+        env, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(threads), GUNICORN_WORKER_CLASS=worker_class, GUNICORN_ACCESS_LOG='',
+        GUNICORN_LOG_LEVEL='warning',
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=BACKEND_DIR, env=env,
+    )
+    wait_until_ready(port, process)
+    return port, process
+
+
+def prepare_database(env, rows):
+    for command in (['manage.py', 'migrate', '--verbosity', '0'], ['benchmarks/generator.py', '--rows', str(rows)]):
+        subprocess.run([sys.executable, *command], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='числа воркеров через запятую')
+    parser.add_argument('--threads', type=int, default=1, help='потоков на воркер (gthread)')
+    parser.add_argument('--worker-class', choices=['gthread', 'uvicorn'], default='gthread')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='list')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--storage-latency', type=float, default=0.2, help='задержка хранилища в сценарии storage, с')
+    parser.add_argument('--efficiency', type=float, default=0.5, help='доля идеального ускорения, ниже которой тест падает')
+    args = parser.parse_args()
+
+    worker_counts = sorted({int(value) for value in args.workers.split(',')})
+    cpus = cpu_limit()
+    method, path, body = SCENARIOS[args.scenario]
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ, SQLITE_PATH=os.path.join(directory, 'bench.sqlite3'), DEBUG='False', ALLOWED_HOSTS='*',
+            RESPONSE_CACHE_ENABLED='False', METRICS_DEBUG_HEADERS='False', IMAGE_DERIVATIVES_ENABLED='False',
+            IMAGE_STORAGE_BACKEND='benchmarks.concurrency_benchmark.LatencyImageStorage',
+            BENCH_STORAGE_LATENCY=str(args.storage_latency),
+        )
+        env.pop('DATABASE_URL', None)
+        prepare_database(env, args.rows)
+
+        print(f'{args.scenario}: {args.clients} клиентов, {args.requests} запросов, {cpus} CPU, {args.worker_class}')
+        print(f'{"воркеры":>8}{"запросов/с":>12}{"среднее, мс":>14}{"p95, мс":>10}{"ошибок":>8}')
+        results = {}
+        for workers in worker_counts:
+            port, process = run_server(env, workers, args.threads, args.worker_class)
+            try:
+                result = asyncio.run(load(port, method, path, body, args.clients, args.requests))
+            finally:
+                process.terminate()
+                process.wait(timeout=60)
+            results[workers] = result
+            print(
+                f'{workers:>8}{result["rps"]:>12.1f}{result["mean"]:>14.1f}'
+                f'{result["p95"]:>10.1f}{result["errors"]:>8}'
+            )
+
+    first, last = worker_counts[0], worker_counts[-1]
+    ideal = last / first if args.scenario == 'storage' else min(last, cpus) / min(first, cpus)
+    expected = ideal * args.efficiency
+    speedup = results[last]['rps'] / results[first]['rps']
+    errors = sum(result['errors'] for result in results.values())
+    print(f'\nУскорение {first} -> {last} воркеров: {speedup:.2f}x (ожидается не меньше {expected:.2f}x)')
+    if errors:
+        sys.exit(f'Ошибок в ответах: {errors}')
+    if speedup < expected:
+        sys.exit('Пропускная способность не растет с числом воркеров')
+
+
+if __name__ == '__main__':
+    main()
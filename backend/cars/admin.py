@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Admin, Car, Part
+from .cache import bump_version
+from .models import Admin, AuthToken, Car, ExchangeRate, Part, Photo
+from .tokens import revoke_sessions
 
 
 @admin.register(Admin)
@@ -26,13 +28,36 @@ class AdminUserAdmin(UserAdmin):
     )
 
 
+class PhotoInline(admin.TabularInline):
+    """Фотографии объявления по порядку показа"""
+    model = Photo
+    fields = ['position', 'url', 'key', 'width', 'height']
+    extra = 0
+
+
+class CarPhotoInline(PhotoInline):
+    fk_name = 'car'
+
+
+class PartPhotoInline(PhotoInline):
+    fk_name = 'part'
+
+
+class PhotoOwnerAdminMixin:
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Фотографии сохраняются после самого объявления, поэтому кэш сбрасываем еще раз
+        bump_version(self.model)
+
+
 @admin.register(Car)
-class CarAdmin(admin.ModelAdmin):
+class CarAdmin(PhotoOwnerAdminMixin, admin.ModelAdmin):
     """Админка для модели Car"""
-    list_display = ['brand', 'model', 'year', 'price', 'currency', 'status', 'admin', 'created_at']
+    inlines = [CarPhotoInline]
+    list_display = ['brand', 'model', 'year', 'price', 'currency', 'price_eur', 'status', 'admin', 'created_at']
     list_filter = ['brand', 'status', 'transmission', 'fuel', 'condition', 'created_at']
     search_fields = ['brand', 'model', 'vin', 'description']
-    readonly_fields = ['id', 'created_at', 'updated_at', 'views']
+    readonly_fields = ['id', 'price_eur', 'created_at', 'updated_at', 'views']
     list_editable = ['status', 'price']
     
     fieldsets = (
@@ -46,10 +71,10 @@ class CarAdmin(admin.ModelAdmin):
             'fields': ('vin', 'condition', 'customs', 'vat', 'owners')
         }),
         ('Цена и продажа', {
-            'fields': ('price', 'currency', 'negotiable', 'city', 'status')
+            'fields': ('price', 'currency', 'price_eur', 'negotiable', 'city', 'status')
         }),
-        ('Описание и медиа', {
-            'fields': ('description', 'photos')
+        ('Описание', {
+            'fields': ('description',)
         }),
         ('Метаданные', {
             'fields': ('admin', 'views', 'created_at', 'updated_at'),
@@ -59,12 +84,13 @@ class CarAdmin(admin.ModelAdmin):
 
 
 @admin.register(Part)
-class PartAdmin(admin.ModelAdmin):
+class PartAdmin(PhotoOwnerAdminMixin, admin.ModelAdmin):
     """Админка для модели Part"""
-    list_display = ['name', 'brand', 'model', 'category', 'price', 'currency', 'status', 'admin', 'created_at']
+    inlines = [PartPhotoInline]
+    list_display = ['name', 'brand', 'model', 'category', 'price', 'currency', 'price_eur', 'status', 'admin', 'created_at']
     list_filter = ['brand', 'category', 'condition', 'status', 'created_at']
     search_fields = ['name', 'brand', 'model', 'description']
-    readonly_fields = ['id', 'created_at', 'updated_at', 'views']
+    readonly_fields = ['id', 'price_eur', 'created_at', 'updated_at', 'views']
     list_editable = ['status', 'price']
     
     fieldsets = (
@@ -72,13 +98,38 @@ class PartAdmin(admin.ModelAdmin):
             'fields': ('name', 'brand', 'model', 'year_from', 'year_to', 'category', 'condition')
         }),
         ('Цена и продажа', {
-            'fields': ('price', 'currency', 'negotiable', 'city', 'status')
+            'fields': ('price', 'currency', 'price_eur', 'negotiable', 'city', 'status')
         }),
-        ('Описание и медиа', {
-            'fields': ('description', 'photos')
+        ('Описание', {
+            'fields': ('description',)
         }),
         ('Метаданные', {
             'fields': ('admin', 'views', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(AuthToken)
+class AuthTokenAdmin(admin.ModelAdmin):
+    """Сессии входа по токенам; сами токены не хранятся, только хеш refresh"""
+    list_display = ['user', 'name', 'created_at', 'last_used_at', 'expires_at', 'revoked_at']
+    list_filter = ['revoked_at', 'created_at']
+    search_fields = ['user__email', 'name']
+    readonly_fields = ['user', 'key_hash', 'name', 'created_at', 'last_used_at', 'expires_at', 'revoked_at']
+    actions = ['revoke']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.action(description='Отозвать выбранные токены')
+    def revoke(self, request, queryset):
+        self.message_user(request, f'Отозвано: {revoke_sessions(queryset)}')
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    """Курсы к евро; сохранение пересчитывает price_eur объявлений в этой валюте"""
+    list_display = ['currency', 'rate', 'updated_at']
+    list_editable = ['rate']
+    readonly_fields = ['updated_at']
@@ -0,0 +1,242 @@
+"""
+Асинхронные (ASGI) представления каталога для чтения и загрузки фотографий
+"""
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .authentication import token_credentials
+from .cache import ResponseCacheMixin, aget_version, response_cache_key
+from .fastpath import RowPlan
+from .images import ImageStorageError, get_image_storage, storage_io_executor, upload_images
+from .photos import derivative_keys, detach_photos
+from .stats import aget_stats, group_by_error
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    """Ответ в том же виде, что отдает JSONRenderer синхронного API"""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def exception_response(exc, status_code=None):
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return json_response(data, status=status_code or exc.status_code)
+
+
+def authentication_failed_response(exc):
+    # Синхронный API отвечает 403: у первого класса аутентификации (сессии) нет WWW-Authenticate
+    return exception_response(exc, status.HTTP_403_FORBIDDEN)
+
+
+async def request_user(request):
+    """
+    Пользователь из сессии или из access-токена ``Authorization: Bearer``.
+
+    Недействительный токен — AuthenticationFailed, как в синхронном API.
+    """
+    user = await request.auser()
+    header = request.headers.get('Authorization', '')
+    if not user.is_authenticated and header[:7].lower() == 'bearer ':
+        user, _session_id = await sync_to_async(token_credentials)(header)
+    return user
+
+
+class AsyncCatalogView(View):
+    """
+    Основа асинхронных представлений каталога.
+
+    Фильтры, поиск, сортировка и сериализаторы берутся из ``viewset_class``,
+    поэтому ответ совпадает с синхронным API, а запросы к базе идут через
+    асинхронный ORM. Кэш ответов общий с ``ResponseCacheMixin``.
+    """
+    viewset_class = None
+    action = None
+
+    async def get(self, request, pk=None):
+        try:
+            user = await request_user(request)
+        except AuthenticationFailed as exc:
+            return authentication_failed_response(exc)
+        viewset = self.get_viewset(request, user, pk)
+        model = viewset.get_queryset().model
+
+        cached = getattr(settings, 'RESPONSE_CACHE_ENABLED', True) and not user.is_authenticated
+        if cached:
+            key = response_cache_key(model, await aget_version(model), self.action, request, pk or '')
+            data = await cache.aget(key)
+            if data is not None:
+                ResponseCacheMixin.count_response_cache('hits')
+                response = json_response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+            ResponseCacheMixin.count_response_cache('misses')
+
+        try:
+            data = await self.get_data(viewset, pk)
+        except APIException as exc:
+            response = exception_response(exc)
+        else:
+            response = json_response(data)
+            if cached:
+                await cache.aset(key, data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60))
+        if cached:
+            response['X-Cache'] = 'MISS'
+        return response
+
+    def get_viewset(self, request, user, pk):
+        drf_request = Request(request)
+        # Пользователь уже известен из request_user(), синхронная аутентификация DRF не нужна
+        drf_request.user = user
+        return self.viewset_class(
+            request=drf_request,
+            action=self.action,
+            args=(),
+            kwargs={'pk': pk} if pk is not None else {},
+            format_kwarg=None,
+        )
+
+    async def filter_queryset(self, viewset):
+        # django-filter проверяет значение ?admin= запросом к базе, поэтому в потоке
+        return await sync_to_async(viewset.filter_queryset)(viewset.get_queryset())
+
+    async def get_data(self, viewset, pk):
+        raise NotImplementedError
+
+
+class AsyncCatalogListView(AsyncCatalogView):
+    """Список объявлений: пагинация через acount() и aiterator()"""
+    action = 'list'
+
+    async def get_data(self, viewset, pk):
+        queryset = await self.filter_queryset(viewset)
+        plan = None
+        if getattr(settings, 'FAST_LIST_SERIALIZATION', True):
+            plan = RowPlan.build(viewset.get_serializer())
+        rows = plan.values(queryset) if plan else queryset
+
+        page = await viewset.paginator.apaginate_queryset(rows, viewset.request, view=viewset)
+        data = plan.serialize(page) if plan else viewset.get_serializer(page, many=True).data
+        return viewset.paginator.get_paginated_response(data).data
+
+
+class AsyncCatalogDetailView(AsyncCatalogView):
+    """Одно объявление через aget()"""
+    action = 'retrieve'
+
+    async def get_data(self, viewset, pk):
+        queryset = await self.filter_queryset(viewset)
+        try:
+            instance = await queryset.aget(**{viewset.lookup_field: pk})
+        except ObjectDoesNotExist:
+            raise NotFound()
+        return viewset.get_serializer(instance).data
+
+
+class AsyncCatalogStatsView(View):
+    """Статистика каталога с тем же кэшем и ETag, что и у синхронного stats"""
+    model = None
+
+    async def get(self, request):
+        # Как и синхронный stats, доступна только администраторам
+        try:
+            user = await request_user(request)
+        except AuthenticationFailed as exc:
+            return authentication_failed_response(exc)
+        if not user.is_authenticated:
+            return json_response({'detail': NotAuthenticated.default_detail}, status=status.HTTP_403_FORBIDDEN)
+
+        group_by = request.GET.get('group_by') or None
+        error = group_by_error(self.model, group_by)
+        if error:
+            return json_response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag, data = await aget_stats(self.model, group_by)
+        etag = f'"{etag}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = json_response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+def read_upload(request):
+    return request.FILES.getlist('images'), request.POST.get('batchId', str(uuid.uuid4()))
+
+
+def read_data(request):
+    return Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]).data
+
+
+async def in_thread(func, *args):
+    """
+    Выполнить блокирующий вызов (S3, разбор тела запроса) в пуле потоков
+    ``storage_io_executor``.
+
+    Цикл событий в это время обслуживает другие запросы, а размер пула
+    (IMAGE_STORAGE_IO_WORKERS) ограничивает число одновременных обращений.
+    """
+    return await sync_to_async(func, thread_sensitive=False, executor=storage_io_executor())(*args)
+
+
+async def checked_storage():
+    storage = get_image_storage()
+    try:
+        await in_thread(storage.check)
+    except ImageStorageError as storage_error:
+        return None, JsonResponse({'success': False, 'error': str(storage_error)}, status=500)
+    return storage, None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncImageUploadView(View):
+    """Асинхронный вариант ImageUploadView"""
+
+    async def post(self, request):
+        try:
+            files, batch_id = await in_thread(read_upload, request)
+            if not files:
+                return JsonResponse({'success': False, 'error': 'No files provided'}, status=400)
+
+            storage, error = await checked_storage()
+            if error:
+                return error
+            uploaded_images = await in_thread(upload_images, storage, files, batch_id)
+            return JsonResponse({'success': True, 'images': uploaded_images})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncImageDeleteView(View):
+    """Асинхронный вариант ImageDeleteView"""
+
+    async def delete(self, request):
+        try:
+            data = await in_thread(read_data, request)
+            image_key = data.get('imageKey')
+            if not image_key:
+                return JsonResponse({'success': False, 'error': 'Image key not provided'}, status=400)
+
+            storage, error = await checked_storage()
+            if error:
+                return error
+            await in_thread(storage.delete, image_key)
+            for key in derivative_keys(await sync_to_async(detach_photos)(image_key)):
+                await in_thread(storage.delete, key)
+            return JsonResponse({'success': True, 'message': 'Image deleted successfully'})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -1,8 +1,40 @@
-from rest_framework.authentication import SessionAuthentication
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, SessionAuthentication, get_authorization_header
+
+from .tokens import TokenError, authenticate_access
 
 
 class CsrfExemptSessionAuthentication(SessionAuthentication):
     """Session authentication class that does not enforce CSRF checks."""
 
     def enforce_csrf(self, request):
-        return
\ No newline at end of file
+        return
+
+
+class BearerTokenAuthentication(BaseAuthentication):
+    """
+    Access-токен из ``Authorization: Bearer <token>`` (выдается LoginView).
+
+    В отличие от BasicAuthentication не хеширует пароль на каждый запрос:
+    проверяется подпись токена и состояние сессии в кэше.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        return token_credentials(get_authorization_header(request).decode('latin-1'))
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+def token_credentials(header):
+    """``(user, id сессии)`` по заголовку Authorization или None, если это не Bearer"""
+    parts = header.split()
+    if not parts or parts[0].lower() != 'bearer':
+        return None
+    if len(parts) != 2:
+        raise exceptions.AuthenticationFailed('Некорректный заголовок Authorization')
+    try:
+        return authenticate_access(parts[1])
+    except TokenError as error:
+        raise exceptions.AuthenticationFailed(str(error))
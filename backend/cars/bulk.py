@@ -0,0 +1,228 @@
+"""
+Массовый импорт и потоковый экспорт объявлений в CSV и NDJSON
+"""
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+from .cache import bump_version
+from .photos import photo_urls, replace_photos
+from .pricing import set_prices_eur
+
+CSV_CONTENT_TYPES = ('text/csv', 'application/csv')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class ImportFormatError(Exception):
+    """Тело запроса не в поддерживаемом формате"""
+
+
+def parse_rows(request):
+    """
+    Построчно читать тело запроса, не загружая его целиком.
+
+    Возвращает итератор ``(номер строки, словарь полей | ошибка разбора)``.
+    """
+    content_type = request.content_type.split(';')[0].strip().lower()
+    lines = codecs.iterdecode(request._request, 'utf-8')
+    if content_type in CSV_CONTENT_TYPES:
+        return parse_csv(lines)
+    if content_type in NDJSON_CONTENT_TYPES:
+        return parse_ndjson(lines)
+    raise ImportFormatError(
+        f'Неподдерживаемый Content-Type: {content_type}. Ожидается text/csv или application/x-ndjson'
+    )
+
+
+def parse_csv(lines):
+    reader = csv.DictReader(lines)
+    for number, row in enumerate(reader, start=1):
+        # Пустые ячейки считаются незаполненными полями
+        yield number, {key: value for key, value in row.items() if key and value not in ('', None)}
+
+
+def parse_ndjson(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, ValueError(f'Некорректный JSON: {error}')
+            continue
+        if not isinstance(row, dict):
+            yield number, ValueError('Строка должна быть JSON-объектом')
+            continue
+        yield number, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def decode_json_fields(serializer_class, row):
+    """В CSV списки и JSON-поля (photos) приходят строкой"""
+    for name, field in serializer_class().fields.items():
+        if isinstance(field, (serializers.ListField, serializers.JSONField)) and isinstance(row.get(name), str):
+            row[name] = json.loads(row[name])
+    return row
+
+
+def import_rows(serializer_class, rows, admin, unique_field=None):
+    """
+    Проверить строки пачками и вставить их через ``bulk_create``.
+
+    Каждая пачка — одна транзакция и один INSERT; при ``unique_field``
+    существующие записи обновляются (upsert), а повтор ключа внутри
+    пачки означает, что побеждает последняя строка. У существующей
+    записи меняются только поля, которые есть в строке: строки с разным
+    набором полей идут отдельными INSERT. Фотографии заменяются списком
+    из строки, тоже одним INSERT на пачку, только у строк с ``photos``.
+    Возвращает сводку с ошибками по номерам строк.
+    """
+    model = serializer_class.Meta.model
+    chunk_size = getattr(settings, 'BULK_IMPORT_CHUNK_SIZE', 500)
+    report = {'created': 0, 'updated': 0, 'errors': []}
+    columns = {field.name for field in model._meta.concrete_fields}
+
+    for chunk in chunked(rows, chunk_size):
+        objects, provided, photos = {}, {}, {}
+        for number, row in chunk:
+            if isinstance(row, Exception):
+                report['errors'].append({'row': number, 'errors': {'non_field_errors': [str(row)]}})
+                continue
+            try:
+                row = decode_json_fields(serializer_class, row)
+            except ValueError as error:
+                report['errors'].append({'row': number, 'errors': {'photos': [f'Некорректный JSON: {error}']}})
+                continue
+            serializer = serializer_class(data=row)
+            if not serializer.is_valid():
+                report['errors'].append({'row': number, 'errors': serializer.errors})
+                continue
+            data = dict(serializer.validated_data)
+            instance = model(admin=admin, **{name: value for name, value in data.items() if name in columns})
+            key = getattr(instance, unique_field) if unique_field else number
+            objects.pop(key, None)
+            objects[key] = instance
+            provided[key] = tuple(sorted(name for name in data if name in columns and name != unique_field))
+            photos.pop(key, None)
+            if 'photos' in data:
+                photos[key] = data['photos']
+        if not objects:
+            continue
+
+        with transaction.atomic():
+            if unique_field:
+                existing = {
+                    row[0]: row[1:] for row in
+                    model.objects.filter(**{f'{unique_field}__in': list(objects)})
+                    .values_list(unique_field, 'price', 'currency')
+                }
+                # price_eur считается и по полям, которых в строке нет
+                for key, (price, currency) in existing.items():
+                    if 'price' not in provided[key]:
+                        objects[key].price = price
+                    if 'currency' not in provided[key]:
+                        objects[key].currency = currency
+                set_prices_eur(objects.values())
+                groups = {}
+                for key, instance in objects.items():
+                    groups.setdefault(provided[key], []).append(instance)
+                for fields, instances in groups.items():
+                    model.objects.bulk_create(
+                        instances,
+                        update_conflicts=True,
+                        unique_fields=[unique_field],
+                        update_fields=[*fields, 'price_eur', 'updated_at'],
+                    )
+                report['updated'] += len(existing)
+                report['created'] += len(objects) - len(existing)
+            else:
+                set_prices_eur(objects.values())
+                model.objects.bulk_create(objects.values())
+                report['created'] += len(objects)
+            # bulk_create (и upsert тоже) проставляет pk на PostgreSQL и SQLite
+            if photos:
+                replace_photos(model, {objects[key].pk: items for key, items in photos.items()})
+
+    if report['created'] or report['updated']:
+        # bulk_create не посылает post_save, поэтому кэш сбрасываем сами
+        bump_version(model)
+    return report
+
+
+def export_response(queryset, fields, output, ordering=('id',), filename=None, extra=()):
+    """
+    Потоковая выгрузка в CSV или NDJSON без загрузки всей таблицы в память.
+
+    Строки читаются через ``.iterator()``: на PostgreSQL это серверный
+    курсор, из которого берется по ``BULK_EXPORT_CHUNK_SIZE`` строк.
+    Поле ``photos`` (URL из модели Photo) подгружается одним запросом
+    на каждую такую пачку. Словари из ``extra`` выводятся после строк
+    ``queryset``; отсутствующие в них поля пустые.
+    """
+    chunk_size = getattr(settings, 'BULK_EXPORT_CHUNK_SIZE', 2000)
+    model = queryset.model
+    columns = list(dict.fromkeys(['id'] + [name for name in fields if name != 'photos']))
+    values = queryset.order_by(*ordering).values_list(*columns).iterator(chunk_size=chunk_size)
+    json_fields = {
+        field.name for field in model._meta.concrete_fields if isinstance(field, models.JSONField)
+    } | {'photos'}
+
+    def records():
+        for chunk in chunked(values, chunk_size):
+            photos = photo_urls(model, [row[0] for row in chunk]) if 'photos' in fields else {}
+            for row in chunk:
+                record = dict(zip(columns, row))
+                record['photos'] = photos.get(record['id'], [])
+                yield [record[name] for name in fields]
+        for record in extra:
+            yield [record.get(name) for name in fields]
+
+    rows = records()
+
+    if output == 'csv':
+        class Echo:
+            def write(self, value):
+                return value
+
+        writer = csv.writer(Echo())
+
+        def cell(name, value):
+            if value is None:
+                return ''
+            if name in json_fields:
+                return json.dumps(value, ensure_ascii=False)
+            if hasattr(value, 'isoformat'):
+                return value.isoformat()
+            return value
+
+        def stream():
+            yield writer.writerow(fields)
+            for row in rows:
+                yield writer.writerow([cell(name, value) for name, value in zip(fields, row)])
+
+        content_type = 'text/csv; charset=utf-8'
+        extension = 'csv'
+    else:
+        def stream():
+            for row in rows:
+                yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+        content_type = 'application/x-ndjson; charset=utf-8'
+        extension = 'ndjson'
+
+    response = StreamingHttpResponse(stream(), content_type=content_type)
+    filename = f'{filename or queryset.model._meta.model_name + "s"}.{extension}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,115 @@
+"""
+Версии кэша каталога автомобилей и запчастей
+"""
+import hashlib
+import threading
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+
+def version_key(model):
+    return f'catalog:version:{model._meta.label_lower}'
+
+
+def get_version(model):
+    """Текущая версия данных модели; меняется при каждом сохранении или удалении"""
+    version = cache.get(version_key(model))
+    if version is None:
+        cache.add(version_key(model), 1, timeout=None)
+        version = cache.get(version_key(model), 1)
+    return version
+
+
+async def aget_version(model):
+    """Асинхронный вариант get_version"""
+    version = await cache.aget(version_key(model))
+    if version is None:
+        await cache.aadd(version_key(model), 1, timeout=None)
+        version = await cache.aget(version_key(model), 1)
+    return version
+
+
+def bump_version(model):
+    """Инвалидировать все закэшированные данные модели"""
+    try:
+        return cache.incr(version_key(model))
+    except ValueError:
+        cache.add(version_key(model), 2, timeout=None)
+        return cache.get(version_key(model), 2)
+
+
+def response_cache_key(model, version, action, request, pk=''):
+    """Ключ кэша ответа; общий для синхронных и асинхронных представлений"""
+    params = sorted(
+        (key, value)
+        for key in request.GET
+        for value in request.GET.getlist(key)
+    )
+    digest = hashlib.md5(f'{request.get_host()}|{pk}|{urlencode(params)}'.encode()).hexdigest()
+    return f'catalog:response:{model._meta.label_lower}:{version}:{action}:{digest}'
+
+
+class ResponseCacheMixin:
+    """
+    Кэш ответов list/retrieve для анонимных GET-запросов.
+
+    Ключ строится из версии модели, действия, pk и нормализованной
+    строки запроса, поэтому любое сохранение или удаление объекта
+    (см. ``signals.py``) делает старые ответы недостижимыми.
+    Ответ помечается заголовком ``X-Cache: HIT``/``MISS``.
+    """
+    cached_actions = ('list', 'retrieve')
+    response_cache_counters = Counter()
+    _counters_lock = threading.Lock()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request):
+        model = self.get_queryset().model
+        return response_cache_key(
+            model, get_version(model), self.action, request, self.kwargs.get(self.lookup_field, '')
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if (
+            not getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+            or request.method != 'GET'
+            or request.user.is_authenticated
+            or self.action not in self.cached_actions
+        ):
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            self.count_response_cache('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        self.count_response_cache('misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    @classmethod
+    def count_response_cache(cls, outcome):
+        with cls._counters_lock:
+            cls.response_cache_counters[outcome] += 1
+
+
+def response_cache_metrics():
+    """Счетчики попаданий и промахов кэша ответов в текущем процессе"""
+    with ResponseCacheMixin._counters_lock:
+        counters = ResponseCacheMixin.response_cache_counters
+        return {'hits': counters['hits'], 'misses': counters['misses']}
@@ -0,0 +1,119 @@
+"""
+Счетчик просмотров автомобилей и запчастей
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, When
+from django.http import Http404
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """
+    Счетчик просмотров без read-modify-write.
+
+    В обычном режиме каждый просмотр — один атомарный
+    ``UPDATE ... SET views = views + 1``, который не трогает остальные
+    колонки и ``updated_at``. В буферизованном режиме
+    (``VIEW_COUNTER_BUFFERED=True``) приращения копятся в памяти процесса
+    и сбрасываются одним ``UPDATE`` с ``CASE`` на модель, когда прошло
+    ``VIEW_COUNTER_FLUSH_INTERVAL`` секунд или накопилось
+    ``VIEW_COUNTER_MAX_PENDING`` объектов, а также при завершении процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._last_flush = time.monotonic()
+
+    @property
+    def buffered(self):
+        return getattr(settings, 'VIEW_COUNTER_BUFFERED', False)
+
+    def increment(self, model, pk):
+        """Засчитать просмотр и вернуть текущее значение счетчика"""
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+        if not self.buffered:
+            if not model.objects.filter(pk=pk).update(views=F('views') + 1):
+                raise Http404
+            return model.objects.filter(pk=pk).values_list('views', flat=True).get()
+
+        views = model.objects.filter(pk=pk).values_list('views', flat=True).first()
+        if views is None:
+            raise Http404
+        with self._lock:
+            self._pending[model][pk] += 1
+            pending = self._pending[model][pk]
+        self.maybe_flush()
+        return views + pending
+
+    def pending(self, model, pk):
+        """Приращения, еще не записанные в базу"""
+        with self._lock:
+            return self._pending.get(model, {}).get(int(pk), 0)
+
+    def maybe_flush(self):
+        interval = getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 5)
+        max_pending = getattr(settings, 'VIEW_COUNTER_MAX_PENDING', 1000)
+        with self._lock:
+            size = sum(len(counts) for counts in self._pending.values())
+            due = time.monotonic() - self._last_flush >= interval
+        if due or size >= max_pending:
+            # Просмотр уже в буфере: ошибка сброса не должна ронять запрос
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось сохранить счетчики просмотров, повтор при следующем сбросе')
+
+    def flush(self):
+        """
+        Записать накопленные приращения в базу; возвращает число обновленных строк.
+
+        Если ``UPDATE`` модели не прошел, ее приращения возвращаются в буфер
+        до следующего сброса, а ошибка пробрасывается.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            self._last_flush = time.monotonic()
+        updated = 0
+        for index, (model, counts) in enumerate(pending.items()):
+            if not counts:
+                continue
+            delta = Case(
+                *[When(pk=pk, then=count) for pk, count in counts.items()],
+                default=0,
+                output_field=IntegerField(),
+            )
+            try:
+                updated += model.objects.filter(pk__in=list(counts)).update(views=F('views') + delta)
+            except Exception:
+                self.restore(list(pending.items())[index:])
+                raise
+        return updated
+
+    def restore(self, pending):
+        """Вернуть в буфер несохраненные приращения ``[(model, {pk: count})]``"""
+        with self._lock:
+            for model, counts in pending:
+                for pk, count in counts.items():
+                    self._pending[model][pk] += count
+
+
+view_counter = ViewCounter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        logger.exception('Не удалось сохранить счетчики просмотров при завершении процесса')
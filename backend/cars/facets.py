@@ -0,0 +1,100 @@
+"""
+Счетчики значений для панели фильтров каталога (фасеты)
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Value
+from django_filters import utils
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.response import Response
+
+from .cache import get_version
+from .models import Car, Part
+from .search import CatalogSearchFilter
+
+FACET_FIELDS = {
+    Car: ('brand', 'fuel', 'transmission', 'body_type', 'drive', 'condition', 'city'),
+    Part: ('brand', 'category', 'condition'),
+}
+
+# Метка строки с общим числом объявлений в результате UNION
+TOTAL = ''
+
+
+def facet_params(request, view, model):
+    """
+    Нормализованный набор фильтров: параметры filterset и поиска.
+
+    Как у django-filter и SearchFilter, из повторяющегося параметра берется
+    последнее значение; пустые значения, пагинация и сортировка не влияют.
+    """
+    filterset_class = DjangoFilterBackend().get_filterset_class(view, model.objects.all())
+    names = set(filterset_class.base_filters) | {CatalogSearchFilter.search_param}
+    return sorted((key, request.query_params[key]) for key in names if request.query_params.get(key))
+
+
+def facets_key(model, version, params):
+    digest = hashlib.md5(urlencode(params).encode()).hexdigest()
+    return f'catalog:facets:{model._meta.label_lower}:{version}:{digest}'
+
+
+def filtered_queryset(request, view, model, params):
+    """Объявления под фильтрами ``params`` тем же filterset и поиском, что и у списка"""
+    queryset = model.objects.all()
+    filterset = DjangoFilterBackend().get_filterset_class(view, queryset)(params, queryset=queryset, request=request)
+    if not filterset.is_valid():
+        raise utils.translate_validation(filterset.errors)
+    queryset = filterset.qs
+    if CatalogSearchFilter.search_param in params:
+        queryset = CatalogSearchFilter().filter_queryset(request, queryset, view)
+    return queryset.order_by()
+
+
+def compute_facets(request, view, model, params):
+    """
+    Счетчики значений каждого поля FACET_FIELDS одним SQL-запросом.
+
+    Для поля учитываются все фильтры, кроме его собственного: при выбранной
+    марке панель показывает, сколько объявлений у других марок. Группировки
+    по каждому полю и общее число объединяются через UNION ALL.
+    """
+    total = filtered_queryset(request, view, model, params)
+    grouped = [total.annotate(facet=Value(TOTAL), value=Value('')).values('facet', 'value').annotate(count=Count('pk'))]
+    for field in FACET_FIELDS[model]:
+        queryset = total
+        if field in params:
+            others = {key: value for key, value in params.items() if key != field}
+            queryset = filtered_queryset(request, view, model, others)
+        grouped.append(
+            queryset.filter(**{f'{field}__gt': ''})
+            .annotate(facet=Value(field), value=F(field))
+            .values('facet', 'value')
+            .annotate(count=Count('pk'))
+        )
+
+    data = {'total': 0, 'facets': {field: [] for field in FACET_FIELDS[model]}}
+    for row in grouped[0].union(*grouped[1:], all=True):
+        if row['facet'] == TOTAL:
+            data['total'] = row['count']
+        else:
+            data['facets'][row['facet']].append({'value': row['value'], 'count': row['count']})
+    for values in data['facets'].values():
+        values.sort(key=lambda item: (-item['count'], item['value']))
+    return data
+
+
+def facets_response(request, view, model):
+    """
+    Фасеты под текущими фильтрами; кэшируются по нормализованному набору
+    фильтров до изменения модели.
+    """
+    params = facet_params(request, view, model)
+    key = facets_key(model, get_version(model), params)
+    data = cache.get(key)
+    if data is None:
+        data = compute_facets(request, view, model, dict(params))
+        cache.set(key, data, getattr(settings, 'FACETS_CACHE_TIMEOUT', 300))
+    return Response(data)
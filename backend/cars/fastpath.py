@@ -0,0 +1,138 @@
+"""
+Быстрая сериализация списков каталога из .values() без создания моделей
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from carspark_backend.metrics import timer
+
+# Поля, у которых to_representation возвращает значение из базы без изменений
+IDENTITY_FIELDS = (
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.BooleanField,
+)
+
+# Источники через связь, которые можно собрать из колонок связанной таблицы
+RELATED_SOURCES = {
+    'admin.get_full_name': (
+        ('admin__first_name', 'admin__last_name'),
+        lambda first_name, last_name: f'{first_name} {last_name}'.strip(),
+    ),
+}
+
+
+class RowPlan:
+    """
+    План сборки строк ответа для сериализатора списка.
+
+    Для каждого поля заранее определены колонки ``.values()`` и функция
+    преобразования (Decimal, datetime и т.п. — через ``to_representation``
+    самого поля DRF, поэтому вывод совпадает с обычным сериализатором).
+    Если у сериализатора есть поле, которое так собрать нельзя,
+    ``RowPlan.build`` возвращает None и используется обычный путь.
+
+    Планы кэшируются по набору полей; набор выбирает клиент через
+    ``?fields=``, поэтому кэш ограничен ``cache_size`` последними наборами.
+    """
+    cache_size = 64
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, steps, columns):
+        self.steps = steps
+        self.columns = columns
+
+    @classmethod
+    def build(cls, serializer):
+        key = (type(serializer), tuple(serializer.fields))
+        with cls._lock:
+            if key in cls._cache:
+                cls._cache.move_to_end(key)
+                return cls._cache[key]
+        plan = cls._compile(serializer)
+        with cls._lock:
+            cls._cache[key] = plan
+            while len(cls._cache) > cls.cache_size:
+                cls._cache.popitem(last=False)
+        return plan
+
+    @classmethod
+    def _compile(cls, serializer):
+        steps, columns = [], []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source in RELATED_SOURCES:
+                sources, combine = RELATED_SOURCES[field.source]
+                steps.append((name, sources, combine))
+                columns.extend(sources)
+                continue
+            if '.' in field.source or field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+                return None
+            if isinstance(field, IDENTITY_FIELDS) or (
+                isinstance(field, serializers.JSONField) and not field.binary
+            ):
+                convert = None
+            else:
+                convert = field.to_representation
+            steps.append((name, field.source, convert))
+            if field.source not in columns:
+                columns.append(field.source)
+        return cls(steps, columns)
+
+    def values(self, queryset):
+        """queryset.values() с колонками плана и ключами текущей сортировки"""
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        extra = ['id'] + [
+            name.lstrip('-') for name in ordering
+            if isinstance(name, str) and name.lstrip('-') in model_fields
+        ]
+        columns = list(dict.fromkeys(self.columns + extra))
+        return queryset.values(*columns)
+
+    def serialize(self, rows):
+        with timer('serializer'):
+            return self._serialize(rows)
+
+    def _serialize(self, rows):
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, convert in self.steps:
+                if isinstance(source, tuple):
+                    values = [row[column] for column in source]
+                    if values[0] is None:
+                        continue
+                    item[name] = convert(*values)
+                    continue
+                value = row[source]
+                item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
+
+
+class FastListMixin:
+    """
+    ``list`` строит ответ из словарей ``.values()`` по ``RowPlan``.
+
+    Отключается настройкой ``FAST_LIST_SERIALIZATION = False``.
+    """
+
+    def list(self, request, *args, **kwargs):
+        plan = None
+        if getattr(settings, 'FAST_LIST_SERIALIZATION', True):
+            plan = RowPlan.build(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = plan.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(plan.serialize(page))
+        return Response(plan.serialize(rows))
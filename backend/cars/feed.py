@@ -0,0 +1,121 @@
+"""
+Фид опубликованных автомобилей для площадок-агрегаторов
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .bulk import export_response
+from .models import Car, DeletedCar
+
+FEED_FIELDS = [
+    'id', 'brand', 'model', 'generation', 'year', 'mileage', 'transmission',
+    'fuel', 'drive', 'body_type', 'color', 'power', 'engine_volume',
+    'euro_standard', 'vin', 'condition', 'customs', 'vat', 'owners',
+    'price', 'currency', 'negotiable', 'city', 'description', 'photos', 'status',
+    'created_at', 'updated_at',
+]
+
+
+def tombstone_retention():
+    """Сколько хранится журнал удалений (FEED_TOMBSTONE_RETENTION_DAYS)"""
+    return timedelta(days=getattr(settings, 'FEED_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def record_deletion(car):
+    """Записать надгробие удаленного автомобиля и забыть записи старше срока хранения"""
+    DeletedCar.objects.create(car_id=car.pk, vin=car.vin)
+    DeletedCar.objects.filter(deleted_at__lt=timezone.now() - tombstone_retention()).delete()
+
+
+def tombstones(withdrawn, deleted):
+    """
+    Строки фида для снятых с публикации (их текущий ``status``) и
+    удаленных (``status='deleted'``) автомобилей: только id, VIN,
+    статус и время изменения, без данных объявления.
+    """
+    for row in withdrawn.order_by('updated_at', 'id').values('id', 'vin', 'status', 'updated_at'):
+        yield row
+    for car_id, vin, deleted_at in deleted.order_by('deleted_at', 'id').values_list('car_id', 'vin', 'deleted_at'):
+        yield {'id': car_id, 'vin': vin, 'status': 'deleted', 'updated_at': deleted_at}
+
+
+def feed_response(request):
+    """
+    Все опубликованные автомобили потоком NDJSON или CSV (``?output=csv``).
+
+    ``?updated_since=<ISO 8601>`` отдает изменившиеся опубликованные
+    записи в порядке ``updated_at``, а следом — надгробия (см. tombstones):
+    автомобиль с ``status`` не ``published`` нужно снять с площадки. Журнал удалений хранится
+    FEED_TOMBSTONE_RETENTION_DAYS; на более старый ``updated_since``
+    ответ 410, и нужна полная выгрузка. Ответ несет ``ETag`` и
+    ``Last-Modified``, так что повторный опрос без изменений получает
+    304 после агрегирующих запросов по индексам.
+    """
+    output = request.query_params.get('output', 'ndjson')
+    if output not in ('ndjson', 'csv'):
+        return Response({'error': 'output должен быть ndjson или csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = Car.objects.filter(status='published')
+    withdrawn, deleted = Car.objects.none(), DeletedCar.objects.none()
+    updated_since = request.query_params.get('updated_since')
+    if updated_since:
+        since = parse_datetime(updated_since.replace(' ', '+'))
+        if since is None:
+            return Response(
+                {'error': 'updated_since должен быть датой в формате ISO 8601'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        if since < timezone.now() - tombstone_retention():
+            return Response(
+                {'error': 'updated_since старше журнала удалений: нужна полная выгрузка без updated_since'},
+                status=status.HTTP_410_GONE
+            )
+        queryset = queryset.filter(updated_at__gt=since)
+        withdrawn = Car.objects.filter(updated_at__gt=since).exclude(status='published')
+        deleted = DeletedCar.objects.filter(deleted_at__gt=since)
+
+    summary = queryset.aggregate(last_modified=Max('updated_at'), total=Count('id'))
+    last_modified = summary['last_modified']
+    if updated_since:
+        for removed in (
+            withdrawn.aggregate(last_modified=Max('updated_at'), total=Count('id')),
+            deleted.aggregate(last_modified=Max('deleted_at'), total=Count('id')),
+        ):
+            if removed['last_modified'] and (last_modified is None or removed['last_modified'] > last_modified):
+                last_modified = removed['last_modified']
+            summary['total'] = f"{summary['total']}+{removed['total']}"
+    etag = hashlib.md5(
+        f"{last_modified and last_modified.isoformat()}|{summary['total']}|{output}|{updated_since}".encode()
+    ).hexdigest()
+    etag = f'"{etag}"'
+
+    if_none_match = request.headers.get('If-None-Match')
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    not_modified = (
+        etag in if_none_match if if_none_match
+        else last_modified is not None and if_modified_since is not None
+        and int(last_modified.timestamp()) <= if_modified_since
+    )
+    if not_modified:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = export_response(
+            queryset, FEED_FIELDS, output, ordering=('updated_at', 'id'), filename='cars-feed',
+            extra=tombstones(withdrawn, deleted),
+        )
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'no-cache'
+    return response
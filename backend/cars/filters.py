@@ -0,0 +1,27 @@
+"""
+Фильтры каталога: поля модели и бюджет в евро (price_eur_min / price_eur_max)
+"""
+import django_filters
+
+from .models import Car, Part
+
+
+class PriceEurFilterSet(django_filters.FilterSet):
+    """Диапазон цены в EUR; условие по индексу (status, price_eur)"""
+    price_eur_min = django_filters.NumberFilter(field_name='price_eur', lookup_expr='gte')
+    price_eur_max = django_filters.NumberFilter(field_name='price_eur', lookup_expr='lte')
+
+
+class CarFilter(PriceEurFilterSet):
+    class Meta:
+        model = Car
+        fields = [
+            'brand', 'model', 'year', 'transmission', 'fuel', 'body_type', 'drive', 'condition', 'city', 'status',
+            'admin',
+        ]
+
+
+class PartFilter(PriceEurFilterSet):
+    class Meta:
+        model = Part
+        fields = ['brand', 'model', 'category', 'condition', 'status', 'admin']
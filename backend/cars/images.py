@@ -0,0 +1,496 @@
+"""
+Хранилища изображений и параллельная загрузка фотографий
+"""
+import logging
+import mimetypes
+import os
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Производные изображения: имя -> максимальные ширина и высота
+DERIVATIVES = {
+    'thumb': (320, 240),
+    'card': (800, 600),
+    'full': (1920, 1920),
+}
+
+DERIVATIVE_FORMATS = {
+    'WEBP': ('webp', 'image/webp'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+
+# Форматы, в которых хранится очищенный оригинал: формат PIL -> тип содержимого
+ORIGINAL_FORMATS = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+}
+
+
+# Объект хранилища при обходе: ключ, время изменения (aware datetime) и размер в байтах
+StoredObject = namedtuple('StoredObject', ['key', 'modified', 'size'])
+
+
+class ImageStorageError(Exception):
+    """Хранилище не настроено или недоступно"""
+
+
+class ImageStorage:
+    """Интерфейс хранилища фотографий объявлений"""
+
+    def check(self):
+        """Проверить настройки и доступность; при ошибке — ImageStorageError"""
+
+    def url(self, key):
+        """Публичный URL файла"""
+        raise NotImplementedError
+
+    def key_for_url(self, url):
+        """Ключ файла по его публичному URL или пустая строка, если URL не из этого хранилища"""
+        prefix = self.url('')
+        return url[len(prefix):] if url.startswith(prefix) and len(url) > len(prefix) else ''
+
+    def save(self, key, fileobj, content_type=None):
+        """Сохранить файл под ключом и вернуть его публичный URL"""
+        raise NotImplementedError
+
+    def exists(self, key):
+        """Есть ли в хранилище файл с ключом ``key``"""
+        raise NotImplementedError
+
+    def read(self, key):
+        """Содержимое файла в байтах"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def list_prefixes(self, prefix=''):
+        """
+        Один уровень под ``prefix``: ``(подпрефиксы, [StoredObject])``.
+
+        Подпрефиксы заканчиваются на ``/`` и обходятся через ``list_objects``,
+        в том числе параллельно.
+        """
+        raise NotImplementedError
+
+    def list_objects(self, prefix=''):
+        """Все объекты под ``prefix`` рекурсивно (генератор StoredObject)"""
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        """Удалить файлы пачкой и вернуть ключи, которые удалить не удалось"""
+        failed = []
+        for key in keys:
+            try:
+                self.delete(key)
+            except Exception:
+                logger.exception('Не удалось удалить %s', key)
+                failed.append(key)
+        return failed
+
+
+class S3ImageStorage(ImageStorage):
+    """
+    Хранилище в AWS S3.
+
+    Клиент boto3 потокобезопасен, поэтому создается один раз на процесс,
+    а ``head_bucket`` выполняется только до первой успешной проверки.
+    """
+
+    def __init__(self):
+        self.bucket_name = settings.AWS_S3_BUCKET_NAME
+        self._checked = False
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return s3_client(settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY, settings.AWS_REGION)
+
+    def check(self):
+        if self._checked:
+            return
+        if not getattr(settings, 'USE_S3', False):
+            raise ImageStorageError('S3 upload is disabled. Set USE_S3=True to enable S3 uploads.')
+        if not settings.AWS_ACCESS_KEY_ID or not settings.AWS_SECRET_ACCESS_KEY:
+            raise ImageStorageError(
+                'AWS credentials not configured. Please set AWS_ACCESS_KEY_ID and '
+                'AWS_SECRET_ACCESS_KEY in environment variables.'
+            )
+        if not self.bucket_name:
+            raise ImageStorageError('AWS S3 bucket not configured')
+        with self._lock:
+            if self._checked:
+                return
+            try:
+                self.client.head_bucket(Bucket=self.bucket_name)
+            except Exception as bucket_error:
+                raise ImageStorageError(f'Bucket {self.bucket_name} not accessible: {str(bucket_error)}')
+            self._checked = True
+
+    def url(self, key):
+        return f"https://{self.bucket_name}.s3.amazonaws.com/{key}"
+
+    def save(self, key, fileobj, content_type=None):
+        extra_args = {'ContentType': content_type} if content_type else {}
+        self.client.upload_fileobj(fileobj, self.bucket_name, key, ExtraArgs=extra_args)
+        return self.url(key)
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as error:
+            if error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def read(self, key):
+        return self.client.get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    # Ограничение DeleteObjects: не больше 1000 ключей за запрос
+    DELETE_BATCH_SIZE = 1000
+
+    def pages(self, **params):
+        paginator = self.client.get_paginator('list_objects_v2')
+        return paginator.paginate(Bucket=self.bucket_name, **params)
+
+    def stored_object(self, item):
+        return StoredObject(item['Key'], item['LastModified'], item['Size'])
+
+    def list_prefixes(self, prefix=''):
+        prefixes, objects = [], []
+        for page in self.pages(Prefix=prefix, Delimiter='/'):
+            prefixes += [item['Prefix'] for item in page.get('CommonPrefixes', [])]
+            objects += [self.stored_object(item) for item in page.get('Contents', [])]
+        return prefixes, objects
+
+    def list_objects(self, prefix=''):
+        for page in self.pages(Prefix=prefix):
+            for item in page.get('Contents', []):
+                yield self.stored_object(item)
+
+    def delete_many(self, keys):
+        failed = []
+        for start in range(0, len(keys), self.DELETE_BATCH_SIZE):
+            batch = keys[start:start + self.DELETE_BATCH_SIZE]
+            response = self.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+            for error in response.get('Errors', []):
+                logger.error('Не удалось удалить %s: %s', error.get('Key'), error.get('Message'))
+                failed.append(error.get('Key'))
+        return failed
+
+
+class LocalImageStorage(ImageStorage):
+    """Хранилище в локальной папке (IMAGE_STORAGE_ROOT) — для разработки и тестов"""
+
+    def __init__(self, root=None, base_url=None):
+        self.root = (
+            root or getattr(settings, 'IMAGE_STORAGE_ROOT', None) or os.path.join(settings.MEDIA_ROOT, 'images')
+        )
+        self.base_url = (
+            base_url or getattr(settings, 'IMAGE_STORAGE_URL', None) or f"{settings.MEDIA_URL.rstrip('/')}/images"
+        )
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ImageStorageError(f'Invalid image key: {key}')
+        return path
+
+    def url(self, key):
+        return f'{self.base_url}/{key}'
+
+    def save(self, key, fileobj, content_type=None):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as destination:
+            for chunk in iter(lambda: fileobj.read(1024 * 1024), b''):
+                destination.write(chunk)
+        return self.url(key)
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def read(self, key):
+        with open(self.path(key), 'rb') as source:
+            return source.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def stored_object(self, entry, key):
+        stat = entry.stat()
+        return StoredObject(key, datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc), stat.st_size)
+
+    def list_prefixes(self, prefix=''):
+        directory = os.path.join(self.root, prefix)
+        prefixes, objects = [], []
+        if not os.path.isdir(directory):
+            return prefixes, objects
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            if entry.is_dir():
+                prefixes.append(f'{prefix}{entry.name}/')
+            elif entry.is_file():
+                objects.append(self.stored_object(entry, f'{prefix}{entry.name}'))
+        return prefixes, objects
+
+    def list_objects(self, prefix=''):
+        prefixes, objects = self.list_prefixes(prefix)
+        yield from objects
+        for subprefix in prefixes:
+            yield from self.list_objects(subprefix)
+
+
+@lru_cache(maxsize=None)
+def s3_client(access_key_id, secret_access_key, region):
+    import boto3
+
+    return boto3.client(
+        's3',
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key,
+        region_name=region
+    )
+
+
+@lru_cache(maxsize=None)
+def get_image_storage():
+    """Хранилище из настройки IMAGE_STORAGE_BACKEND, одно на процесс"""
+    backend = getattr(settings, 'IMAGE_STORAGE_BACKEND', 'cars.images.S3ImageStorage')
+    return import_string(backend)()
+
+
+@lru_cache(maxsize=None)
+def upload_executor():
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'IMAGE_UPLOAD_WORKERS', 4),
+        thread_name_prefix='image-upload',
+    )
+
+
+@lru_cache(maxsize=None)
+def storage_io_executor():
+    """Пул для блокирующих вызовов хранилища из асинхронных представлений"""
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'IMAGE_STORAGE_IO_WORKERS', 32),
+        thread_name_prefix='image-storage-io',
+    )
+
+
+@lru_cache(maxsize=None)
+def derivative_executor():
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+        thread_name_prefix='image-derivatives',
+    )
+
+
+@receiver(setting_changed)
+def reset_image_storage(setting, **kwargs):
+    if setting.startswith(('IMAGE_', 'AWS_', 'USE_S3', 'MEDIA_')):
+        get_image_storage.cache_clear()
+        upload_executor.cache_clear()
+        storage_io_executor.cache_clear()
+        derivative_executor.cache_clear()
+
+
+_pending_derivatives = set()
+_pending_lock = threading.Lock()
+
+
+def derivatives_enabled():
+    if not getattr(settings, 'IMAGE_DERIVATIVES_ENABLED', True):
+        return False
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def derivative_format():
+    return DERIVATIVE_FORMATS[getattr(settings, 'IMAGE_DERIVATIVE_FORMAT', 'WEBP').upper()]
+
+
+def derivative_key(key, name):
+    extension, _content_type = derivative_format()
+    return f"{os.path.splitext(key)[0]}/{name}.{extension}"
+
+
+def has_derivatives(key):
+    """Создаются ли для файла ``key`` производные при загрузке (только для изображений)"""
+    content_type, _encoding = mimetypes.guess_type(key)
+    return derivatives_enabled() and (content_type or '').startswith('image/')
+
+
+def derivative_entries(storage, key, names=DERIVATIVES):
+    """Ключи и URL производных файла ``key``: ``{имя: {'key': ..., 'url': ...}}``"""
+    return {
+        name: {'key': derivative_key(key, name), 'url': storage.url(derivative_key(key, name))}
+        for name in names
+    }
+
+
+def stored_derivative_entries(storage, key):
+    """Записи только тех производных файла ``key``, которые есть в хранилище"""
+    return derivative_entries(storage, key, [
+        name for name in DERIVATIVES if storage.exists(derivative_key(key, name))
+    ])
+
+
+def image_size(data):
+    """Ширина и высота изображения с учетом ориентации из EXIF"""
+    from PIL import Image
+
+    with Image.open(BytesIO(data)) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in (5, 6, 7, 8):
+            width, height = height, width
+    return width, height
+
+
+def render_derivatives(data):
+    """
+    Уменьшенные копии изображения для каждого размера из DERIVATIVES.
+
+    Ориентация из EXIF применяется к пикселям, сами метаданные
+    (включая геотеги) в копии не попадают. Возвращает
+    ``{имя: (байты, ширина, высота)}``.
+    """
+    from PIL import Image, ImageOps
+
+    image_format = getattr(settings, 'IMAGE_DERIVATIVE_FORMAT', 'WEBP').upper()
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 82)
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image_format == 'WEBP' and 'A' in image.getbands() else 'RGB')
+
+    rendered = {}
+    for name, size in DERIVATIVES.items():
+        copy = image.copy()
+        copy.thumbnail(size, Image.LANCZOS)
+        output = BytesIO()
+        copy.save(output, image_format, quality=quality, optimize=True)
+        rendered[name] = (output.getvalue(), copy.width, copy.height)
+    return rendered
+
+
+def sanitize_image(data):
+    """
+    Оригинал для хранения вместо загруженного файла.
+
+    Ориентация из EXIF применяется к пикселям, метаданные (включая
+    геотеги) отбрасываются, размер ограничивается ``DERIVATIVES['full']``.
+    Формат JPEG, PNG или WebP сохраняется, остальные перекодируются в
+    JPEG. Возвращает ``(байты, тип содержимого, ширина, высота)``.
+    """
+    from PIL import Image, ImageOps
+
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 82)
+    with Image.open(BytesIO(data)) as source:
+        image_format = source.format if source.format in ORIGINAL_FORMATS else 'JPEG'
+        # JPEG сразу декодируется в уменьшенном масштабе, не меньше итогового размера
+        source.draft('RGB', DERIVATIVES['full'])
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image_format != 'JPEG' and 'A' in image.getbands() else 'RGB')
+    image.thumbnail(DERIVATIVES['full'], Image.LANCZOS)
+    output = BytesIO()
+    image.save(output, image_format, quality=quality, optimize=True)
+    return output.getvalue(), ORIGINAL_FORMATS[image_format], image.width, image.height
+
+
+def store_derivatives(storage, key, data):
+    _extension, content_type = derivative_format()
+    try:
+        for name, (content, _width, _height) in render_derivatives(data).items():
+            storage.save(derivative_key(key, name), BytesIO(content), content_type)
+    except Exception:
+        logger.exception('Не удалось создать производные изображения для %s', key)
+
+
+def schedule_derivatives(storage, key, data):
+    """Поставить обработку в пул воркеров; ответ на загрузку ее не ждет"""
+    if not getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        store_derivatives(storage, key, data)
+        return
+    future = derivative_executor().submit(store_derivatives, storage, key, data)
+    with _pending_lock:
+        _pending_derivatives.add(future)
+    future.add_done_callback(_forget_derivative)
+
+
+def _forget_derivative(future):
+    with _pending_lock:
+        _pending_derivatives.discard(future)
+
+
+def wait_for_derivatives(timeout=None):
+    """Дождаться всех запланированных обработок (для тестов и управляющих команд)"""
+    with _pending_lock:
+        pending = list(_pending_derivatives)
+    wait(pending, timeout=timeout)
+
+
+def image_key(batch_id, filename):
+    file_extension = os.path.splitext(filename)[1]
+    return f"{batch_id}/{uuid.uuid4()}{file_extension}"
+
+
+def upload_images(storage, files, batch_id):
+    """
+    Загрузить файлы пачки параллельно через общий ограниченный пул потоков.
+
+    Результат идет в порядке входных файлов: ``[{'url': ..., 'key': ...}]``.
+    Изображение сохраняется очищенным (см. sanitize_image), в запись
+    добавляются его размеры (``width``, ``height``) и ключи и URL
+    производных (``derivatives``), которые создаются в фоне после ответа.
+    Запись целиком можно передать в ``photos`` объявления.
+    """
+    make_derivatives = derivatives_enabled()
+
+    def upload(file):
+        key = image_key(batch_id, file.name)
+        data = None
+        if make_derivatives and (file.content_type or '').startswith('image/'):
+            try:
+                data, content_type, width, height = sanitize_image(file.read())
+            except Exception:
+                logger.warning('Не удалось обработать изображение %s, сохраняется как есть', file.name)
+            file.seek(0)
+        if data is None:
+            return {'url': storage.save(key, file, file.content_type), 'key': key}
+
+        image = {
+            'url': storage.save(key, BytesIO(data), content_type), 'key': key,
+            'width': width, 'height': height, 'derivatives': derivative_entries(storage, key),
+        }
+        schedule_derivatives(storage, key, data)
+        return image
+
+    if len(files) == 1:
+        return [upload(files[0])]
+    return list(upload_executor().map(upload, files))
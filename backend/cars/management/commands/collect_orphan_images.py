@@ -0,0 +1,73 @@
+"""
+Удаление из хранилища фотографий, на которые не ссылается ни одно объявление
+
+Запуск по расписанию (cron, раз в сутки):
+    python manage.py collect_orphan_images --delete
+Без --delete команда только показывает отчет. --local-root направляет проход
+в локальную папку (LocalImageStorage) вместо хранилища из настроек.
+"""
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from cars.images import LocalImageStorage, get_image_storage
+from cars.orphans import collect_orphans
+
+
+class Command(BaseCommand):
+    help = 'Найти и удалить файлы хранилища фотографий без ссылок из объявлений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='удалить найденные файлы (по умолчанию dry-run)')
+        parser.add_argument(
+            '--grace-hours', type=float, default=getattr(settings, 'IMAGE_GC_GRACE_HOURS', 24),
+            help='не трогать файлы моложе этого срока',
+        )
+        parser.add_argument('--prefix', default='', help='обойти только ключи с этим префиксом')
+        parser.add_argument('--workers', type=int, default=8, help='потоков для параллельного листинга')
+        parser.add_argument('--batch-size', type=int, default=1000, help='ключей в одном запросе на удаление')
+        parser.add_argument('--storage', default=None, help='класс хранилища (по умолчанию IMAGE_STORAGE_BACKEND)')
+        parser.add_argument('--local-root', default=None, help='папка LocalImageStorage вместо хранилища')
+        parser.add_argument('--json', action='store_true', help='вывести отчет в JSON')
+
+    def handle(self, *args, **options):
+        if options['local_root']:
+            storage = LocalImageStorage(root=options['local_root'])
+        elif options['storage']:
+            storage = import_string(options['storage'])()
+        else:
+            storage = get_image_storage()
+
+        report = collect_orphans(
+            storage,
+            grace=timedelta(hours=options['grace_hours']),
+            prefix=options['prefix'],
+            dry_run=not options['delete'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+        )
+
+        if options['json']:
+            summary = report.as_dict()
+            summary['dry_run'] = not options['delete']
+            summary['orphan_keys'] = [item.key for item in report.orphans]
+            self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
+            return
+
+        if options['verbosity'] > 1 or not options['delete']:
+            for item in report.orphans:
+                self.stdout.write(f'{item.key}\t{item.size}\t{item.modified.isoformat()}')
+        self.stdout.write(
+            f'Просмотрено {report.listed}, свежих {report.recent}, исключено {report.excluded}, '
+            f'со ссылками {report.referenced}, без ссылок {len(report.orphans)} '
+            f'({report.orphan_bytes / 1024 / 1024:.1f} МБ)'
+        )
+        if not options['delete']:
+            self.stdout.write('Dry-run: ничего не удалено, для удаления добавьте --delete')
+        elif report.failed:
+            self.stderr.write(f'Удалено {report.deleted}, не удалось удалить {len(report.failed)}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Удалено {report.deleted}'))
@@ -0,0 +1,23 @@
+"""
+Генерация OpenAPI-схемы для /api/schema/ заранее, при сборке образа
+
+Запуск: python manage.py generate_openapi_schema
+Файлы schema-<версия>.yaml и .json пишутся в OPENAPI_SCHEMA_DIR; файлы
+прежних версий удаляются. Без них схема генерируется при первом запросе.
+"""
+from django.core.management.base import BaseCommand
+
+from carspark_backend.schema import code_version, write_schema_files
+
+
+class Command(BaseCommand):
+    help = 'Сгенерировать OpenAPI-схему для текущей версии кода'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default=None, help='папка для файлов (по умолчанию OPENAPI_SCHEMA_DIR)')
+
+    def handle(self, *args, **options):
+        paths = write_schema_files(options['directory'])
+        for path in paths:
+            self.stdout.write(f'{path}\t{path.stat().st_size} байт')
+        self.stdout.write(self.style.SUCCESS(f'Схема для версии {code_version()} записана'))
@@ -0,0 +1,52 @@
+"""
+Создание недостающих производных для уже сохраненных фотографий
+
+Нужна для фотографий, загруженных до появления производных или
+сохраненных в объявлении только по URL: миниатюры рендерятся из оригинала
+в хранилище, в Photo записываются derivatives и размеры.
+    python manage.py render_photo_derivatives
+С --dry-run команда только считает фотографии, которым нужна обработка.
+"""
+from django.core.management.base import BaseCommand
+
+from cars.cache import bump_version
+from cars.images import get_image_storage
+from cars.models import Car, Part, Photo
+from cars.photos import PHOTO_FIELDS, backfill_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Создать недостающие производные (миниатюры) для сохраненных фотографий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='только показать, сколько фотографий обработать')
+        parser.add_argument('--prefix', default='', help='обработать только ключи с этим префиксом')
+
+    def handle(self, *args, **options):
+        storage = get_image_storage()
+        photos = Photo.objects.exclude(key='').filter(key__startswith=options['prefix']).order_by('id')
+        updated, failed = 0, 0
+        changed_models = set()
+        for photo in photos.iterator(chunk_size=500):
+            try:
+                if not backfill_derivatives(storage, photo, dry_run=options['dry_run']):
+                    continue
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{photo.key}: {error}')
+                continue
+            if options['dry_run']:
+                updated += 1
+                continue
+            photo.save(update_fields=list(PHOTO_FIELDS))
+            changed_models.add(Car if photo.car_id else Part)
+            updated += 1
+        for model in changed_models:
+            bump_version(model)
+
+        if options['dry_run']:
+            self.stdout.write(f'Нужна обработка: {updated}, ошибок проверки: {failed}. Dry-run: ничего не изменено')
+        elif failed:
+            self.stderr.write(f'Обновлено {updated}, не удалось обработать {failed}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Обновлено {updated}'))
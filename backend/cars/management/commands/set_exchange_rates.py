@@ -0,0 +1,51 @@
+"""
+Обновление курсов валют к евро и пересчет price_eur объявлений
+
+Запуск: python manage.py set_exchange_rates USD=0.92 RUB=0.0105
+Курсы записываются в ExchangeRate одним upsert, затем price_eur пересчитывается
+одним UPDATE на валюту. --recompute без курсов пересчитывает все валюты,
+например после изменения EXCHANGE_RATES_DEFAULT.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.models import Car, ExchangeRate
+from cars.pricing import get_rates, recompute_prices
+
+
+def parse_rate(value):
+    currency, _sep, rate = value.partition('=')
+    currency = currency.strip().upper()
+    if currency not in dict(Car.CURRENCY_CHOICES) or currency == 'EUR':
+        raise CommandError(f'Неизвестная валюта: {currency}')
+    try:
+        rate = Decimal(rate)
+    except InvalidOperation:
+        raise CommandError(f'Некорректный курс: {value}')
+    if not rate.is_finite() or rate <= 0:
+        raise CommandError(f'Курс должен быть положительным: {value}')
+    return currency, rate
+
+
+class Command(BaseCommand):
+    help = 'Записать курсы валют к EUR и пересчитать price_eur'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rates', nargs='*', help='курсы вида USD=0.92 (EUR за единицу валюты)')
+        parser.add_argument('--recompute', action='store_true', help='пересчитать price_eur во всех валютах')
+
+    def handle(self, *args, **options):
+        rates = dict(parse_rate(value) for value in options['rates'])
+        if not rates and not options['recompute']:
+            raise CommandError('Укажите курсы (USD=0.92) или --recompute')
+
+        # bulk_create не посылает post_save: пересчет один раз для всех валют
+        ExchangeRate.objects.bulk_create(
+            [ExchangeRate(currency=currency, rate=rate) for currency, rate in rates.items()],
+            update_conflicts=True, unique_fields=['currency'], update_fields=['rate', 'updated_at'],
+        )
+        updated = recompute_prices(None if options['recompute'] else list(rates))
+        for currency, rate in sorted(get_rates().items()):
+            self.stdout.write(f'{currency}\t{rate}')
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано объявлений: {updated}'))
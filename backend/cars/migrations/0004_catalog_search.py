@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# Поля и веса полнотекстового индекса; должны совпадать с cars/search.py
+FULLTEXT_FIELDS = {
+    'car': [('brand', 'A'), ('model', 'A'), ('vin', 'A'), ('description', 'C')],
+    'part': [('name', 'A'), ('brand', 'A'), ('model', 'A'), ('description', 'C')],
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for model_name, fields in FULLTEXT_FIELDS.items():
+        model = apps.get_model('cars', model_name)
+        table = model._meta.db_table
+        columns = [name for name, _weight in fields]
+
+        if vendor == 'postgresql':
+            from django.contrib.postgres.indexes import GinIndex
+            from django.contrib.postgres.search import SearchVector
+
+            vector = SearchVector(fields[0][0], weight=fields[0][1], config='simple')
+            for name, weight in fields[1:]:
+                vector += SearchVector(name, weight=weight, config='simple')
+            schema_editor.add_index(model, GinIndex(vector, name=f'{model_name}_search_gin'))
+
+        elif vendor == 'sqlite':
+            # Триггеры синхронизации и первичное заполнение — в cars.search.install_search_triggers
+            # после migrate: при пересоздании таблицы SQLite триггеры теряются
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+                f"{', '.join(columns)}, content='{table}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for model_name in FULLTEXT_FIELDS:
+        table = apps.get_model('cars', model_name)._meta.db_table
+        if vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS {model_name}_search_gin')
+        elif vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0003_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
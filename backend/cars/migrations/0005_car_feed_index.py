@@ -0,0 +1,17 @@
+# Generated by Django 5.0.8 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0004_catalog_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['status', 'updated_at'], name='car_status_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:13
+
+import json
+import re
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Модели объявлений, у которых есть фотографии
+PHOTO_OWNERS = ('car', 'part')
+
+# Публичный URL файла в S3: https://<bucket>.s3[.<region>].amazonaws.com/<key>
+S3_URL_RE = re.compile(r'^https://[^/]+\.s3[.\w-]*\.amazonaws\.com/(?P<key>.+)$')
+
+
+def photo_fields(item):
+    """Поля Photo из элемента старого JSON-списка: URL-строки или записи ImageUploadView"""
+    if isinstance(item, str):
+        item = {'url': item}
+    if not isinstance(item, dict) or not isinstance(item.get('url'), str) or not item['url'].strip():
+        return None
+    key = item.get('key') if isinstance(item.get('key'), str) else ''
+    if not key:
+        match = S3_URL_RE.match(item['url'])
+        key = match['key'] if match else ''
+    size = {
+        name: item[name] for name in ('width', 'height')
+        if isinstance(item.get(name), int) and not isinstance(item[name], bool) and item[name] >= 0
+    }
+    derivatives = item.get('derivatives') if isinstance(item.get('derivatives'), dict) else {}
+    return {'url': item['url'][:500], 'key': key[:500], 'derivatives': derivatives, **size}
+
+
+def copy_photos_to_table(apps, schema_editor):
+    Photo = apps.get_model('cars', 'Photo')
+    for model_name in PHOTO_OWNERS:
+        model = apps.get_model('cars', model_name)
+        batch = []
+        for pk, photos in model.objects.values_list('id', 'photos').iterator(chunk_size=2000):
+            if isinstance(photos, str):
+                try:
+                    photos = json.loads(photos)
+                except ValueError:
+                    photos = [photos]
+            rows = [fields for fields in map(photo_fields, photos or []) if fields]
+            batch.extend(
+                Photo(**{f'{model_name}_id': pk}, position=position, **fields)
+                for position, fields in enumerate(rows)
+            )
+            if len(batch) >= 2000:
+                Photo.objects.bulk_create(batch)
+                batch = []
+        Photo.objects.bulk_create(batch)
+
+
+def copy_photos_to_json(apps, schema_editor):
+    Photo = apps.get_model('cars', 'Photo')
+    for model_name in PHOTO_OWNERS:
+        model = apps.get_model('cars', model_name)
+        column = f'{model_name}_id'
+        photos = defaultdict(list)
+        for photo in Photo.objects.filter(**{f'{column}__isnull': False}).order_by(column, 'position', 'id'):
+            item = {'url': photo.url, 'key': photo.key, 'derivatives': photo.derivatives,
+                    'width': photo.width, 'height': photo.height}
+            item = {name: value for name, value in item.items() if value}
+            photos[getattr(photo, column)].append(
+                photo.url if set(item) <= {'url', 'key'} else item
+            )
+        # В этом состоянии model.photos — и колонка, и обратная связь Photo,
+        # поэтому экземпляр с photos= не создать; пишем через update()
+        for pk, items in photos.items():
+            model.objects.filter(pk=pk).update(photos=items)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0005_car_feed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Photo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0, verbose_name='Порядок')),
+                ('url', models.CharField(max_length=500, verbose_name='URL')),
+                ('key', models.CharField(blank=True, default='', max_length=500, verbose_name='Ключ в хранилище')),
+                ('derivatives', models.JSONField(blank=True, default=dict, verbose_name='Производные')),
+                ('width', models.PositiveIntegerField(blank=True, null=True, verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(blank=True, null=True, verbose_name='Высота')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('car', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='cars.car', verbose_name='Автомобиль')),
+                ('part', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='cars.part', verbose_name='Запчасть')),
+            ],
+            options={
+                'verbose_name': 'Фотография',
+                'verbose_name_plural': 'Фотографии',
+                'ordering': ['position', 'id'],
+                'indexes': [models.Index(fields=['car', 'position'], name='photo_car_position_idx'), models.Index(fields=['part', 'position'], name='photo_part_position_idx'), models.Index(fields=['key'], name='photo_key_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='photo',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('car__isnull', False), ('part__isnull', True)), models.Q(('car__isnull', True), ('part__isnull', False)), _connector='OR'), name='photo_single_owner'),
+        ),
+        migrations.RunPython(copy_photos_to_table, copy_photos_to_json),
+        migrations.RemoveField(
+            model_name='car',
+            name='photos',
+        ),
+        migrations.RemoveField(
+            model_name='part',
+            name='photos',
+        ),
+    ]
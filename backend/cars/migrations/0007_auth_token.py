@@ -0,0 +1,33 @@
+# Generated by Django 5.0.8 on 2026-10-18 19:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0006_photo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_hash', models.CharField(max_length=64, unique=True, verbose_name='Хеш refresh-токена')),
+                ('name', models.CharField(blank=True, default='', max_length=200, verbose_name='Клиент')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('last_used_at', models.DateTimeField(blank=True, null=True, verbose_name='Последнее обновление')),
+                ('expires_at', models.DateTimeField(verbose_name='Действует до')),
+                ('revoked_at', models.DateTimeField(blank=True, null=True, verbose_name='Отозван')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL, verbose_name='Администратор')),
+            ],
+            options={
+                'verbose_name': 'Токен доступа',
+                'verbose_name_plural': 'Токены доступа',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
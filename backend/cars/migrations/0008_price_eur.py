@@ -0,0 +1,63 @@
+# Generated by Django 5.0.8 on 2026-10-18 21:02
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Round
+
+
+def fill_price_eur(apps, schema_editor):
+    rates = {currency: Decimal(str(rate)) for currency, rate in getattr(settings, 'EXCHANGE_RATES_DEFAULT', {}).items()}
+    rates['EUR'] = Decimal(1)
+    for model_name in ('car', 'part'):
+        model = apps.get_model('cars', model_name)
+        for currency, rate in rates.items():
+            rate = Value(rate, output_field=models.DecimalField(max_digits=18, decimal_places=10))
+            model.objects.filter(currency=currency).update(price_eur=Round(F('price') * rate, 2))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0007_auth_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, unique=True, verbose_name='Валюта')),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=18, verbose_name='Курс к EUR')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Курс валюты',
+                'verbose_name_plural': 'Курсы валют',
+                'ordering': ['currency'],
+            },
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='price_eur',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=14, verbose_name='Цена в EUR'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='part',
+            name='price_eur',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), editable=False, max_digits=14, verbose_name='Цена в EUR'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_price_eur, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['status', 'price_eur'], name='car_status_price_eur_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='part',
+            index=models.Index(fields=['status', 'price_eur'], name='part_status_price_eur_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.8 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0008_price_eur'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedCar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('car_id', models.BigIntegerField(verbose_name='ID автомобиля')),
+                ('vin', models.CharField(blank=True, default='', max_length=17, verbose_name='VIN')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удаленный автомобиль',
+                'verbose_name_plural': 'Удаленные автомобили',
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['updated_at'], name='car_updated_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.hashers import make_password
+from django.utils import timezone
 import json
 
 
@@ -107,12 +108,13 @@ class Car(models.Model):
     # Цена и продажа
     price = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Цена")
     currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='EUR', verbose_name="Валюта")
+    # Цена по курсу ExchangeRate для сортировки и фильтров по бюджету (cars.pricing)
+    price_eur = models.DecimalField(max_digits=14, decimal_places=2, editable=False, verbose_name="Цена в EUR")
     negotiable = models.BooleanField(default=True, verbose_name="Торг")
     city = models.CharField(max_length=100, verbose_name="Город")
     
     # Описание и медиа
     description = models.TextField(verbose_name="Описание")
-    photos = models.JSONField(default=list, verbose_name="Фотографии")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name="Статус")
     views = models.IntegerField(default=0, verbose_name="Просмотры")
     
@@ -128,6 +130,23 @@ class Car(models.Model):
         verbose_name = "Автомобиль"
         verbose_name_plural = "Автомобили"
         ordering = ['-created_at']
+        indexes = [
+            # Каталог всегда фильтруется по status, поэтому status идет первым,
+            # а за ним ключ сортировки из CarViewSet.ordering_fields
+            models.Index(fields=['status', '-created_at'], name='car_status_created_idx'),
+            models.Index(fields=['status', 'price'], name='car_status_price_idx'),
+            models.Index(fields=['status', 'price_eur'], name='car_status_price_eur_idx'),
+            models.Index(fields=['status', 'year'], name='car_status_year_idx'),
+            models.Index(fields=['status', 'mileage'], name='car_status_mileage_idx'),
+            models.Index(fields=['status', 'views'], name='car_status_views_idx'),
+            # Полный фид: status='published' по updated_at
+            models.Index(fields=['status', 'updated_at'], name='car_status_updated_idx'),
+            # Инкрементальный фид: updated_at > ? в любом статусе
+            models.Index(fields=['updated_at'], name='car_updated_idx'),
+            # Фильтры filterset_fields
+            models.Index(fields=['brand', 'model', 'year'], name='car_brand_model_year_idx'),
+            models.Index(fields=['fuel', 'transmission'], name='car_fuel_transmission_idx'),
+        ]
 
 
 class Part(models.Model):
@@ -163,12 +182,13 @@ class Part(models.Model):
     # Цена и продажа
     price = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Цена")
     currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='EUR', verbose_name="Валюта")
+    # Цена по курсу ExchangeRate для сортировки и фильтров по бюджету (cars.pricing)
+    price_eur = models.DecimalField(max_digits=14, decimal_places=2, editable=False, verbose_name="Цена в EUR")
     negotiable = models.BooleanField(default=False, verbose_name="Торг")
     city = models.CharField(max_length=100, verbose_name="Город")
     
     # Описание и медиа
     description = models.TextField(verbose_name="Описание")
-    photos = models.JSONField(default=list, verbose_name="Фотографии")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name="Статус")
     views = models.IntegerField(default=0, verbose_name="Просмотры")
     
@@ -184,3 +204,124 @@ class Part(models.Model):
         verbose_name = "Запчасть"
         verbose_name_plural = "Запчасти"
         ordering = ['-created_at']
+        indexes = [
+            # Каталог всегда фильтруется по status, поэтому status идет первым,
+            # а за ним ключ сортировки из PartViewSet.ordering_fields
+            models.Index(fields=['status', '-created_at'], name='part_status_created_idx'),
+            models.Index(fields=['status', 'price'], name='part_status_price_idx'),
+            models.Index(fields=['status', 'price_eur'], name='part_status_price_eur_idx'),
+            models.Index(fields=['status', 'views'], name='part_status_views_idx'),
+            # Фильтры filterset_fields
+            models.Index(fields=['brand', 'model'], name='part_brand_model_idx'),
+            models.Index(fields=['category', 'condition'], name='part_category_condition_idx'),
+        ]
+
+
+class Photo(models.Model):
+    """Фотография объявления: автомобиля или запчасти"""
+    
+    # Ровно одна из связей заполнена; индексы по ним — составные, см. Meta.indexes
+    car = models.ForeignKey(
+        Car, on_delete=models.CASCADE, blank=True, null=True, db_index=False,
+        related_name='photos', verbose_name="Автомобиль"
+    )
+    part = models.ForeignKey(
+        Part, on_delete=models.CASCADE, blank=True, null=True, db_index=False,
+        related_name='photos', verbose_name="Запчасть"
+    )
+    position = models.PositiveIntegerField(default=0, verbose_name="Порядок")
+    
+    # Файл в хранилище и его производные (миниатюры из cars.images.DERIVATIVES)
+    url = models.CharField(max_length=500, verbose_name="URL")
+    key = models.CharField(max_length=500, blank=True, default='', verbose_name="Ключ в хранилище")
+    derivatives = models.JSONField(default=dict, blank=True, verbose_name="Производные")
+    width = models.PositiveIntegerField(blank=True, null=True, verbose_name="Ширина")
+    height = models.PositiveIntegerField(blank=True, null=True, verbose_name="Высота")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    
+    def __str__(self):
+        return self.url
+    
+    @property
+    def owner(self):
+        return self.car if self.car_id else self.part
+    
+    class Meta:
+        verbose_name = "Фотография"
+        verbose_name_plural = "Фотографии"
+        ordering = ['position', 'id']
+        indexes = [
+            # Фотографии объявления по порядку; первая — обложка в списках
+            models.Index(fields=['car', 'position'], name='photo_car_position_idx'),
+            models.Index(fields=['part', 'position'], name='photo_part_position_idx'),
+            # Объявления по ключу файла: удаление изображения и сборка мусора в хранилище
+            models.Index(fields=['key'], name='photo_key_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(car__isnull=False, part__isnull=True) | models.Q(car__isnull=True, part__isnull=False),
+                name='photo_single_owner',
+            ),
+        ]
+
+
+class AuthToken(models.Model):
+    """
+    Сессия входа по токенам: хеш refresh-токена и признак отзыва.
+    
+    Access-токены подписаны и содержат id этой записи; сама запись читается
+    только при обновлении токенов и при промахе кэша состояния (cars.tokens).
+    """
+    
+    user = models.ForeignKey(
+        Admin, on_delete=models.CASCADE, related_name='auth_tokens', verbose_name="Администратор"
+    )
+    # SHA-256 от refresh-токена: токен случайный, медленное хеширование не нужно
+    key_hash = models.CharField(max_length=64, unique=True, verbose_name="Хеш refresh-токена")
+    name = models.CharField(max_length=200, blank=True, default='', verbose_name="Клиент")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    last_used_at = models.DateTimeField(blank=True, null=True, verbose_name="Последнее обновление")
+    expires_at = models.DateTimeField(verbose_name="Действует до")
+    revoked_at = models.DateTimeField(blank=True, null=True, verbose_name="Отозван")
+    
+    def __str__(self):
+        return f"{self.user} — {self.name or self.pk}"
+    
+    @property
+    def is_active(self):
+        return self.revoked_at is None and self.expires_at > timezone.now()
+    
+    class Meta:
+        verbose_name = "Токен доступа"
+        verbose_name_plural = "Токены доступа"
+        ordering = ['-created_at']
+
+
+class ExchangeRate(models.Model):
+    """Курс валюты к евро: цена в EUR = цена * rate"""
+    currency = models.CharField(max_length=3, unique=True, verbose_name="Валюта")
+    rate = models.DecimalField(max_digits=18, decimal_places=10, verbose_name="Курс к EUR")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    
+    def __str__(self):
+        return f"{self.currency} = {self.rate} EUR"
+    
+    class Meta:
+        verbose_name = "Курс валюты"
+        verbose_name_plural = "Курсы валют"
+        ordering = ['currency']
+
+
+class DeletedCar(models.Model):
+    """Удаленный автомобиль: надгробие для инкрементального фида (cars.feed)"""
+    car_id = models.BigIntegerField(verbose_name="ID автомобиля")
+    vin = models.CharField(max_length=17, blank=True, default='', verbose_name="VIN")
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата удаления")
+    
+    def __str__(self):
+        return f"{self.car_id} ({self.vin})"
+    
+    class Meta:
+        verbose_name = "Удаленный автомобиль"
+        verbose_name_plural = "Удаленные автомобили"
+        ordering = ['deleted_at', 'id']
@@ -0,0 +1,152 @@
+"""
+Сборка мусора в хранилище фотографий: файлы, на которые не ссылается ни одно объявление
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .images import get_image_storage
+from .models import Photo
+
+logger = logging.getLogger(__name__)
+
+
+class OrphanReport:
+    """Итоги прохода: сколько объектов просмотрено, пропущено и удалено"""
+
+    def __init__(self):
+        self.listed = 0
+        self.excluded = 0
+        self.recent = 0
+        self.referenced = 0
+        self.orphans = []
+        self.deleted = 0
+        self.failed = []
+
+    @property
+    def orphan_bytes(self):
+        return sum(item.size or 0 for item in self.orphans)
+
+    def as_dict(self):
+        return {
+            'listed': self.listed,
+            'excluded': self.excluded,
+            'recent': self.recent,
+            'referenced': self.referenced,
+            'orphans': len(self.orphans),
+            'orphan_bytes': self.orphan_bytes,
+            'deleted': self.deleted,
+            'failed': len(self.failed),
+        }
+
+
+def excluded_prefixes():
+    """Префиксы, которые сборщик не трогает (static/ и media/ делят бакет с фотографиями)"""
+    return tuple(getattr(settings, 'IMAGE_GC_EXCLUDE_PREFIXES', ('static/', 'media/')))
+
+
+def list_storage(storage, prefix='', workers=8, exclude=()):
+    """
+    Обойти хранилище: верхний уровень одним запросом, затем подпрефиксы
+    (пачки ``batch_id/``) параллельно в ``workers`` потоках.
+
+    Каждый подпрефикс листается постранично; объекты отдаются по мере
+    готовности префиксов в порядке их обхода.
+    """
+    prefixes, objects = storage.list_prefixes(prefix)
+    yield from objects
+    prefixes = [item for item in prefixes if not item.startswith(exclude)]
+    if not prefixes:
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-gc') as executor:
+        for chunk in executor.map(lambda subprefix: list(storage.list_objects(subprefix)), prefixes):
+            yield from chunk
+
+
+class ReferenceIndex:
+    """
+    Множество ключей, на которые ссылаются фотографии объявлений.
+
+    Кроме ключей оригиналов и производных из ``Photo.derivatives``
+    запоминаются их «основы» (ключ без расширения): производные лежат
+    в ``<основа>/<имя>.<формат>`` и не удаляются, даже если у фотографии
+    не сохранились их ключи.
+    """
+
+    def __init__(self, keys=(), stems=()):
+        self.keys = set(keys)
+        self.stems = set(stems)
+
+    @classmethod
+    def load(cls, storage, chunk_size=5000):
+        index = cls()
+        rows = Photo.objects.values_list('key', 'url', 'derivatives').iterator(chunk_size=chunk_size)
+        for key, url, derivatives in rows:
+            index.add(key or storage.key_for_url(url))
+            for derivative in (derivatives or {}).values():
+                index.add(derivative.get('key'))
+        return index
+
+    def add(self, key):
+        if key:
+            self.keys.add(key)
+            self.stems.add(os.path.splitext(key)[0])
+
+    def __contains__(self, key):
+        return key in self.keys or key.rpartition('/')[0] in self.stems
+
+
+def still_referenced(keys):
+    """Ключи, которые появились в объявлениях, пока шел обход"""
+    return set(Photo.objects.filter(key__in=keys).values_list('key', flat=True))
+
+
+def collect_orphans(storage=None, grace=None, prefix='', dry_run=True, workers=8, batch_size=1000, now=None):
+    """
+    Найти и (если не ``dry_run``) удалить файлы без ссылок из объявлений.
+
+    Удаляются только объекты старше ``grace``: свежие загрузки могут
+    принадлежать объявлению, которое еще не сохранено. Индекс ссылок
+    строится после обхода, а перед удалением каждой пачки ключи еще раз
+    сверяются с базой, поэтому фотография, сохраненная во время прохода,
+    не пропадет. Возвращает OrphanReport.
+    """
+    storage = storage or get_image_storage()
+    grace = timedelta(hours=getattr(settings, 'IMAGE_GC_GRACE_HOURS', 24)) if grace is None else grace
+    cutoff = (now or timezone.now()) - grace
+    exclude = excluded_prefixes()
+    report = OrphanReport()
+
+    candidates = []
+    for item in list_storage(storage, prefix, workers, exclude):
+        report.listed += 1
+        if item.key.startswith(exclude):
+            report.excluded += 1
+        elif item.modified > cutoff:
+            report.recent += 1
+        else:
+            candidates.append(item)
+
+    index = ReferenceIndex.load(storage)
+    for item in candidates:
+        if item.key in index:
+            report.referenced += 1
+        else:
+            report.orphans.append(item)
+    report.orphans.sort(key=lambda item: item.key)
+    if dry_run:
+        return report
+
+    for start in range(0, len(report.orphans), batch_size):
+        keys = [item.key for item in report.orphans[start:start + batch_size]]
+        referenced = still_referenced(keys)
+        keys = [key for key in keys if key not in referenced]
+        failed = storage.delete_many(keys)
+        report.failed += failed
+        report.deleted += len(keys) - len(failed)
+    logger.info('Удалено %s файлов без ссылок из %s', report.deleted, report.listed)
+    return report
@@ -0,0 +1,174 @@
+"""
+Пагинация каталога автомобилей и запчастей
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с опциональным keyset-режимом.
+
+    По умолчанию работает как обычная ``?page=N``. Если в запросе есть
+    параметр ``cursor`` (для первой страницы — пустой: ``?cursor=``),
+    включается keyset-пагинация: вместо OFFSET следующая страница
+    выбирается условием ``(ключ, id) > (последний ключ, последний id)``
+    по текущей сортировке, а ``COUNT(*)`` выполняется только при ``?count=1``.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        page_queryset = self.get_keyset_page(queryset, request, view)
+        if self.count_requested(request):
+            self.count = queryset.count()
+        return self.finish_keyset_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """То же, что paginate_queryset, но запросы выполняются через acount() и aiterator()"""
+        if self.cursor_query_param in request.query_params:
+            page_queryset = self.get_keyset_page(queryset, request, view)
+            if self.count_requested(request):
+                self.count = await queryset.acount()
+            return self.finish_keyset_page([row async for row in page_queryset.aiterator()])
+
+        self.keyset = False
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count у Paginator — cached_property, заранее посчитанное значение он не пересчитывает
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [row async for row in self.page.object_list.aiterator()]
+        return list(self.page)
+
+    def count_requested(self, request):
+        return request.query_params.get(self.count_query_param) in ('1', 'true')
+
+    def get_keyset_page(self, queryset, request, view):
+        """Запрос следующей страницы keyset-режима (на одну строку больше размера страницы)"""
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_keyset_ordering(queryset, view)
+        field_name = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+        tie_breaker = f'-{self.tie_breaker}' if descending else self.tie_breaker
+
+        self.count = None
+        self.field_name = field_name
+
+        queryset = queryset.order_by(self.ordering, tie_breaker)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            value, pk = position
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field_name}__{lookup}': value})
+                | Q(**{field_name: value, f'{self.tie_breaker}__{lookup}': pk})
+            )
+        return queryset[:self.page_size + 1]
+
+    def finish_keyset_page(self, results):
+        field_name = self.field_name
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = None
+        if self.has_next and results:
+            last = results[-1]
+            if not isinstance(last, dict):  # строки .values() из FastListMixin
+                last = {field_name: getattr(last, field_name), self.tie_breaker: getattr(last, self.tie_breaker)}
+            self.next_position = (last[field_name], last[self.tie_breaker])
+        return results
+
+    def get_keyset_ordering(self, queryset, view):
+        """Первый ключ сортировки, уже примененной OrderingFilter, либо Meta.ordering"""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        allowed = set(getattr(view, 'ordering_fields', None) or []) | {'created_at', self.tie_breaker}
+        if ordering and isinstance(ordering[0], str) and ordering[0].lstrip('-') in allowed:
+            return ordering[0]
+        return f'-{self.tie_breaker}'
+
+    def encode_cursor(self, value, pk):
+        payload = json.dumps({'o': self.ordering, 'v': str(value), 'id': pk})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if payload['o'] != self.ordering:
+                raise ValueError('ordering changed')
+            field = model._meta.get_field(self.ordering.lstrip('-'))
+            return field.to_python(payload['v']), int(payload['id'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*self.next_position))
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count']['nullable'] = True
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор keyset-пагинации (пустой — первая страница)',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Посчитать общее количество в keyset-режиме',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+        return parameters
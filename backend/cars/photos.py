@@ -0,0 +1,189 @@
+"""
+Фотографии объявлений: запись списка, выборка пачками и поиск по ключу файла
+"""
+from collections import defaultdict
+from io import BytesIO
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_version
+from .images import derivative_entries, derivative_format, get_image_storage, has_derivatives, image_size
+from .images import render_derivatives, stored_derivative_entries
+from .models import Car, Part, Photo
+
+PHOTO_FIELDS = ('url', 'key', 'derivatives', 'width', 'height')
+
+
+def owner_field(model):
+    """Имя связи Photo с моделью объявления: ``car`` или ``part``"""
+    return model._meta.model_name
+
+
+def photo_fields(item):
+    """
+    Поля Photo из элемента ``photos``: URL-строки или записи ImageUploadView.
+
+    Для строки ключ файла восстанавливается по URL текущего хранилища,
+    чтобы фотографию можно было найти при удалении файла, а производные —
+    по ключу (они лежат рядом с файлом), чтобы списки отдавали миниатюру.
+    В запись попадают только производные, которые есть в хранилище: для
+    старых файлов без них обложкой остается оригинал (см. backfill_derivatives).
+    """
+    if isinstance(item, str):
+        item = {'url': item}
+    fields = {
+        'url': item['url'],
+        'key': item.get('key') or '',
+        'derivatives': item.get('derivatives') or {},
+        'width': item.get('width'),
+        'height': item.get('height'),
+    }
+    try:
+        storage = get_image_storage()
+        if not fields['key']:
+            fields['key'] = storage.key_for_url(fields['url'])
+        if fields['key'] and not fields['derivatives'] and has_derivatives(fields['key']):
+            fields['derivatives'] = stored_derivative_entries(storage, fields['key'])
+    except Exception:
+        pass
+    return fields
+
+
+def set_photos(owner, items):
+    """
+    Заменить фотографии объявления списком ``items`` в порядке показа.
+
+    Фотографии с уже известным URL остаются теми же строками: у них
+    меняется только порядок (и дополняются ключ, производные и размеры,
+    если они пришли), удаленные стираются, новые вставляются одним INSERT.
+    """
+    field = owner_field(type(owner))
+    existing = defaultdict(list)
+    for photo in Photo.objects.filter(**{field: owner}).order_by('position', 'id'):
+        existing[photo.url].append(photo)
+
+    kept, created = [], []
+    for position, item in enumerate(items):
+        fields = photo_fields(item)
+        matches = existing.get(fields['url'])
+        if not matches:
+            created.append(Photo(**{field: owner}, position=position, **fields))
+            continue
+        photo = matches.pop(0)
+        photo.position = position
+        for name, value in fields.items():
+            if value:
+                setattr(photo, name, value)
+        kept.append(photo)
+
+    removed = [photo.pk for photos in existing.values() for photo in photos]
+    with transaction.atomic():
+        if removed:
+            Photo.objects.filter(pk__in=removed).delete()
+        if kept:
+            Photo.objects.bulk_update(kept, ['position', *PHOTO_FIELDS])
+        if created:
+            Photo.objects.bulk_create(created)
+    bump_version(type(owner))
+
+
+def replace_photos(model, photos_by_owner):
+    """
+    Заменить фотографии сразу у многих объявлений: ``{pk: [items]}``.
+
+    Одно удаление и один INSERT на всю пачку — для массового импорта.
+    """
+    field = owner_field(model)
+    with transaction.atomic():
+        Photo.objects.filter(**{f'{field}__in': list(photos_by_owner)}).delete()
+        Photo.objects.bulk_create([
+            Photo(**{f'{field}_id': pk}, position=position, **photo_fields(item))
+            for pk, items in photos_by_owner.items()
+            for position, item in enumerate(items)
+        ])
+
+
+def photo_urls(model, pks):
+    """URL фотографий объявлений по порядку одним запросом: ``{pk: [url, ...]}``"""
+    column = f'{owner_field(model)}_id'
+    urls = defaultdict(list)
+    rows = (
+        Photo.objects.filter(**{f'{column}__in': pks})
+        .order_by(column, 'position', 'id')
+        .values_list(column, 'url')
+    )
+    for pk, url in rows:
+        urls[pk].append(url)
+    return urls
+
+
+def detach_photos(key):
+    """
+    Убрать файл ``key`` из всех объявлений, которые на него ссылаются.
+
+    Поиск идет по индексу ``photo_key_idx``. У затронутых объявлений
+    обновляется ``updated_at`` (чтобы изменение попало в фид) и версия
+    кэша. Возвращает удаленные фотографии, чтобы вызывающий мог стереть
+    их производные из хранилища.
+    """
+    photos = list(Photo.objects.filter(key=key))
+    if not photos:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        Photo.objects.filter(pk__in=[photo.pk for photo in photos]).delete()
+        for model in (Car, Part):
+            field = f'{owner_field(model)}_id'
+            pks = {getattr(photo, field) for photo in photos} - {None}
+            if pks:
+                model.objects.filter(pk__in=pks).update(updated_at=now)
+                bump_version(model)
+    return photos
+
+
+def derivative_keys(photos):
+    """Ключи производных удаленных фотографий без повторов"""
+    return sorted({
+        derivative['key']
+        for photo in photos
+        for derivative in photo.derivatives.values()
+        if derivative.get('key')
+    })
+
+
+def delete_image(storage, key):
+    """Удалить файл, его производные и ссылки на него из объявлений"""
+    storage.delete(key)
+    for derivative_key in derivative_keys(detach_photos(key)):
+        storage.delete(derivative_key)
+
+
+def backfill_derivatives(storage, photo, dry_run=False):
+    """
+    Дорисовать недостающие производные фотографии из оригинала в хранилище.
+
+    Заполняет ``derivatives`` и, если их не было, ``width`` и ``height``.
+    Возвращает True, если фотографию нужно сохранить; с ``dry_run`` только
+    проверяет это, ничего не рисуя и не меняя.
+    """
+    if not photo.key or not has_derivatives(photo.key):
+        return False
+    expected = derivative_entries(storage, photo.key)
+    missing = [name for name, entry in expected.items() if not storage.exists(entry['key'])]
+    if not missing and photo.derivatives == expected and photo.width:
+        return False
+    if dry_run:
+        return True
+
+    if missing or not photo.width:
+        data = storage.read(photo.key)
+        if missing:
+            _extension, content_type = derivative_format()
+            rendered = render_derivatives(data)
+            for name in missing:
+                storage.save(expected[name]['key'], BytesIO(rendered[name][0]), content_type)
+        if not photo.width:
+            photo.width, photo.height = image_size(data)
+    photo.derivatives = expected
+    return True
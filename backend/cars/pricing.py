@@ -0,0 +1,72 @@
+"""
+Цена в евро (price_eur): сортировка и фильтры по бюджету для объявлений в разных валютах
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Round
+
+from .cache import bump_version
+from .models import Car, ExchangeRate, Part
+
+RATES_KEY = 'catalog:exchange_rates'
+PRICED_MODELS = (Car, Part)
+CENT = Decimal('0.01')
+
+
+def get_rates():
+    """
+    Курсы к евро: EXCHANGE_RATES_DEFAULT, поверх них таблица ExchangeRate.
+
+    Кэшируются на EXCHANGE_RATES_CACHE_TIMEOUT; изменение курса сбрасывает кэш.
+    """
+    rates = cache.get(RATES_KEY)
+    if rates is None:
+        rates = {
+            currency: Decimal(str(rate))
+            for currency, rate in getattr(settings, 'EXCHANGE_RATES_DEFAULT', {}).items()
+        }
+        rates.update(ExchangeRate.objects.values_list('currency', 'rate'))
+        rates['EUR'] = Decimal(1)
+        cache.set(RATES_KEY, rates, getattr(settings, 'EXCHANGE_RATES_CACHE_TIMEOUT', 300))
+    return rates
+
+
+def price_in_eur(price, currency, rates=None):
+    rate = (rates or get_rates()).get(currency)
+    if rate is None:
+        raise ValueError(f'Нет курса валюты {currency} к EUR')
+    return (Decimal(str(price)) * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def set_prices_eur(instances):
+    """Заполнить price_eur у объектов перед bulk_create, который не посылает pre_save"""
+    rates = get_rates()
+    for instance in instances:
+        instance.price_eur = price_in_eur(instance.price, instance.currency, rates)
+
+
+def recompute_prices(currencies=None):
+    """
+    Пересчитать price_eur после изменения курсов: один UPDATE на валюту и модель.
+
+    ``updated_at`` не меняется — объявления не попадают в инкрементальный фид.
+    Возвращает число обновленных строк.
+    """
+    cache.delete(RATES_KEY)
+    rates = get_rates()
+    currencies = [currency for currency in (currencies or rates) if currency in rates]
+    updated = 0
+    with transaction.atomic():
+        for model in PRICED_MODELS:
+            count = 0
+            for currency in currencies:
+                rate = Value(rates[currency], output_field=DecimalField(max_digits=18, decimal_places=10))
+                count += model.objects.filter(currency=currency).update(price_eur=Round(F('price') * rate, 2))
+            if count:
+                bump_version(model)
+            updated += count
+    return updated
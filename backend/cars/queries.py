@@ -0,0 +1,60 @@
+"""
+Выражения и проекции запросов каталога
+"""
+from django.db.models import CharField, Count, IntegerField, OuterRef, Subquery
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce
+
+from .models import Photo
+
+
+def owner_photos(model):
+    """Фотографии объявления из внешнего запроса, по порядку показа"""
+    return Photo.objects.filter(**{model._meta.model_name: OuterRef('pk')}).order_by('position')
+
+
+# Вычисляемые поля списков: имя поля сериализатора -> выражение аннотации.
+# Фотографии считаются коррелированными подзапросами по индексу
+# (владелец, position) только для строк страницы, поэтому списки не
+# читают все фотографии и работают и с .values() в FastListMixin.
+LIST_ANNOTATIONS = {
+    # Миниатюра обложки, если она есть (записи из ImageUploadView), иначе сама обложка
+    'cover_photo': lambda model: Subquery(
+        owner_photos(model).values(
+            cover=Coalesce(KT('derivatives__thumb__url'), 'url', output_field=CharField())
+        )[:1]
+    ),
+    'photos_count': lambda model: Coalesce(
+        Subquery(
+            owner_photos(model).order_by().values(model._meta.model_name)
+            .annotate(count=Count('id')).values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    ),
+}
+
+
+def list_projection(queryset, serializer):
+    """
+    Загрузить только колонки, которые нужны сериализатору списка.
+
+    Обычные поля попадают в ``.only()``, связь ``admin`` — в
+    ``select_related``, а обложка и число фотографий считаются в базе
+    подзапросами из ``LIST_ANNOTATIONS``.
+    """
+    model_fields = {field.name: field for field in queryset.model._meta.concrete_fields}
+    only, related, annotations = {'id'}, set(), {}
+    for field in serializer.fields.values():
+        source = field.source.split('.')[0]
+        if source in LIST_ANNOTATIONS:
+            annotations[source] = LIST_ANNOTATIONS[source](queryset.model)
+        elif source in model_fields:
+            only.add(source)
+            if model_fields[source].is_relation and source != field.source:
+                related.add(source)
+
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*only).annotate(**annotations)
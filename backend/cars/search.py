@@ -0,0 +1,145 @@
+"""
+Полнотекстовый поиск по каталогу автомобилей и запчастей
+"""
+import re
+
+from django.apps import apps
+from django.db import connection, connections
+from rest_framework.filters import SearchFilter
+
+# Поля полнотекстового индекса и их веса (A — самые значимые).
+# Должны совпадать с выражениями в миграции 0004_catalog_search.
+FULLTEXT_FIELDS = {
+    'cars.car': [('brand', 'A'), ('model', 'A'), ('vin', 'A'), ('description', 'C')],
+    'cars.part': [('name', 'A'), ('brand', 'A'), ('model', 'A'), ('description', 'C')],
+}
+
+# Веса классов как у ts_rank в PostgreSQL, для bm25() в SQLite
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_tokens(terms):
+    """Слова запроса без служебных символов FTS, в нижнем регистре"""
+    return [token.lower() for term in terms for token in TOKEN_RE.findall(term)]
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def search_vector(model):
+    from django.contrib.postgres.search import SearchVector
+
+    fields = FULLTEXT_FIELDS[model._meta.label_lower]
+    vector = SearchVector(fields[0][0], weight=fields[0][1], config='simple')
+    for name, weight in fields[1:]:
+        vector += SearchVector(name, weight=weight, config='simple')
+    return vector
+
+
+def search_triggers(table, columns):
+    """Триггеры, которые держат ``<таблица>_fts`` в синхронизации с таблицей: ``{имя: SQL}``"""
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    delete_old = (
+        f"INSERT INTO {table}_fts({table}_fts, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f"INSERT INTO {table}_fts(rowid, {column_list}) VALUES (new.id, {new_values});"
+    return {
+        f'{table}_fts_ai': f"CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f'{table}_fts_ad': f"CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f'{table}_fts_au': (
+            f"CREATE TRIGGER {table}_fts_au AFTER UPDATE OF {column_list} ON {table} "
+            f"BEGIN {delete_old} {insert_new} END"
+        ),
+    }
+
+
+def install_search_triggers(using='default'):
+    """
+    Создать недостающие или устаревшие триггеры FTS5 на SQLite.
+
+    SQLite пересоздает таблицу при AddField/RemoveField и теряет ее
+    триггеры, поэтому они ставятся не в миграциях, а после каждого
+    ``migrate`` (сигнал post_migrate). Если триггеры пришлось ставить
+    заново, FTS-таблица перестраивается: изменения без триггеров в нее не
+    попали. Возвращает таблицы, у которых триггеры были обновлены.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return []
+    repaired = []
+    with db.cursor() as cursor:
+        for label, fields in FULLTEXT_FIELDS.items():
+            table = apps.get_model(label)._meta.db_table
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [f'{table}_fts'])
+            if cursor.fetchone() is None:
+                continue
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [table])
+            existing = dict(cursor.fetchall())
+            expected = search_triggers(table, [name for name, _weight in fields])
+            if all(existing.get(name) == sql for name, sql in expected.items()):
+                continue
+            for name, sql in expected.items():
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+            repaired.append(table)
+    return repaired
+
+
+def install_search_triggers_after_migrate(using, **kwargs):
+    install_search_triggers(using)
+
+
+class CatalogSearchFilter(SearchFilter):
+    """
+    Ранжированный полнотекстовый поиск вместо ``ILIKE '%term%'``.
+
+    На PostgreSQL запрос идет по ``SearchVector`` с GIN-индексом по тому же
+    выражению, на SQLite — по FTS5-таблице ``<таблица>_fts``, которую
+    триггеры держат в синхронизации с основной. Каждое слово ищется как
+    префикс, поэтому ``?search=WBA`` находит VIN, а ``?search=merc`` —
+    Mercedes. Без ``?ordering=`` результаты сортируются по релевантности.
+    На остальных СУБД работает исходный ``SearchFilter``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        tokens = search_tokens(self.get_search_terms(request))
+        if not tokens or queryset.model._meta.label_lower not in FULLTEXT_FIELDS:
+            return super().filter_queryset(request, queryset, view)
+
+        if connection.vendor == 'postgresql':
+            return self.filter_postgresql(queryset, tokens)
+        if connection.vendor == 'sqlite':
+            return self.filter_sqlite(queryset, tokens)
+        return super().filter_queryset(request, queryset, view)
+
+    def filter_postgresql(self, queryset, tokens):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(' & '.join(f'{token}:*' for token in tokens), search_type='raw', config='simple')
+        vector = search_vector(queryset.model)
+        return (
+            queryset.annotate(search_document=vector)
+            .filter(search_document=query)
+            .annotate(search_rank=SearchRank(vector, query))
+            .order_by('-search_rank', '-id')
+        )
+
+    def filter_sqlite(self, queryset, tokens):
+        table = fts_table(queryset.model)
+        match = ' AND '.join(f'"{token}"*' for token in tokens)
+        base_table = queryset.model._meta.db_table
+        weights = ', '.join(str(WEIGHTS[weight]) for _name, weight in FULLTEXT_FIELDS[queryset.model._meta.label_lower])
+        # Соединение с FTS-таблицей, а не коррелированный подзапрос:
+        # bm25() считается один раз на совпавшую строку
+        return queryset.extra(
+            select={'search_rank': f'-bm25({table}, {weights})'},
+            tables=[table],
+            where=[f'{table}.rowid = {base_table}.id', f'{table} MATCH %s'],
+            params=[match],
+        ).order_by('-search_rank', '-id')
@@ -1,12 +1,123 @@
 from rest_framework import serializers
-from .models import Admin, Car, Part
+from carspark_backend.metrics import timer
+from .models import Admin, Car, Part, Photo
+from .photos import set_photos
 
 
-class AdminSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """Набор полей из параметра ?fields=id,brand,price или None"""
+    if request is None:
+        return None
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """Оставляет в ответе только поля, перечисленные в ?fields="""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - fields - {'id'}:
+                self.fields.pop(name)
+
+
+class MeasuredSerializerMixin:
+    """Время построения .data попадает в метрику сериализации текущего запроса"""
+
+    @property
+    def data(self):
+        with timer('serializer'):
+            return super().data
+
+
+class MeasuredListSerializer(MeasuredSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+def photo_item_error(item):
+    """Текст ошибки для элемента photos или None"""
+    url = item if isinstance(item, str) else item.get('url') if isinstance(item, dict) else None
+    if not isinstance(url, str) or not url.strip():
+        return 'Ожидается URL или объект с полем url'
+    if len(url) > Photo._meta.get_field('url').max_length:
+        return 'Слишком длинный URL'
+    if isinstance(item, dict):
+        if not isinstance(item.get('key') or '', str) or not isinstance(item.get('derivatives') or {}, dict):
+            return 'key должен быть строкой, derivatives — объектом'
+        for name in ('width', 'height'):
+            value = item.get(name)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+                return f'{name} должен быть неотрицательным целым числом'
+    return None
+
+
+class PhotoListField(serializers.ListField):
+    """
+    Фотографии объявления (модель Photo).
+
+    На чтение — URL по порядку показа, на запись — URL или записи
+    из ImageUploadView с ключом, производными и размерами.
+    """
+    child = serializers.JSONField()
+
+    def get_attribute(self, instance):
+        return instance.photos.all()
+
+    def to_representation(self, photos):
+        return [photo.url for photo in photos]
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        errors = {index: [error] for index, item in enumerate(items) if (error := photo_item_error(item))}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return items
+
+
+class CoverPhotoListField(serializers.ReadOnlyField):
+    """Только миниатюра обложки в виде списка из одного URL: списки не читают все фотографии"""
+
+    def to_representation(self, value):
+        return [value] if value else []
+
+
+class PhotoSerializer(serializers.ModelSerializer):
+    """Фотография с ключом в хранилище, производными и размерами"""
+
+    class Meta:
+        model = Photo
+        fields = ['id', 'url', 'key', 'position', 'width', 'height', 'derivatives']
+        read_only_fields = fields
+
+
+class PhotosWriteMixin:
+    """Сохраняет ``photos`` в модель Photo после создания или обновления объявления"""
+
+    def create(self, validated_data):
+        photos = validated_data.pop('photos', None)
+        instance = super().create(validated_data)
+        if photos is not None:
+            set_photos(instance, photos)
+        return instance
+
+    def update(self, instance, validated_data):
+        photos = validated_data.pop('photos', None)
+        instance = super().update(instance, validated_data)
+        if photos is not None:
+            set_photos(instance, photos)
+        return instance
+
+
+class AdminSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели Admin"""
     
     class Meta:
         model = Admin
+        list_serializer_class = MeasuredListSerializer
         fields = ['id', 'email', 'first_name', 'last_name', 'role', 'date_joined']
         read_only_fields = ['id', 'date_joined']
 
@@ -27,8 +138,10 @@ class AdminCreateSerializer(serializers.ModelSerializer):
         return user
 
 
-class CarSerializer(serializers.ModelSerializer):
+class CarSerializer(MeasuredSerializerMixin, PhotosWriteMixin, serializers.ModelSerializer):
     """Сериализатор для модели Car"""
+    photos = PhotoListField(required=False)
+    images = PhotoSerializer(source='photos', many=True, read_only=True)
     admin = AdminSerializer(read_only=True)
     admin_id = serializers.PrimaryKeyRelatedField(
         queryset=Admin.objects.all(),
@@ -44,23 +157,60 @@ class CarSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'views']
 
 
-class CarListSerializer(serializers.ModelSerializer):
-    """Сериализатор для списка автомобилей"""
+class CarListSerializer(MeasuredSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    """Сериализатор для списка автомобилей (из фотографий — только миниатюра обложки)"""
     admin_name = serializers.CharField(source='admin.get_full_name', read_only=True)
+    photos = CoverPhotoListField(source='cover_photo')
+    photos_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Car
+        list_serializer_class = MeasuredListSerializer
         fields = [
             'id', 'brand', 'model', 'generation', 'year', 'mileage', 'transmission', 
             'fuel', 'drive', 'body_type', 'color', 'power', 'engine_volume', 
             'euro_standard', 'vin', 'condition', 'customs', 'vat', 'owners',
-            'price', 'currency', 'negotiable', 'city', 'description', 'status', 'views',
-            'admin_name', 'created_at', 'photos'
+            'price', 'currency', 'price_eur', 'negotiable', 'city', 'description', 'status', 'views',
+            'admin_name', 'created_at', 'photos', 'photos_count'
         ]
 
 
-class PartSerializer(serializers.ModelSerializer):
+class CarCompactListSerializer(MeasuredSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    """Компактный сериализатор списка автомобилей: без описания, только миниатюра обложки"""
+    photo = serializers.CharField(source='cover_photo', read_only=True)
+    photos_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Car
+        list_serializer_class = MeasuredListSerializer
+        fields = [
+            'id', 'brand', 'model', 'generation', 'year', 'mileage', 'transmission',
+            'fuel', 'drive', 'body_type', 'power', 'engine_volume', 'condition',
+            'price', 'currency', 'price_eur', 'negotiable', 'city', 'status', 'views',
+            'created_at', 'photo', 'photos_count'
+        ]
+
+
+class CarImportSerializer(serializers.ModelSerializer):
+    """Сериализатор строки массового импорта автомобилей (upsert по VIN)"""
+    photos = PhotoListField(required=False)
+
+    class Meta:
+        model = Car
+        fields = [
+            'brand', 'model', 'generation', 'year', 'mileage', 'transmission',
+            'fuel', 'drive', 'body_type', 'color', 'power', 'engine_volume',
+            'euro_standard', 'vin', 'condition', 'customs', 'vat', 'owners',
+            'price', 'currency', 'negotiable', 'city', 'description', 'photos', 'status'
+        ]
+        # Уникальность VIN не проверяем: существующая запись будет обновлена
+        extra_kwargs = {'vin': {'validators': []}}
+
+
+class PartSerializer(MeasuredSerializerMixin, PhotosWriteMixin, serializers.ModelSerializer):
     """Сериализатор для модели Part"""
+    photos = PhotoListField(required=False)
+    images = PhotoSerializer(source='photos', many=True, read_only=True)
     admin = AdminSerializer(read_only=True)
     admin_id = serializers.PrimaryKeyRelatedField(
         queryset=Admin.objects.all(),
@@ -76,14 +226,44 @@ class PartSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'views']
 
 
-class PartListSerializer(serializers.ModelSerializer):
-    """Сериализатор для списка запчастей"""
+class PartListSerializer(MeasuredSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    """Сериализатор для списка запчастей (из фотографий — только миниатюра обложки)"""
     admin_name = serializers.CharField(source='admin.get_full_name', read_only=True)
+    photos = CoverPhotoListField(source='cover_photo')
+    photos_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Part
+        list_serializer_class = MeasuredListSerializer
         fields = [
             'id', 'name', 'brand', 'model', 'year_from', 'year_to', 'category', 'condition',
-            'price', 'currency', 'negotiable', 'city', 'description', 'status', 'views',
-            'admin_name', 'created_at', 'photos'
+            'price', 'currency', 'price_eur', 'negotiable', 'city', 'description', 'status', 'views',
+            'admin_name', 'created_at', 'photos', 'photos_count'
+        ]
+
+
+class PartCompactListSerializer(MeasuredSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    """Компактный сериализатор списка запчастей: без описания, только миниатюра обложки"""
+    photo = serializers.CharField(source='cover_photo', read_only=True)
+    photos_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Part
+        list_serializer_class = MeasuredListSerializer
+        fields = [
+            'id', 'name', 'brand', 'model', 'year_from', 'year_to', 'category', 'condition',
+            'price', 'currency', 'price_eur', 'negotiable', 'city', 'status', 'views',
+            'created_at', 'photo', 'photos_count'
+        ]
+
+
+class PartImportSerializer(serializers.ModelSerializer):
+    """Сериализатор строки массового импорта запчастей"""
+    photos = PhotoListField(required=False)
+
+    class Meta:
+        model = Part
+        fields = [
+            'name', 'brand', 'model', 'year_from', 'year_to', 'category', 'condition',
+            'price', 'currency', 'negotiable', 'city', 'description', 'photos', 'status'
         ]
@@ -0,0 +1,35 @@
+"""
+Сигналы инвалидации кэша каталога, журнала удалений фида и пересчета цены в евро
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .feed import record_deletion
+from .models import Car, ExchangeRate, Part
+from .pricing import price_in_eur, recompute_prices
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@receiver(post_save, sender=Part)
+@receiver(post_delete, sender=Part)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_delete, sender=Car)
+def remember_deleted_car(sender, instance, **kwargs):
+    record_deletion(instance)
+
+
+@receiver(pre_save, sender=Car)
+@receiver(pre_save, sender=Part)
+def normalize_price(sender, instance, **kwargs):
+    instance.price_eur = price_in_eur(instance.price, instance.currency)
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def exchange_rate_changed(sender, instance, **kwargs):
+    recompute_prices([instance.currency])
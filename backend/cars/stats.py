@@ -0,0 +1,111 @@
+"""
+Статистика каталога по статусам одним агрегирующим запросом
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import aget_version, get_version
+from .models import Car, Part
+
+STATS_GROUP_FIELDS = {
+    Car: ['brand', 'fuel', 'city'],
+    Part: ['brand', 'category', 'city'],
+}
+
+
+def status_aggregates(model):
+    aggregates = {'total': Count('id')}
+    for value, _label in model.STATUS_CHOICES:
+        aggregates[value] = Count('id', filter=Q(status=value))
+    return aggregates
+
+
+def compute_stats(model, group_by=None):
+    """
+    Количество объектов всего и по каждому статусу.
+
+    Без ``group_by`` — один ``SELECT COUNT(...) FILTER (...)``; с ``group_by``
+    тот же запрос группируется по полю, а итоги суммируются из групп.
+    """
+    aggregates = status_aggregates(model)
+    if group_by is None:
+        return model.objects.order_by().aggregate(**aggregates)
+
+    rows = list(
+        model.objects.order_by(group_by).values(group_by).annotate(**aggregates)
+    )
+    data = {key: sum(row[key] for row in rows) for key in aggregates}
+    data[f'by_{group_by}'] = rows
+    return data
+
+
+async def acompute_stats(model, group_by=None):
+    """Асинхронный вариант compute_stats"""
+    aggregates = status_aggregates(model)
+    if group_by is None:
+        return await model.objects.order_by().aaggregate(**aggregates)
+
+    rows = [
+        row async for row in model.objects.order_by(group_by).values(group_by).annotate(**aggregates)
+    ]
+    data = {key: sum(row[key] for row in rows) for key in aggregates}
+    data[f'by_{group_by}'] = rows
+    return data
+
+
+def stats_key(model, version, group_by):
+    return f'catalog:stats:{model._meta.label_lower}:{version}:{group_by or ""}'
+
+
+def stats_entry(data):
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.md5(payload).hexdigest(), data
+
+
+def get_stats(model, group_by=None):
+    """Статистика из кэша вместе с ETag; пересчитывается после изменения модели"""
+    key = stats_key(model, get_version(model), group_by)
+    cached = cache.get(key)
+    if cached is None:
+        cached = stats_entry(compute_stats(model, group_by))
+        cache.set(key, cached, getattr(settings, 'STATS_CACHE_TIMEOUT', 300))
+    return cached
+
+
+async def aget_stats(model, group_by=None):
+    """Асинхронный вариант get_stats с тем же ключом кэша"""
+    key = stats_key(model, await aget_version(model), group_by)
+    cached = await cache.aget(key)
+    if cached is None:
+        cached = stats_entry(await acompute_stats(model, group_by))
+        await cache.aset(key, cached, getattr(settings, 'STATS_CACHE_TIMEOUT', 300))
+    return cached
+
+
+def group_by_error(model, group_by):
+    if group_by is not None and group_by not in STATS_GROUP_FIELDS[model]:
+        return f'group_by должен быть одним из: {", ".join(STATS_GROUP_FIELDS[model])}'
+    return None
+
+
+def stats_response(request, model):
+    group_by = request.query_params.get('group_by') or None
+    error = group_by_error(model, group_by)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag, data = get_stats(model, group_by)
+    etag = f'"{etag}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -1,3 +1,1640 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from io import BytesIO, StringIO
+from urllib.parse import quote
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from carspark_backend import schema as openapi_schema
+from carspark_backend.cache import MeteredLocMemCache, MeteredRedisCache, cache_metrics
+from carspark_backend.server import tuned_settings, worker_counts
+
+from .cache import response_cache_metrics
+from .counters import view_counter
+from .fastpath import RowPlan
+from .images import ImageStorage, LocalImageStorage, S3ImageStorage, upload_images, wait_for_derivatives
+from .models import Admin, Car, ExchangeRate, Part, Photo
+from .orphans import ReferenceIndex, collect_orphans
+from .photos import set_photos
+from .search import install_search_triggers
+from .serializers import CarImportSerializer, PartImportSerializer
+from .stats import compute_stats
+from .tokens import issue_tokens
+
+
+class CatalogIndexUsageTest(TestCase):
+    """Регрессия планов запросов: запросы каталога не должны скатываться в полный скан"""
+
+    def explain(self, queryset):
+        # На маленьких тестовых таблицах PostgreSQL предпочитает seq scan,
+        # поэтому запрещаем его и смотрим, остался ли у планировщика индексный путь
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.explain(queryset)
+        self.assertIn(index_name, plan, f'Запрос не использует {index_name}:\n{plan}')
+        for marker in ('TEMP B-TREE', 'Seq Scan', 'Sort Key'):
+            self.assertNotIn(marker, plan, f'Лишняя сортировка или скан:\n{plan}')
+
+    def test_published_cars_ordering_uses_indexes(self):
+        published = Car.objects.filter(status='published')
+        cases = {
+            '-created_at': 'car_status_created_idx',
+            'price': 'car_status_price_idx',
+            '-price': 'car_status_price_idx',
+            'price_eur': 'car_status_price_eur_idx',
+            '-price_eur': 'car_status_price_eur_idx',
+            'year': 'car_status_year_idx',
+            'mileage': 'car_status_mileage_idx',
+            '-views': 'car_status_views_idx',
+        }
+        for ordering, index_name in cases.items():
+            with self.subTest(ordering=ordering):
+                self.assertUsesIndex(published.order_by(ordering), index_name)
+
+    def test_car_status_listing_uses_index(self):
+        self.assertUsesIndex(
+            Car.objects.filter(status='draft').order_by('-created_at'),
+            'car_status_created_idx',
+        )
+
+    def test_car_brand_filter_uses_index(self):
+        plan = self.explain(Car.objects.filter(brand='BMW', model='X5'))
+        self.assertIn('car_brand_model_year_idx', plan)
+
+    def test_published_parts_ordering_uses_indexes(self):
+        published = Part.objects.filter(status='published')
+        cases = {
+            '-created_at': 'part_status_created_idx',
+            'price': 'part_status_price_idx',
+            'price_eur': 'part_status_price_eur_idx',
+            '-views': 'part_status_views_idx',
+        }
+        for ordering, index_name in cases.items():
+            with self.subTest(ordering=ordering):
+                self.assertUsesIndex(published.order_by(ordering), index_name)
+
+    def test_part_filters_use_indexes(self):
+        self.assertIn('part_brand_model_idx', self.explain(Part.objects.filter(brand='Audi', model='A4')))
+        self.assertIn(
+            'part_category_condition_idx',
+            self.explain(Part.objects.filter(category='Двигатель', condition='used')),
+        )
+
+
+def create_admin(email='dealer@example.com'):
+    return Admin.objects.create_user(username=email, email=email, password='secret-pass-123')
+
+
+def create_car(admin, index, **overrides):
+    fields = {
+        'brand': 'BMW',
+        'model': 'X5',
+        'year': 2015 + index % 8,
+        'mileage': 10000 * (index % 5),
+        'transmission': 'automatic',
+        'fuel': 'diesel',
+        'drive': 'all',
+        'vin': f'VIN{index:014d}',
+        'condition': 'good',
+        'price': Decimal('10000.00') + 1000 * (index % 3),
+        'city': 'Брюссель',
+        'description': 'Описание',
+        'status': 'published',
+        'admin': admin,
+    }
+    fields.update(overrides)
+    photos = fields.pop('photos', None)
+    car = Car.objects.create(**fields)
+    if photos:
+        set_photos(car, photos)
+    return car
+
+
+def create_part(admin, index, **overrides):
+    fields = {
+        'name': f'Запчасть {index}',
+        'brand': 'Audi',
+        'model': 'A4',
+        'category': 'Двигатель',
+        'condition': 'used',
+        'price': Decimal('100.00') + 10 * (index % 3),
+        'city': 'Брюссель',
+        'description': 'Описание',
+        'status': 'published',
+        'admin': admin,
+    }
+    fields.update(overrides)
+    photos = fields.pop('photos', None)
+    part = Part.objects.create(**fields)
+    if photos:
+        set_photos(part, photos)
+    return part
+
+
+class CatalogKeysetPaginationTest(TestCase):
+    """Keyset-режим пагинации /api/cars/ и /api/parts/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = create_admin()
+        for index in range(25):
+            create_car(admin, index)
+            create_part(admin, index)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    def test_cursor_walk_matches_ordering_with_tie_breaker(self):
+        for ordering in ['price', '-price', '-price_eur', 'year', '-mileage', 'created_at', '-views']:
+            with self.subTest(ordering=ordering):
+                ids = self.walk(f'/api/cars/?cursor=&page_size=4&ordering={ordering}')
+                field = ordering.lstrip('-')
+                tie_breaker = '-id' if ordering.startswith('-') else 'id'
+                expected = list(Car.objects.order_by(ordering, tie_breaker).values_list('id', flat=True))
+                self.assertEqual(ids, expected)
+
+    def test_parts_cursor_walk_uses_default_ordering(self):
+        ids = self.walk('/api/parts/?cursor=&page_size=7')
+        expected = list(Part.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_count_is_optional(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/cars/?cursor=&page_size=5')
+        self.assertIsNone(response.json()['count'])
+        response = self.client.get('/api/cars/?cursor=&page_size=5&count=1')
+        self.assertEqual(response.json()['count'], 25)
+
+    def test_cursor_from_other_ordering_is_rejected(self):
+        next_url = self.client.get('/api/cars/?cursor=&page_size=5&ordering=price').json()['next']
+        response = self.client.get(next_url.replace('ordering=price', 'ordering=year'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get('/api/cars/?page=2')
+        self.assertEqual(response.json()['count'], 25)
+        self.assertEqual(len(response.json()['results']), 5)
+
+
+class ViewCounterTest(TestCase):
+    """Атомарный и буферизованный счетчик просмотров"""
+
+    def setUp(self):
+        self.admin = create_admin()
+        self.car = create_car(self.admin, 1)
+        self.part = create_part(self.admin, 1)
+        self.client.force_login(self.admin)
+
+    def test_increment_is_single_column_update(self):
+        updated_at = self.car.updated_at
+        for expected in (1, 2, 3):
+            response = self.client.post(f'/api/cars/{self.car.id}/increment_views/')
+            self.assertEqual(response.json(), {'views': expected})
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.views, 3)
+        self.assertEqual(self.car.updated_at, updated_at)
+
+    def test_missing_object_returns_404(self):
+        self.assertEqual(self.client.post('/api/parts/999999/increment_views/').status_code, 404)
+        for path in ('/api/cars/abc/increment_views/', '/api/parts/abc/increment_views/'):
+            self.assertEqual(self.client.post(path).status_code, 404)
+        with self.settings(VIEW_COUNTER_BUFFERED=True):
+            self.assertEqual(self.client.post('/api/cars/abc/increment_views/').status_code, 404)
+
+    @override_settings(VIEW_COUNTER_BUFFERED=True, VIEW_COUNTER_FLUSH_INTERVAL=3600)
+    def test_buffered_increments_are_flushed_in_bulk(self):
+        view_counter.flush()
+        other = create_car(self.admin, 2)
+        for _ in range(3):
+            self.client.post(f'/api/cars/{self.car.id}/increment_views/')
+        response = self.client.post(f'/api/cars/{other.id}/increment_views/')
+        self.assertEqual(response.json(), {'views': 1})
+        response = self.client.post(f'/api/parts/{self.part.id}/increment_views/')
+        self.assertEqual(response.json(), {'views': 1})
+        self.assertEqual(Car.objects.get(pk=self.car.pk).views, 0)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(view_counter.flush(), 3)
+        self.assertEqual(Car.objects.get(pk=self.car.pk).views, 3)
+        self.assertEqual(Car.objects.get(pk=other.pk).views, 1)
+        self.assertEqual(Part.objects.get(pk=self.part.pk).views, 1)
+        self.assertEqual(view_counter.pending(Car, self.car.pk), 0)
+
+    @override_settings(VIEW_COUNTER_BUFFERED=True, VIEW_COUNTER_FLUSH_INTERVAL=3600)
+    def test_failed_flush_keeps_increments(self):
+        view_counter.flush()
+        for _ in range(2):
+            self.client.post(f'/api/cars/{self.car.id}/increment_views/')
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=RuntimeError('lock timeout')):
+            with self.assertRaises(RuntimeError):
+                view_counter.flush()
+        self.assertEqual(view_counter.pending(Car, self.car.pk), 2)
+
+        with override_settings(VIEW_COUNTER_FLUSH_INTERVAL=0):
+            with mock.patch('django.db.models.query.QuerySet.update', side_effect=RuntimeError('lock timeout')):
+                response = self.client.post(f'/api/cars/{self.car.id}/increment_views/')
+        self.assertEqual(response.json(), {'views': 3})
+        self.assertEqual(view_counter.flush(), 1)
+        self.assertEqual(Car.objects.get(pk=self.car.pk).views, 3)
+
+
+class CatalogStatsTest(TestCase):
+    """Агрегированная статистика с кэшем и ETag"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = create_admin()
+        create_car(self.admin, 1, status='draft', fuel='petrol')
+        create_car(self.admin, 2, status='published')
+        create_car(self.admin, 3, status='sold', brand='Audi')
+        create_part(self.admin, 1, status='published')
+        self.client.force_login(self.admin)
+
+    def test_counts_in_single_query_then_from_cache(self):
+        with self.assertNumQueries(1):
+            stats = compute_stats(Car)
+        self.assertEqual(stats, {'total': 3, 'draft': 1, 'published': 1, 'sold': 1})
+        self.client.get('/api/cars/stats/')
+        with self.assertNumQueries(2):  # сессия и пользователь, без COUNT
+            response = self.client.get('/api/cars/stats/')
+        self.assertEqual(response.json()['total'], 3)
+
+    def test_group_by_breakdown(self):
+        response = self.client.get('/api/cars/stats/?group_by=brand')
+        data = response.json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(
+            data['by_brand'],
+            [
+                {'brand': 'Audi', 'total': 1, 'draft': 0, 'published': 0, 'sold': 1},
+                {'brand': 'BMW', 'total': 2, 'draft': 1, 'published': 1, 'sold': 0},
+            ],
+        )
+        self.assertEqual(self.client.get('/api/parts/stats/?group_by=fuel').status_code, 400)
+
+    def test_save_and_delete_invalidate_cache(self):
+        self.assertEqual(self.client.get('/api/parts/stats/').json()['published'], 1)
+        part = create_part(self.admin, 2, status='published')
+        self.assertEqual(self.client.get('/api/parts/stats/').json()['published'], 2)
+        part.delete()
+        self.assertEqual(self.client.get('/api/parts/stats/').json()['published'], 1)
+
+    def test_etag_returns_not_modified(self):
+        etag = self.client.get('/api/cars/stats/')['ETag']
+        response = self.client.get('/api/cars/stats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        create_car(self.admin, 4)
+        response = self.client.get('/api/cars/stats/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class CatalogFacetsTest(TestCase):
+    """Счетчики панели фильтров под текущими фильтрами"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = create_admin()
+        create_car(self.admin, 1)
+        create_car(self.admin, 2, fuel='petrol', city='Гент')
+        create_car(self.admin, 3, brand='Audi', body_type='sedan')
+        create_car(self.admin, 4, brand='Audi', status='draft')
+        create_part(self.admin, 1)
+        create_part(self.admin, 2, category='Тормоза', condition='new')
+
+    def test_counts_ignore_own_filter_in_one_query(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/cars/facets/?status=published&brand=BMW').json()
+        self.assertEqual(data['total'], 2)
+        facets = data['facets']
+        self.assertEqual(facets['brand'], [{'value': 'BMW', 'count': 2}, {'value': 'Audi', 'count': 1}])
+        self.assertEqual(facets['fuel'], [{'value': 'diesel', 'count': 1}, {'value': 'petrol', 'count': 1}])
+        self.assertEqual(facets['city'], [{'value': 'Брюссель', 'count': 1}, {'value': 'Гент', 'count': 1}])
+        self.assertEqual(facets['body_type'], [])
+
+    def test_search_and_parts(self):
+        data = self.client.get('/api/cars/facets/?search=audi').json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['facets']['body_type'], [{'value': 'sedan', 'count': 1}])
+        data = self.client.get('/api/parts/facets/?condition=new').json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['facets']['category'], [{'value': 'Тормоза', 'count': 1}])
+        self.assertEqual(data['facets']['condition'], [{'value': 'new', 'count': 1}, {'value': 'used', 'count': 1}])
+        self.assertEqual(self.client.get('/api/cars/facets/?year=abc').status_code, 400)
+
+    def test_cached_per_normalized_filters(self):
+        self.client.get('/api/cars/facets/?status=published&brand=BMW')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/cars/facets/?brand=BMW&page=2&fuel=&status=published')
+        self.assertEqual(response.json()['total'], 2)
+        create_car(self.admin, 5)
+        self.assertEqual(self.client.get('/api/cars/facets/?status=published&brand=BMW').json()['total'], 3)
+
+
+class PriceEurTest(TestCase):
+    """Цена в евро для сортировки и фильтров по бюджету в разных валютах"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = create_admin()
+        ExchangeRate.objects.create(currency='USD', rate=Decimal('0.9'))
+        ExchangeRate.objects.create(currency='RUB', rate=Decimal('0.01'))
+        self.eur = create_car(self.admin, 1, price=Decimal('950'))
+        self.usd = create_car(self.admin, 2, price=Decimal('1000'), currency='USD')
+        self.rub = create_car(self.admin, 3, price=Decimal('100000'), currency='RUB')
+
+    def ids(self, url):
+        return [row['id'] for row in self.client.get(url).json()['results']]
+
+    def test_ordering_and_budget_filters(self):
+        self.assertEqual(self.ids('/api/cars/?ordering=price'), [self.eur.id, self.usd.id, self.rub.id])
+        self.assertEqual(self.ids('/api/cars/?ordering=price_eur'), [self.usd.id, self.eur.id, self.rub.id])
+        self.assertEqual(
+            self.ids('/api/cars/?price_eur_min=920&price_eur_max=1000&ordering=-price_eur'), [self.rub.id, self.eur.id],
+        )
+        self.assertEqual(self.client.get(f'/api/cars/{self.usd.id}/').json()['price_eur'], '900.00')
+
+    def test_rate_change_recomputes_in_bulk(self):
+        part = create_part(self.admin, 1, price=Decimal('50'), currency='USD')
+        rate = ExchangeRate.objects.get(currency='USD')
+        rate.rate = Decimal('1.1')
+        with self.assertNumQueries(6):  # курс, чтение курсов, SAVEPOINT/RELEASE и по UPDATE на модель
+            rate.save()
+        self.usd.refresh_from_db()
+        part.refresh_from_db()
+        self.assertEqual((self.usd.price_eur, part.price_eur), (Decimal('1100.00'), Decimal('55.00')))
+        self.assertEqual(self.ids('/api/cars/?ordering=price_eur'), [self.eur.id, self.rub.id, self.usd.id])
+
+        call_command('set_exchange_rates', 'RUB=0.02', stdout=StringIO())
+        self.rub.refresh_from_db()
+        self.assertEqual(self.rub.price_eur, Decimal('2000.00'))
+
+    def test_bulk_import_sets_price_eur(self):
+        self.client.force_login(self.admin)
+        row = dict(CarImportSerializer(self.usd).data, vin=f'IMP{1:014d}', price='2000.00')
+        response = self.client.post('/api/cars/import/', data=json.dumps(row), content_type='application/x-ndjson')
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(Car.objects.get(vin=row['vin']).price_eur, Decimal('1800.00'))
+
+
+class ResponseCacheTest(TestCase):
+    """Кэш ответов публичных list/retrieve"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = create_admin()
+        self.car = create_car(self.admin, 1)
+
+    def test_normalized_query_string_hits_cache(self):
+        before = response_cache_metrics()
+        first = self.client.get('/api/cars/?brand=BMW&ordering=price')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/cars/?ordering=price&brand=BMW')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        after = response_cache_metrics()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+    def test_save_invalidates_list_and_retrieve(self):
+        self.client.get(f'/api/cars/{self.car.id}/')
+        self.client.get('/api/cars/')
+        self.car.price = Decimal('1.00')
+        self.car.save()
+        response = self.client.get(f'/api/cars/{self.car.id}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['price'], '1.00')
+        self.assertEqual(self.client.get('/api/cars/')['X-Cache'], 'MISS')
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_login(self.admin)
+        self.client.get('/api/parts/')
+        self.assertFalse(self.client.get('/api/parts/').has_header('X-Cache'))
+
+
+class CatalogSearchTest(TestCase):
+    """Полнотекстовый поиск с префиксами и синхронизацией индекса"""
+
+    def setUp(self):
+        self.admin = create_admin()
+        self.bmw = create_car(self.admin, 1, vin='WBA3A5C50CF256985', description='Один владелец')
+        self.mercedes = create_car(
+            self.admin, 2, brand='Mercedes-Benz', model='E-Class', vin='WDD2120341A000001',
+            description='Пневмоподвеска, BMW рядом не стоял',
+        )
+        self.part = create_part(self.admin, 1, name='Турбина Garrett')
+
+    def search(self, url):
+        return [row['id'] for row in self.client.get(url).json()['results']]
+
+    def test_prefix_match_on_vin_brand_and_model(self):
+        self.assertEqual(self.search('/api/cars/?search=WBA3'), [self.bmw.id])
+        self.assertEqual(self.search('/api/cars/?search=merc'), [self.mercedes.id])
+        self.assertEqual(self.search('/api/cars/?search=merc e-cl'), [self.mercedes.id])
+        self.assertEqual(self.search('/api/parts/?search=турб'), [self.part.id])
+
+    def test_results_ranked_by_field_weight(self):
+        self.assertEqual(self.search('/api/cars/?search=bmw'), [self.bmw.id, self.mercedes.id])
+
+    def test_explicit_ordering_wins_over_rank(self):
+        self.assertEqual(self.search('/api/cars/?search=bmw&ordering=-year'), [self.mercedes.id, self.bmw.id])
+
+    def test_search_finds_car_saved_after_migrations(self):
+        # Триггеры ставятся после всех миграций, а не в 0004: таблицу пересоздавали AddField/RemoveField
+        car = create_car(self.admin, 3, brand='Škoda', model='Superb', vin='TMBJJ7NP0J7000001')
+        self.assertEqual(self.search('/api/cars/?search=superb'), [car.id])
+        self.assertEqual(install_search_triggers(), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'триггеры FTS5 только на SQLite')
+    def test_lost_triggers_are_reinstalled(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER cars_car_fts_ai')
+        car = create_car(self.admin, 3, model='Superb', vin='TMBJJ7NP0J7000001')
+        self.assertEqual(self.search('/api/cars/?search=superb'), [])
+        self.assertEqual(install_search_triggers(), ['cars_car'])
+        cache.clear()
+        self.assertEqual(self.search('/api/cars/?search=superb'), [car.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.bmw.model = 'M5'
+        self.bmw.save()
+        self.assertEqual(self.search('/api/cars/?search=m5'), [self.bmw.id])
+        self.assertEqual(self.search('/api/cars/?search=x5'), [])
+        self.mercedes.delete()
+        self.assertEqual(self.search('/api/cars/?search=merc'), [])
+
+
+class ListProjectionTest(TestCase):
+    """Компактные списки и ?fields= с проекцией колонок"""
+
+    def setUp(self):
+        self.admin = create_admin()
+        self.admin.first_name, self.admin.last_name = 'Иван', 'Петров'
+        self.admin.save()
+        self.car = create_car(self.admin, 1, photos=['https://cdn/1.jpg', 'https://cdn/2.jpg'])
+        create_part(self.admin, 1)
+
+    def test_compact_list_returns_cover_and_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            row = self.client.get('/api/cars/?compact=1').json()['results'][0]
+        self.assertEqual(row['photo'], 'https://cdn/1.jpg')
+        self.assertEqual(row['photos_count'], 2)
+        self.assertNotIn('description', row)
+        self.assertNotIn('photos', row)
+        select = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"description"', select)
+        self.assertNotIn('cars_admin', select)
+
+        row = self.client.get('/api/parts/?compact=1').json()['results'][0]
+        self.assertEqual((row['photo'], row['photos_count']), (None, 0))
+
+    def test_sparse_fieldset(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.client.get('/api/cars/?fields=brand,price,admin_name').json()['results']
+        self.assertEqual(rows, [{'id': self.car.id, 'brand': 'BMW', 'price': '11000.00', 'admin_name': 'Иван Петров'}])
+        select = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"mileage"', select)
+        self.assertIn('cars_admin', select)
+
+    def test_default_list_returns_cover_only(self):
+        row = self.client.get('/api/cars/').json()['results'][0]
+        self.assertEqual((row['photos'], row['photos_count']), (['https://cdn/1.jpg'], 2))
+        self.assertEqual(row['description'], 'Описание')
+        self.assertEqual(row['admin_name'], 'Иван Петров')
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class FastListParityTest(TestCase):
+    """Быстрая сборка списков дает те же байты, что и сериализаторы DRF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = create_admin()
+        admin.first_name = 'Анна'
+        admin.save()
+        for index in range(7):
+            create_car(
+                admin, index, generation='G05' if index % 2 else None, body_type='suv' if index % 3 else None,
+                power=249 if index % 2 else None, engine_volume=2.993 if index % 2 else None,
+                price=Decimal('12345.60') + index, photos=[f'https://cdn/{index}.jpg'] * index,
+                status='published' if index % 3 else 'sold',
+            )
+            create_part(admin, index, year_from=2010 if index % 2 else None)
+
+    def assertParity(self, url):
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            expected = self.client.get(url)
+        actual = self.client.get(url)
+        self.assertEqual(actual.status_code, 200)
+        self.assertEqual(actual.content, expected.content, url)
+
+    def test_outputs_are_byte_identical(self):
+        for url in [
+            '/api/cars/',
+            '/api/cars/?page_size=3&page=2&ordering=-price',
+            '/api/cars/?compact=1&status=published',
+            '/api/cars/?fields=id,price,created_at,admin_name,engine_volume',
+            '/api/cars/?search=bmw&ordering=year',
+            '/api/cars/?cursor=&page_size=2&ordering=mileage',
+            '/api/parts/',
+            '/api/parts/?compact=1&fields=photo,photos_count,price',
+        ]:
+            with self.subTest(url=url):
+                self.assertParity(url)
+
+    def test_plan_cache_is_bounded(self):
+        names = ['brand', 'model', 'year', 'mileage', 'price', 'city', 'views']
+        with mock.patch.object(RowPlan, 'cache_size', 4):
+            for size in range(1, len(names) + 1):
+                self.assertParity(f'/api/cars/?fields={",".join(names[:size])}')
+            self.assertLessEqual(len(RowPlan._cache), 4)
+
+    def test_keyset_next_links_match(self):
+        url = '/api/cars/?cursor=&page_size=3&ordering=-created_at'
+        while url:
+            self.assertParity(url)
+            url = self.client.get(url).json()['next']
+
+
+class SlowImageStorage(ImageStorage):
+    """Хранилище-заглушка: запоминает пики параллельности и задерживает первый файл"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def save(self, key, fileobj, content_type=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.2 if fileobj.name == 'photo0.jpg' else 0.05)
+        with self.lock:
+            self.active -= 1
+        return self.url(fileobj.name)
+
+    def url(self, key):
+        return f'https://fake/{key}'
+
+    def delete(self, key):
+        pass
+
+
+class ImageUploadTest(TestCase):
+    """Загрузка фотографий через подключаемое хранилище"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def files(self, count):
+        return [
+            SimpleUploadedFile(f'photo{index}.jpg', f'image-{index}'.encode(), content_type='image/jpeg')
+            for index in range(count)
+        ]
+
+    def test_local_storage_upload_and_delete(self):
+        with self.settings(
+            IMAGE_STORAGE_BACKEND='cars.images.LocalImageStorage', IMAGE_STORAGE_ROOT=self.root,
+            IMAGE_DERIVATIVES_ENABLED=False,
+        ):
+            response = self.client.post('/api/images/upload/', {'images': self.files(3), 'batchId': 'batch'})
+            images = response.json()['images']
+            self.assertEqual(len(images), 3)
+            for index, image in enumerate(images):
+                self.assertTrue(image['key'].startswith('batch/') and image['key'].endswith('.jpg'))
+                with open(os.path.join(self.root, image['key']), 'rb') as stored:
+                    self.assertEqual(stored.read(), f'image-{index}'.encode())
+
+            response = self.client.delete(
+                '/api/images/delete/', {'imageKey': images[0]['key']}, content_type='application/json'
+            )
+            self.assertTrue(response.json()['success'])
+            self.assertFalse(os.path.exists(os.path.join(self.root, images[0]['key'])))
+
+    def test_batch_uploads_concurrently_and_keeps_order(self):
+        storage = SlowImageStorage()
+        with self.settings(IMAGE_UPLOAD_WORKERS=4, IMAGE_DERIVATIVES_ENABLED=False):
+            images = upload_images(storage, self.files(8), 'batch')
+        self.assertEqual(storage.peak, 4)
+        self.assertEqual([image['url'] for image in images], [f'https://fake/photo{index}.jpg' for index in range(8)])
+        self.assertEqual(len({image['key'] for image in images}), 8)
+
+    def test_s3_misconfiguration_is_reported(self):
+        with self.settings(IMAGE_STORAGE_BACKEND='cars.images.S3ImageStorage', USE_S3=False):
+            response = self.client.post('/api/images/upload/', {'images': self.files(1)})
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('USE_S3', response.json()['error'])
+
+
+class ImageDerivativesTest(TestCase):
+    """Производные фотографий: размеры, EXIF, запись в объявлении"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def photo(self):
+        image = Image.new('RGB', (4000, 3000), 'red')
+        exif = Image.Exif()
+        exif[0x0112] = 6  # поворот на 90°
+        exif[0x010F] = 'CameraMaker'
+        output = BytesIO()
+        image.save(output, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', output.getvalue(), content_type='image/jpeg')
+
+    def test_derivatives_are_generated_in_background(self):
+        with self.settings(IMAGE_STORAGE_BACKEND='cars.images.LocalImageStorage', IMAGE_STORAGE_ROOT=self.root):
+            image = self.client.post('/api/images/upload/', {'images': [self.photo()]}).json()['images'][0]
+            wait_for_derivatives(timeout=30)
+
+        self.assertEqual(set(image['derivatives']), {'thumb', 'card', 'full'})
+        # Оригинал хранится повернутым, без EXIF и не больше размера full
+        self.assertEqual((image['width'], image['height']), (1440, 1920))
+        with Image.open(os.path.join(self.root, image['key'])) as stored:
+            self.assertEqual((stored.format, stored.size), ('JPEG', (1440, 1920)))
+            self.assertEqual(len(stored.getexif()), 0)
+        expected_sizes = {'thumb': (180, 240), 'card': (450, 600), 'full': (1440, 1920)}
+        for name, derivative in image['derivatives'].items():
+            self.assertTrue(derivative['key'].endswith(f'/{name}.webp'))
+            with Image.open(os.path.join(self.root, derivative['key'])) as stored:
+                self.assertEqual(stored.format, 'WEBP')
+                self.assertEqual(stored.size, expected_sizes[name])
+                self.assertEqual(len(stored.getexif()), 0)
+
+    def test_compact_list_returns_thumbnail(self):
+        admin = create_admin()
+        entry = {
+            'url': 'https://cdn/a.jpg', 'key': 'a.jpg',
+            'derivatives': {'thumb': {'key': 'a/thumb.webp', 'url': 'https://cdn/a/thumb.webp'}},
+        }
+        create_car(admin, 1, photos=[entry, 'https://cdn/b.jpg'])
+        row = self.client.get('/api/cars/?compact=1').json()['results'][0]
+        self.assertEqual((row['photo'], row['photos_count']), ('https://cdn/a/thumb.webp', 2))
+        row = self.client.get('/api/cars/').json()['results'][0]
+        self.assertEqual(row['photos'], ['https://cdn/a/thumb.webp'])
+
+    def local_storage(self):
+        return self.settings(
+            IMAGE_STORAGE_BACKEND='cars.images.LocalImageStorage', IMAGE_STORAGE_ROOT=self.root,
+            IMAGE_STORAGE_URL='https://cdn/images',
+        )
+
+    def store_original(self, key):
+        os.makedirs(os.path.dirname(os.path.join(self.root, key)), exist_ok=True)
+        Image.new('RGB', (1200, 900), 'blue').save(os.path.join(self.root, key), 'JPEG')
+
+    def test_plain_url_gets_thumbnail_from_key(self):
+        admin = create_admin()
+        self.store_original('batch/a.jpg')
+        os.makedirs(os.path.join(self.root, 'batch/a'))
+        with open(os.path.join(self.root, 'batch/a/thumb.webp'), 'wb') as thumb:
+            thumb.write(b'webp')
+        with self.local_storage():
+            # Фронтенд сохраняет в объявлении только URL из ответа загрузки
+            car = create_car(admin, 1, photos=['https://cdn/images/batch/a.jpg', 'https://cdn/other.jpg'])
+        photos = {photo.url: photo for photo in car.photos.all()}
+        # Записываются только производные, которые есть в хранилище
+        self.assertEqual(photos['https://cdn/images/batch/a.jpg'].derivatives, {'thumb': {
+            'key': 'batch/a/thumb.webp', 'url': 'https://cdn/images/batch/a/thumb.webp',
+        }})
+        self.assertEqual(photos['https://cdn/other.jpg'].derivatives, {})
+        row = self.client.get('/api/cars/').json()['results'][0]
+        self.assertEqual(row['photos'], ['https://cdn/images/batch/a/thumb.webp'])
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_legacy_url_without_derivatives_keeps_original_cover(self):
+        admin = create_admin()
+        self.store_original('legacy/a.jpg')
+        with self.local_storage():
+            car = create_car(admin, 1, photos=['https://cdn/images/legacy/a.jpg'])
+        self.assertEqual(car.photos.get().derivatives, {})
+        row = self.client.get('/api/cars/').json()['results'][0]
+        self.assertEqual(row['photos'], ['https://cdn/images/legacy/a.jpg'])
+
+        with self.local_storage():
+            call_command('render_photo_derivatives', '--dry-run', stdout=StringIO())
+            self.assertEqual(car.photos.get().derivatives, {})
+            call_command('render_photo_derivatives', stdout=StringIO())
+        photo = car.photos.get()
+        self.assertEqual(set(photo.derivatives), {'thumb', 'card', 'full'})
+        self.assertEqual((photo.width, photo.height), (1200, 900))
+        with Image.open(os.path.join(self.root, 'legacy/a/thumb.webp')) as thumb:
+            self.assertEqual(thumb.size, (320, 240))
+        row = self.client.get('/api/cars/').json()['results'][0]
+        self.assertEqual(row['photos'], ['https://cdn/images/legacy/a/thumb.webp'])
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class PhotoModelTest(TestCase):
+    """Фотографии в модели Photo: запись списка, обложка в списках, удаление файла"""
+
+    def setUp(self):
+        self.admin = create_admin()
+        self.client.force_login(self.admin)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.uploaded = {
+            'url': 'https://cdn/a.jpg', 'key': 'batch/a.jpg', 'width': 3000, 'height': 4000,
+            'derivatives': {'thumb': {'key': 'batch/a/thumb.webp', 'url': 'https://cdn/a/thumb.webp'}},
+        }
+
+    def test_write_keeps_existing_rows(self):
+        payload = {
+            'brand': 'BMW', 'model': 'X5', 'year': 2020, 'mileage': 1, 'transmission': 'automatic',
+            'fuel': 'diesel', 'drive': 'all', 'vin': 'VIN00000000000042', 'condition': 'good',
+            'price': '1000', 'city': 'Гент', 'description': 'Т', 'photos': [self.uploaded, 'https://cdn/b.jpg'],
+        }
+        car = self.client.post('/api/cars/', payload, content_type='application/json').json()
+        self.assertEqual(car['photos'], ['https://cdn/a.jpg', 'https://cdn/b.jpg'])
+        self.assertEqual((car['images'][0]['width'], car['images'][0]['key']), (3000, 'batch/a.jpg'))
+        first = Photo.objects.get(url='https://cdn/a.jpg')
+
+        # Клиент присылает только URL: порядок меняется, производные и размеры сохраняются
+        response = self.client.patch(
+            f'/api/cars/{car["id"]}/', {'photos': ['https://cdn/c.jpg', 'https://cdn/a.jpg']},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['photos'], ['https://cdn/c.jpg', 'https://cdn/a.jpg'])
+        photo = Photo.objects.get(url='https://cdn/a.jpg')
+        self.assertEqual((photo.pk, photo.position, photo.width), (first.pk, 1, 3000))
+        self.assertEqual(photo.derivatives, self.uploaded['derivatives'])
+        self.assertFalse(Photo.objects.filter(url='https://cdn/b.jpg').exists())
+
+        row = self.client.get('/api/cars/').json()['results'][0]
+        self.assertEqual((row['photos'], row['photos_count']), (['https://cdn/c.jpg'], 2))
+
+    def test_invalid_photos(self):
+        car = create_car(self.admin, 1)
+        response = self.client.patch(
+            f'/api/cars/{car.pk}/', {'photos': ['https://cdn/a.jpg', {'key': 'a.jpg'}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['photos']), ['1'])
+
+    def test_key_is_derived_from_storage_url(self):
+        with self.settings(IMAGE_STORAGE_BACKEND='cars.images.LocalImageStorage', IMAGE_STORAGE_URL='https://img'):
+            car = create_car(self.admin, 1, photos=['https://img/batch/b.jpg', 'https://other/c.jpg'])
+        self.assertEqual([photo.key for photo in car.photos.all()], ['batch/b.jpg', ''])
+
+    def test_image_delete_detaches_listings(self):
+        car = create_car(self.admin, 1, photos=[self.uploaded, 'https://cdn/b.jpg'])
+        part = create_part(self.admin, 1, photos=[self.uploaded])
+        Car.objects.filter(pk=car.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        for key in ('batch/a.jpg', 'batch/a/thumb.webp'):
+            os.makedirs(os.path.dirname(os.path.join(self.root, key)), exist_ok=True)
+            open(os.path.join(self.root, key), 'wb').close()
+
+        with self.settings(IMAGE_STORAGE_BACKEND='cars.images.LocalImageStorage', IMAGE_STORAGE_ROOT=self.root):
+            response = self.client.delete(
+                '/api/images/delete/', {'imageKey': 'batch/a.jpg'}, content_type='application/json'
+            )
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(os.listdir(os.path.join(self.root, 'batch', 'a')), [])
+        self.assertEqual([photo.url for photo in car.photos.all()], ['https://cdn/b.jpg'])
+        self.assertFalse(part.photos.exists())
+        car.refresh_from_db()
+        self.assertGreater(car.updated_at, timezone.now() - timedelta(minutes=1))
+
+
+class OrphanImageCollectorTest(TestCase):
+    """Удаление файлов хранилища без ссылок из объявлений"""
+
+    def setUp(self):
+        self.admin = create_admin()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def store(self, key, age_hours=48):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'image')
+        modified = time.time() - age_hours * 3600
+        os.utime(path, (modified, modified))
+
+    def stored_keys(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+            for directory, _dirs, names in os.walk(self.root) for name in names
+        )
+
+    def test_dry_run_then_delete(self):
+        create_car(self.admin, 1, photos=[
+            {'url': 'https://cdn/a.jpg', 'key': 'kept/a.jpg'},
+            'https://img/legacy/b.jpg',
+        ])
+        for key in ('kept/a.jpg', 'kept/a/thumb.webp', 'legacy/b.jpg', 'abandoned/c.jpg', 'abandoned/c/card.webp',
+                    'static/admin.css', 'loose.jpg'):
+            self.store(key)
+        self.store('fresh/d.jpg', age_hours=1)
+
+        with self.settings(IMAGE_STORAGE_BACKEND='cars.images.LocalImageStorage', IMAGE_STORAGE_URL='https://img'):
+            stdout = StringIO()
+            call_command('collect_orphan_images', '--local-root', self.root, '--json', stdout=stdout)
+            report = json.loads(stdout.getvalue())
+            self.assertEqual(report['orphan_keys'], ['abandoned/c.jpg', 'abandoned/c/card.webp', 'loose.jpg'])
+            self.assertEqual((report['listed'], report['recent'], report['deleted']), (7, 1, 0))
+            self.assertIn('abandoned/c.jpg', self.stored_keys())
+
+            call_command('collect_orphan_images', '--local-root', self.root, '--delete', stdout=StringIO())
+        self.assertEqual(
+            self.stored_keys(),
+            ['fresh/d.jpg', 'kept/a.jpg', 'kept/a/thumb.webp', 'legacy/b.jpg', 'static/admin.css'],
+        )
+
+    def test_photo_saved_during_pass_is_kept(self):
+        self.store('batch/a.jpg')
+        storage = LocalImageStorage(root=self.root)
+        original = storage.delete_many
+
+        def delete_many(keys):
+            self.assertEqual(keys, [])
+            return original(keys)
+
+        with mock.patch('cars.orphans.ReferenceIndex.load', return_value=ReferenceIndex()), \
+                mock.patch.object(storage, 'delete_many', side_effect=delete_many):
+            create_car(self.admin, 1, photos=[{'url': 'https://cdn/a.jpg', 'key': 'batch/a.jpg'}])
+            report = collect_orphans(storage, dry_run=False)
+        self.assertEqual((len(report.orphans), report.deleted), (1, 0))
+        self.assertEqual(self.stored_keys(), ['batch/a.jpg'])
+
+    def test_s3_listing_and_batched_delete(self):
+        old = timezone.now() - timedelta(days=3)
+
+        def page(start, stop):
+            return {'Contents': [{'Key': f'b1/{index}.jpg', 'LastModified': old, 'Size': 10}
+                                 for index in range(start, stop)]}
+
+        pages = {
+            ('', '/'): [{'CommonPrefixes': [{'Prefix': 'b1/'}, {'Prefix': 'static/'}]}],
+            ('b1/', None): [page(0, 1000), page(1000, 1500)],
+        }
+        client = mock.Mock()
+        client.get_paginator.return_value.paginate.side_effect = (
+            lambda Bucket, Prefix, Delimiter=None: pages[(Prefix, Delimiter)]
+        )
+        client.delete_objects.side_effect = lambda Bucket, Delete: (
+            {'Errors': [{'Key': 'b1/7.jpg', 'Message': 'AccessDenied'}]} if len(Delete['Objects']) == 1000 else {}
+        )
+        with mock.patch('cars.images.s3_client', return_value=client):
+            report = collect_orphans(S3ImageStorage(), dry_run=False, batch_size=1000)
+
+        self.assertEqual((report.listed, report.deleted, report.failed), (1500, 1499, ['b1/7.jpg']))
+        self.assertEqual([len(call.kwargs['Delete']['Objects']) for call in client.delete_objects.call_args_list],
+                         [1000, 500])
+
+
+class BulkImportExportTest(TestCase):
+    """Массовый импорт CSV/NDJSON и потоковый экспорт"""
+
+    CSV_HEADER = 'brand,model,year,mileage,transmission,fuel,drive,vin,condition,price,city,description,photos,status\n'
+
+    def setUp(self):
+        self.admin = create_admin()
+        self.client.force_login(self.admin)
+
+    def post(self, url, body, content_type):
+        return self.client.post(url, body, content_type=content_type)
+
+    def test_csv_import_upserts_on_vin(self):
+        existing = create_car(self.admin, 1, vin='VIN00000000000001', views=7)
+        body = self.CSV_HEADER + (
+            'Audi,A6,2019,50000,automatic,diesel,all,VIN00000000000001,good,25000.50,Гент,Обновлено,,published\n'
+            'Audi,Q7,2020,30000,automatic,diesel,all,VIN00000000000002,excellent,45000,Гент,Новая,'
+            '"[""https://cdn/q7.jpg""]",draft\n'
+            'Audi,Q7,20x0,30000,automatic,diesel,all,VIN00000000000003,good,1,Гент,Плохая,,draft\n'
+        )
+        with self.settings(BULK_IMPORT_CHUNK_SIZE=2):
+            report = self.post('/api/cars/import/', body, 'text/csv').json()
+        self.assertEqual((report['created'], report['updated']), (1, 1))
+        self.assertEqual([error['row'] for error in report['errors']], [3])
+        self.assertIn('year', report['errors'][0]['errors'])
+
+        existing.refresh_from_db()
+        self.assertEqual((existing.model, existing.price, existing.views), ('A6', Decimal('25000.50'), 7))
+        created = Car.objects.get(vin='VIN00000000000002')
+        self.assertEqual(created.admin, self.admin)
+        self.assertEqual([photo.url for photo in created.photos.all()], ['https://cdn/q7.jpg'])
+
+    def test_upsert_keeps_columns_missing_from_row(self):
+        existing = create_car(
+            self.admin, 1, vin='VIN00000000000001', owners=3, customs=True, vat=True, color='Черный',
+            negotiable=False, currency='USD', price=Decimal('20000'), photos=['https://cdn/x5.jpg'],
+        )
+        body = (
+            'brand,model,year,mileage,transmission,fuel,drive,vin,condition,price,city,description\n'
+            'BMW,X5,2016,20000,automatic,diesel,all,VIN00000000000001,good,21000,Гент,Новое описание\n'
+        )
+        report = self.post('/api/cars/import/', body, 'text/csv').json()
+        self.assertEqual(report['updated'], 1)
+
+        existing.refresh_from_db()
+        self.assertEqual((existing.description, existing.price), ('Новое описание', Decimal('21000')))
+        self.assertEqual(
+            (existing.status, existing.owners, existing.customs, existing.vat, existing.color, existing.negotiable),
+            ('published', 3, True, True, 'Черный', False),
+        )
+        self.assertEqual((existing.currency, existing.price_eur), ('USD', Decimal('19320.00')))
+        self.assertEqual([photo.url for photo in existing.photos.all()], ['https://cdn/x5.jpg'])
+
+    def test_ndjson_import_reports_bad_lines(self):
+        lines = [
+            json.dumps({
+                'name': 'Фара', 'brand': 'BMW', 'model': 'X5', 'category': 'Оптика',
+                'condition': 'new', 'price': '300', 'city': 'Льеж', 'description': 'Левая',
+            }),
+            '{broken',
+            json.dumps({'name': 'Без цены', 'brand': 'BMW'}),
+        ]
+        report = self.post('/api/parts/import/', '\n'.join(lines) + '\n', 'application/x-ndjson').json()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+        self.assertEqual(Part.objects.get().name, 'Фара')
+
+    def test_unsupported_content_type(self):
+        self.assertEqual(self.post('/api/cars/import/', '{}', 'application/json').status_code, 415)
+
+    def test_import_invalidates_response_cache(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/cars/').json()['count'], 0)
+        self.client.force_login(self.admin)
+        body = self.CSV_HEADER + 'BMW,X1,2018,1,manual,petrol,front,VIN00000000000009,good,1,Гент,Т,,published\n'
+        self.post('/api/cars/import/', body, 'text/csv')
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/cars/').json()['count'], 1)
+
+    def test_streaming_export(self):
+        for index in range(3):
+            create_car(self.admin, index, photos=['https://cdn/1.jpg'], brand='Audi' if index else 'BMW')
+        response = self.client.get('/api/cars/export/?brand=Audi')
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['brand'] for row in rows], ['Audi', 'Audi'])
+        self.assertEqual(rows[0]['price'], '11000.00')
+
+        response = self.client.get('/api/cars/export/?output=csv')
+        reader = csv.DictReader(b''.join(response.streaming_content).decode().splitlines())
+        rows = list(reader)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(json.loads(rows[0]['photos']), ['https://cdn/1.jpg'])
+        self.assertEqual(Car.objects.count(), 3)
+
+
+class CarFeedTest(TestCase):
+    """Фид опубликованных автомобилей с инкрементальной выгрузкой"""
+
+    def setUp(self):
+        self.admin = create_admin()
+        self.old = create_car(self.admin, 1)
+        Car.objects.filter(pk=self.old.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        self.fresh = create_car(self.admin, 2)
+        self.draft = create_car(self.admin, 3, status='draft')
+
+    def feed(self, url, **headers):
+        response = self.client.get(url, **headers)
+        if response.status_code != 200 or 'csv' in response['Content-Type']:
+            return response, None
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return response, [json.loads(line)['id'] for line in lines]
+
+    def test_streams_published_cars_ordered_by_update(self):
+        response, ids = self.feed('/api/cars/feed/')
+        self.assertEqual(ids, [self.old.id, self.fresh.id])
+        self.assertIn('Last-Modified', response)
+
+    def test_updated_since(self):
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        _response, ids = self.feed(f'/api/cars/feed/?updated_since={quote(since)}')
+        # Черновик приходит только надгробием, без данных объявления
+        self.assertEqual(ids, [self.fresh.id, self.draft.id])
+        self.assertEqual(self.client.get('/api/cars/feed/?updated_since=вчера').status_code, 400)
+
+    def test_updated_since_reports_removed_cars(self):
+        since = quote((timezone.now() - timedelta(days=1)).isoformat())
+        response, _ids = self.feed(f'/api/cars/feed/?updated_since={since}')
+        self.fresh.status = 'sold'
+        self.fresh.save()
+        old_id = self.old.id
+        self.old.delete()
+
+        changed = self.client.get(f'/api/cars/feed/?updated_since={since}', HTTP_IF_NONE_MATCH=response['ETag'])
+        rows = [json.loads(line) for line in b''.join(changed.streaming_content).decode().splitlines()]
+        self.assertEqual(
+            [(row['id'], row['status']) for row in rows],
+            [(self.draft.id, 'draft'), (self.fresh.id, 'sold'), (old_id, 'deleted')],
+        )
+        self.assertIsNone(rows[1]['price'])
+        self.assertEqual(rows[2]['vin'], self.old.vin)
+        # Полный фид — только опубликованные
+        self.assertEqual(self.feed('/api/cars/feed/')[1], [])
+
+        long_ago = quote((timezone.now() - timedelta(days=60)).isoformat())
+        with self.settings(FEED_TOMBSTONE_RETENTION_DAYS=30):
+            self.assertEqual(self.client.get(f'/api/cars/feed/?updated_since={long_ago}').status_code, 410)
+
+    def test_conditional_get(self):
+        response, _ids = self.feed('/api/cars/feed/?output=csv')
+        with self.assertNumQueries(1):
+            cached, _ids = self.feed('/api/cars/feed/?output=csv', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        cached, _ids = self.feed('/api/cars/feed/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+        self.fresh.price = Decimal('1.00')
+        self.fresh.save()
+        changed, _ids = self.feed('/api/cars/feed/?output=csv', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_feed_query_uses_index(self):
+        plan = CatalogIndexUsageTest.explain(
+            self, Car.objects.filter(status='published', updated_at__gt=timezone.now()).order_by('updated_at')
+        )
+        self.assertIn('car_status_updated_idx', plan)
+        plan = CatalogIndexUsageTest.explain(self, Car.objects.filter(updated_at__gt=timezone.now()).order_by('updated_at'))
+        self.assertIn('car_updated_idx', plan)
+
+
+class CacheBackendTest(TestCase):
+    """Кэш с метриками, LRU-вытеснением и деградацией без Redis"""
+
+    def test_locmem_metrics_and_lru(self):
+        backend = MeteredLocMemCache('lru-test', {'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3, 'METRICS_NAME': 'lru-test'}})
+        for key in 'abc':
+            backend.set(key, key)
+        backend.get('a')
+        backend.set('d', 'd')  # вытесняет 'b', к которому дольше всего не обращались
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get_many(['a', 'c', 'x']), {'a': 'a', 'c': 'c'})
+        metrics = cache_metrics()['lru-test']
+        self.assertEqual((metrics['hits'], metrics['misses'], metrics['sets']), (3, 2, 4))
+
+    @skipUnless(importlib.util.find_spec('redis'), 'redis не установлен')
+    def test_unreachable_redis_degrades_to_misses(self):
+        backend = MeteredRedisCache('redis://127.0.0.1:1/0', {
+            'OPTIONS': {'IGNORE_EXCEPTIONS': True, 'METRICS_NAME': 'redis-down', 'socket_connect_timeout': 0.2},
+        })
+        backend.set('key', 'value')
+        self.assertEqual(backend.get('key', 'fallback'), 'fallback')
+        self.assertEqual(backend.get_many(['a', 'b']), {})
+        self.assertEqual(cache_metrics()['redis-down']['errors'], 3)
+
+        self.assertFalse(backend.has_key('key'))
+        self.assertFalse('key' in backend)
+        self.assertFalse(backend.touch('key'))
+        self.assertEqual(backend.set_many({'a': 1, 'b': 2}), ['a', 'b'])
+        backend.delete_many(['a', 'b'])
+        self.assertEqual(backend.get_or_set('key', 'computed'), 'computed')
+        backend.clear()
+
+    @skipUnless(importlib.util.find_spec('redis'), 'redis не установлен')
+    def test_login_with_unreachable_redis(self):
+        admin = create_admin()
+        caches = {'default': {
+            'BACKEND': 'carspark_backend.cache.MeteredRedisCache',
+            'LOCATION': 'redis://127.0.0.1:1/0',
+            'OPTIONS': {'IGNORE_EXCEPTIONS': True, 'METRICS_NAME': 'redis-login', 'socket_connect_timeout': 0.2},
+        }}
+        with self.settings(CACHES=caches, SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            client = self.client_class()
+            response = client.post(
+                '/api/login/', {'email': admin.email, 'password': 'secret-pass-123'}, content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(client.get('/api/profile/').json()['email'], admin.email)
+
+    def test_cached_db_sessions_skip_session_table(self):
+        admin = create_admin()
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            self.client.force_login(admin)
+            with self.assertNumQueries(1):  # только пользователь
+                self.assertEqual(self.client.get('/api/profile/').json()['email'], admin.email)
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            client = self.client_class()  # SessionMiddleware читает SESSION_ENGINE при создании
+            client.force_login(admin)
+            with self.assertNumQueries(2):
+                client.get('/api/profile/')
+
+
+class AsyncCatalogViewTest(TestCase):
+    """Асинхронные эндпоинты чтения совпадают с синхронными"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_admin()
+        for index in range(5):
+            create_car(cls.admin, index, status='published' if index % 2 else 'sold')
+            create_part(cls.admin, index)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_outputs_match_sync_views(self):
+        car = Car.objects.first()
+        for path in [
+            '/cars/',
+            '/cars/?status=sold&ordering=-price',
+            f'/cars/?page_size=2&page=2&admin={self.admin.id}',
+            '/cars/?compact=1&search=bmw',
+            '/cars/?cursor=&page_size=2&ordering=year&count=1',
+            f'/cars/{car.id}/',
+            '/parts/?fields=id,name,price',
+        ]:
+            with self.subTest(path=path):
+                expected = self.client.get(f'/api{path}')
+                actual = self.client.get(f'/api/async{path}')
+                self.assertEqual(actual.status_code, 200)
+                self.assertEqual(actual.content.replace(b'/api/async/', b'/api/'), expected.content)
+
+    def test_stats_match_sync_views(self):
+        self.assertEqual(self.client.get('/api/async/cars/stats/').content, self.client.get('/api/cars/stats/').content)
+        self.client.force_login(self.admin)
+        for path in ['/cars/stats/?group_by=fuel', '/parts/stats/']:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(f'/api/async{path}').content, self.client.get(f'/api{path}').content)
+
+    def test_response_cache_is_shared(self):
+        self.assertEqual(self.client.get('/api/cars/?ordering=price')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/async/cars/?ordering=price')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_errors(self):
+        response = self.client.get('/api/async/cars/999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), self.client.get('/api/cars/999999/').json())
+        self.assertEqual(self.client.get('/api/async/cars/?page=9').status_code, 404)
+        self.assertEqual(self.client.get('/api/async/cars/?cursor=bad').status_code, 404)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/api/async/parts/stats/?group_by=vin').status_code, 400)
+
+    async def test_stats_etag(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get('/api/async/cars/stats/')
+        self.assertEqual(response.json()['sold'], 3)
+        response = await self.async_client.get('/api/async/cars/stats/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_image_upload_and_delete(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with self.settings(
+            IMAGE_STORAGE_BACKEND='cars.images.LocalImageStorage', IMAGE_STORAGE_ROOT=root,
+            IMAGE_DERIVATIVES_ENABLED=False,
+        ):
+            files = [SimpleUploadedFile(f'photo{index}.jpg', b'image', content_type='image/jpeg') for index in range(2)]
+            images = self.client.post('/api/async/images/upload/', {'images': files}).json()['images']
+            self.assertEqual(len(images), 2)
+            self.assertTrue(os.path.exists(os.path.join(root, images[0]['key'])))
+            response = self.client.delete(
+                '/api/async/images/delete/', {'imageKey': images[0]['key']}, content_type='application/json'
+            )
+            self.assertTrue(response.json()['success'])
+            self.assertFalse(os.path.exists(os.path.join(root, images[0]['key'])))
+
+
+class TokenAuthenticationTest(TestCase):
+    """Токены API: выдача, обновление, отзыв и проверка без хеширования пароля"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = create_admin()
+
+    def login(self):
+        response = self.client.post(
+            '/api/login/', {'email': self.admin.email, 'password': 'secret-pass-123', 'token': True},
+            content_type='application/json',
+        )
+        self.assertNotIn('sessionid', response.cookies)
+        return response.json()['tokens']
+
+    def get(self, path, access):
+        return self.client.get(path, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_access_token_skips_password_hashing(self):
+        tokens = self.login()
+        with mock.patch.object(Admin, 'check_password', side_effect=AssertionError('PBKDF2 на запрос')):
+            response = self.get('/api/profile/', tokens['access'])
+        self.assertEqual(response.json()['email'], self.admin.email)
+        self.assertEqual(self.get('/api/profile/', tokens['access'] + 'x').status_code, 403)
+        with self.settings(AUTH_ACCESS_TOKEN_TTL=-1):
+            self.assertEqual(self.get('/api/profile/', tokens['access']).status_code, 403)
+
+    def test_refresh_rotates_token(self):
+        tokens = self.login()
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, content_type='application/json')
+        fresh = response.json()
+        self.assertNotEqual(fresh['refresh'], tokens['refresh'])
+        self.assertEqual(self.get('/api/profile/', fresh['access']).status_code, 200)
+        self.assertEqual(self.get('/api/profile/', tokens['access']).status_code, 200)
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_revocation(self):
+        first, second = self.login(), self.login()
+        self.assertEqual(self.get('/api/profile/', first['access']).status_code, 200)
+        response = self.client.post('/api/logout/', HTTP_AUTHORIZATION=f'Bearer {first["access"]}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get('/api/profile/', first['access']).status_code, 403)
+        # Отзыв хранится в базе: без кэша состояния токен тоже не принимается
+        cache.clear()
+        self.assertEqual(self.get('/api/profile/', first['access']).status_code, 403)
+        self.assertEqual(self.get('/api/profile/', second['access']).status_code, 200)
+
+        response = self.client.post(
+            '/api/token/revoke/', {'all': True}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {second["access"]}',
+        )
+        self.assertEqual(response.json(), {'revoked': 1})
+        response = self.client.post('/api/token/refresh/', {'refresh': second['refresh']}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_malformed_refresh_is_rejected(self):
+        for path, body in (('/api/token/refresh/', {'refresh': 123}), ('/api/token/revoke/', {'refresh': ['x']})):
+            response = self.client.post(path, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, path)
+        response = self.client.post('/api/token/revoke/', [1], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_async_views_accept_token(self):
+        access = issue_tokens(self.admin)['access']
+        self.assertEqual(self.client.get('/api/async/cars/stats/').status_code, 403)
+        self.assertEqual(self.get('/api/async/cars/stats/', access).status_code, 200)
+        self.assertEqual(self.get('/api/async/cars/stats/', 'broken').status_code, 403)
+
+
+class ServerTuningTest(TestCase):
+    """Подбор воркеров и потоков gunicorn по ресурсам контейнера"""
+
+    def test_worker_counts(self):
+        gib, mib = 1 << 30, 1 << 20
+        self.assertEqual(worker_counts(4, 8 * gib, 200 * mib), (9, 8))
+        self.assertEqual(worker_counts(4, 8 * gib, 200 * mib, 'uvicorn'), (9, 1))
+        # 75% от 1 ГиБ вмещают три воркера по 200 МиБ
+        self.assertEqual(worker_counts(8, gib, 200 * mib), (3, 16))
+        workers, threads = worker_counts(4, None, 200 * mib, max_db_connections=20)
+        self.assertLessEqual(workers * threads, 20)
+
+    def test_environment_overrides(self):
+        tuned = tuned_settings({'GUNICORN_WORKER_CLASS': 'uvicorn', 'WEB_CONCURRENCY': '3'})
+        self.assertEqual(tuned['worker_class'], 'uvicorn.workers.UvicornWorker')
+        self.assertEqual(tuned['wsgi_app'], 'carspark_backend.asgi:application')
+        self.assertEqual((tuned['workers'], tuned['threads']), (3, 1))
+        with self.assertRaises(ValueError):
+            tuned_settings({'GUNICORN_WORKER_CLASS': 'eventlet'})
+
+    def test_overrides_respect_connection_budget(self):
+        budget = {'GUNICORN_MAX_DB_CONNECTIONS': '60'}
+        for overrides in ({'GUNICORN_WORKERS': '12'}, {'WEB_CONCURRENCY': '40'}, {'GUNICORN_THREADS': '16'}):
+            with self.subTest(overrides=overrides):
+                tuned = tuned_settings({**budget, **overrides})
+                self.assertLessEqual(tuned['workers'] * tuned['threads'], 60)
+        self.assertEqual(tuned_settings({**budget, 'GUNICORN_WORKERS': '12'})['workers'], 12)
+        with self.assertRaises(ValueError):
+            tuned_settings({**budget, 'GUNICORN_WORKERS': '12', 'GUNICORN_THREADS': '8'})
+
+    def test_uvicorn_requires_per_request_connections(self):
+        environ = {'GUNICORN_WORKER_CLASS': 'uvicorn', 'DATABASE_URL': 'postgres://carspark@db/carspark'}
+        with self.assertRaises(ValueError):
+            tuned_settings(environ)
+        with self.assertRaises(ValueError):
+            tuned_settings({**environ, 'DB_CONNECTION_MODE': 'persistent'})
+        self.assertEqual(tuned_settings({**environ, 'DB_CONNECTION_MODE': 'none'})['threads'], 1)
+
+
+class OpenApiSchemaTest(TestCase):
+    """OpenAPI-схема генерируется один раз на версию кода и отдается с ETag"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def get_schema(self, version, **kwargs):
+        with self.settings(APP_VERSION=version, OPENAPI_SCHEMA_DIR=self.directory), \
+                mock.patch.object(openapi_schema, 'generate_schema', wraps=openapi_schema.generate_schema) as generate:
+            response = self.client.get('/api/schema/', **kwargs)
+        return response, generate.call_count
+
+    def test_generated_once_and_revalidated(self):
+        first, generated = self.get_schema('test-once')
+        self.assertEqual((first.status_code, generated), (200, 1))
+        self.assertIn(b'/api/cars/', first.content)
+
+        second, generated = self.get_schema('test-once')
+        self.assertEqual((second.content, second['ETag'], generated), (first.content, first['ETag'], 0))
+        as_json, generated = self.get_schema('test-once', HTTP_ACCEPT='application/json')
+        self.assertEqual(generated, 0)
+        self.assertIn('/api/cars/', json.loads(as_json.content)['paths'])
+
+        not_modified, _generated = self.get_schema('test-once', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_prebuilt_file_and_version_change(self):
+        with self.settings(APP_VERSION='test-file-1'):
+            call_command('generate_openapi_schema', directory=self.directory, stdout=StringIO())
+        response, generated = self.get_schema('test-file-1')
+        self.assertEqual(generated, 0)
+        with open(os.path.join(self.directory, 'schema-test-file-1.yaml'), 'rb') as file:
+            self.assertEqual(response.content, file.read())
+
+        _response, generated = self.get_schema('test-file-2')
+        self.assertEqual(generated, 1)
+        with self.settings(APP_VERSION='test-file-2'):
+            call_command('generate_openapi_schema', directory=self.directory, stdout=StringIO())
+        self.assertEqual(sorted(os.listdir(self.directory)), ['schema-test-file-2.json', 'schema-test-file-2.yaml'])
+
+
+@override_settings(METRICS_DEBUG_HEADERS=True, RESPONSE_CACHE_ENABLED=False)
+class RequestMetricsTest(TestCase):
+    """Метрики запросов и эндпоинт /metrics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = create_admin()
+        for index in range(3):
+            create_car(admin, index)
+
+    def test_debug_headers_report_queries(self):
+        for url in ['/api/cars/', '/api/async/cars/', f'/api/cars/{Car.objects.first().id}/']:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertGreater(len(queries), 0)
+                self.assertEqual(int(response['X-DB-Queries']), len(queries))
+                self.assertEqual(int(response['X-Response-Size']), len(response.content))
+                self.assertIn('serializer;dur=', response['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/cars/')
+        self.client.get('/api/cars/999999/')
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('carspark_http_requests_total{method="GET",route="car-list",status="200"}', body)
+        self.assertIn('carspark_http_requests_total{method="GET",route="car-detail",status="404"}', body)
+        self.assertIn('carspark_http_request_duration_seconds_bucket{method="GET",route="car-list",le="+Inf"}', body)
+        self.assertIn('carspark_http_request_db_queries_count{method="GET",route="car-list"}', body)
+        self.assertIn('# TYPE carspark_cache_events_total counter', body)
+
+    def test_metrics_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+def route_methods(patterns=None):
+    """Пары (имя маршрута, HTTP-метод) всех эндпоинтов cars/urls.py"""
+    from . import urls
+
+    found = set()
+    for pattern in urls.urlpatterns if patterns is None else patterns:
+        if hasattr(pattern, 'url_patterns'):
+            found |= route_methods(pattern.url_patterns)
+            continue
+        callback = pattern.callback
+        actions = getattr(callback, 'actions', None)
+        view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+        for method in ('get', 'post', 'put', 'patch', 'delete'):
+            if (method in actions) if actions else (view_class is None or hasattr(view_class, method)):
+                found.add((pattern.name, method))
+    return found
+
+
+def normalize_sql(sql):
+    """SQL без значений, зависящих от числа строк: IN (%s, %s) == IN (%s), LIMIT 12 == LIMIT N"""
+    sql = re.sub(r'\((?:%s, )+%s\)', '(%s)', sql)
+    return re.sub(r'\b(LIMIT|OFFSET) \d+', r'\1 N', sql)
+
+
+class QueryRecorder:
+    """
+    execute_wrapper, запоминающий SQL и стек вызовов в коде проекта.
+
+    Запросы считаются по паре (SQL, место вызова): одинаковый SELECT из
+    разных мест, например пользователь сессии и admin объявления,
+    считается отдельно.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        stack = tuple(
+            frame for frame in traceback.extract_stack()[:-1]
+            if frame.filename.startswith(str(settings.BASE_DIR))
+            and 'site-packages' not in frame.filename
+            and frame.filename != __file__
+        )
+        self.queries.append((normalize_sql(sql), stack))
+        return execute(sql, params, many, context)
+
+    def counts(self):
+        return Counter(
+            (sql, tuple((frame.filename, frame.lineno) for frame in stack)) for sql, stack in self.queries
+        )
+
+    def stack(self, key):
+        sql, site = key
+        return next(
+            stack for query, stack in self.queries
+            if query == sql and tuple((frame.filename, frame.lineno) for frame in stack) == site
+        )
+
+
+def as_json(data):
+    return {'data': json.dumps(data), 'content_type': 'application/json'}
+
+
+def catalog_payload(serializer_class, instance, **overrides):
+    data = dict(serializer_class(instance).data)
+    data.update(overrides)
+    return as_json(data)
+
+
+def images_payload():
+    return {'data': {'images': [SimpleUploadedFile('photo.jpg', b'image', content_type='image/jpeg')]}}
+
+
+# Запрос для каждого маршрута; case — экземпляр QueryCountScalingTest
+ROUTE_REQUESTS = {
+    ('api-root', 'get'): lambda case: ('/api/', {}),
+    ('login', 'post'): lambda case: ('/api/login/', as_json({'email': case.admin.email, 'password': 'secret-pass-123'})),
+    ('logout', 'post'): lambda case: ('/api/logout/', {}),
+    ('profile', 'get'): lambda case: ('/api/profile/', {}),
+    ('token-refresh', 'post'): lambda case: ('/api/token/refresh/', as_json({'refresh': issue_tokens(case.admin)['refresh']})),
+    ('token-revoke', 'post'): lambda case: ('/api/token/revoke/', as_json({'refresh': issue_tokens(case.admin)['refresh']})),
+    ('admin-list', 'get'): lambda case: ('/api/admins/', {}),
+    ('admin-list', 'post'): lambda case: ('/api/admins/', as_json({
+        'email': f'{case.unique()}@example.com', 'password': 'secret-pass-123', 'role': 'admin',
+    })),
+    ('admin-detail', 'get'): lambda case: (f'/api/admins/{case.admin.id}/', {}),
+    ('admin-detail', 'put'): lambda case: (f'/api/admins/{case.admin.id}/', as_json({
+        'email': case.admin.email, 'first_name': 'Анна', 'last_name': 'Иванова', 'role': 'admin',
+    })),
+    ('admin-detail', 'patch'): lambda case: (f'/api/admins/{case.admin.id}/', as_json({'first_name': 'Анна'})),
+    ('admin-detail', 'delete'): lambda case: (f'/api/admins/{case.owner().id}/', {}),
+    ('car-list', 'get'): lambda case: ('/api/cars/', {}),
+    ('car-list', 'post'): lambda case: ('/api/cars/', catalog_payload(
+        CarImportSerializer, case.car, vin=f'NEW{case.unique():014d}'
+    )),
+    ('car-bulk-import', 'post'): lambda case: ('/api/cars/import/', {
+        'data': json.dumps(dict(CarImportSerializer(case.car).data, vin=f'IMP{case.unique():014d}')),
+        'content_type': 'application/x-ndjson',
+    }),
+    ('car-export', 'get'): lambda case: ('/api/cars/export/', {}),
+    ('car-feed', 'get'): lambda case: ('/api/cars/feed/', {}),
+    ('car-stats', 'get'): lambda case: ('/api/cars/stats/?group_by=fuel', {}),
+    ('car-facets', 'get'): lambda case: (f'/api/cars/facets/?brand={case.car.brand}&fuel={case.car.fuel}', {}),
+    ('car-detail', 'get'): lambda case: (f'/api/cars/{case.car.id}/', {}),
+    ('car-detail', 'put'): lambda case: (f'/api/cars/{case.car.id}/', catalog_payload(CarImportSerializer, case.car)),
+    ('car-detail', 'patch'): lambda case: (f'/api/cars/{case.car.id}/', as_json({'price': '9999.00'})),
+    ('car-detail', 'delete'): lambda case: (f'/api/cars/{create_car(case.admin, case.unique()).id}/', {}),
+    ('car-increment-views', 'post'): lambda case: (f'/api/cars/{case.car.id}/increment_views/', {}),
+    ('part-list', 'get'): lambda case: ('/api/parts/', {}),
+    ('part-list', 'post'): lambda case: ('/api/parts/', catalog_payload(PartImportSerializer, case.part)),
+    ('part-bulk-import', 'post'): lambda case: ('/api/parts/import/', {
+        'data': json.dumps(dict(PartImportSerializer(case.part).data)), 'content_type': 'application/x-ndjson',
+    }),
+    ('part-export', 'get'): lambda case: ('/api/parts/export/', {}),
+    ('part-stats', 'get'): lambda case: ('/api/parts/stats/?group_by=category', {}),
+    ('part-facets', 'get'): lambda case: (f'/api/parts/facets/?category={case.part.category}', {}),
+    ('part-detail', 'get'): lambda case: (f'/api/parts/{case.part.id}/', {}),
+    ('part-detail', 'put'): lambda case: (f'/api/parts/{case.part.id}/', catalog_payload(PartImportSerializer, case.part)),
+    ('part-detail', 'patch'): lambda case: (f'/api/parts/{case.part.id}/', as_json({'price': '99.00'})),
+    ('part-detail', 'delete'): lambda case: (f'/api/parts/{create_part(case.admin, case.unique()).id}/', {}),
+    ('part-increment-views', 'post'): lambda case: (f'/api/parts/{case.part.id}/increment_views/', {}),
+    ('image-upload', 'post'): lambda case: ('/api/images/upload/', images_payload()),
+    ('image-delete', 'delete'): lambda case: ('/api/images/delete/', as_json({'imageKey': 'batch/photo.jpg'})),
+    ('async-car-list', 'get'): lambda case: ('/api/async/cars/', {}),
+    ('async-car-stats', 'get'): lambda case: ('/api/async/cars/stats/', {}),
+    ('async-car-detail', 'get'): lambda case: (f'/api/async/cars/{case.car.id}/', {}),
+    ('async-part-list', 'get'): lambda case: ('/api/async/parts/?compact=1', {}),
+    ('async-part-stats', 'get'): lambda case: ('/api/async/parts/stats/', {}),
+    ('async-part-detail', 'get'): lambda case: (f'/api/async/parts/{case.part.id}/', {}),
+    ('async-image-upload', 'post'): lambda case: ('/api/async/images/upload/', images_payload()),
+    ('async-image-delete', 'delete'): lambda case: ('/api/async/images/delete/', as_json({'imageKey': 'batch/photo.jpg'})),
+}
+
+
+class QueryCountScalingTest(TestCase):
+    """
+    Детектор N+1: каждый маршрут cars/urls.py выполняет одинаковое число
+    SQL-запросов на маленьком и большом наборе данных.
+
+    При росте тест падает с текстом повторяющегося запроса и стеком
+    вызова в коде проекта. Новый маршрут нужно добавить в ROUTE_REQUESTS.
+    """
+    sizes = (2, 12)
+
+    def setUp(self):
+        cache.clear()
+        self.counter = 0
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings_override = self.settings(
+            RESPONSE_CACHE_ENABLED=False, IMAGE_STORAGE_BACKEND='cars.images.LocalImageStorage',
+            IMAGE_STORAGE_ROOT=self.root, IMAGE_DERIVATIVES_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = create_admin()
+
+    def unique(self):
+        self.counter += 1
+        return 100000 + self.counter
+
+    def owner(self):
+        """Администратор без пароля: хеширование заметно замедляет заполнение"""
+        email = f'{self.unique()}@example.com'
+        return Admin.objects.create(username=email, email=email)
+
+    def seed(self, size):
+        """Дополнить каталог до size автомобилей и запчастей, у каждой записи свой администратор"""
+        photos = [{'url': 'https://cdn/1.jpg', 'key': '1.jpg', 'derivatives': {'thumb': {'url': 'https://cdn/t.webp'}}}]
+        while Car.objects.count() < size:
+            admin = self.owner()
+            create_car(admin, self.unique(), photos=photos)
+            create_part(admin, self.unique(), photos=photos)
+        self.car = Car.objects.order_by('id').first()
+        self.part = Part.objects.order_by('id').first()
+
+    def record(self, key):
+        url, kwargs = ROUTE_REQUESTS[key](self)
+        self.client.force_login(self.admin)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = getattr(self.client, key[1])(url, **kwargs)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertLess(response.status_code, 400, f'{key}: {response.status_code} {content[:300]}')
+        return recorder
+
+    def scaling_report(self, small, large):
+        """Описание запросов, число которых выросло вместе с данными, или None"""
+        small_counts, large_counts = small.counts(), large.counts()
+        if len(small.queries) == len(large.queries):
+            return None
+        lines = [f'{len(small.queries)} -> {len(large.queries)} SQL-запросов']
+        for key, count in large_counts.items():
+            if count > small_counts.get(key, 0):
+                lines.append(f'\n{small_counts.get(key, 0)} -> {count} раз: {key[0]}')
+                lines.append(''.join(traceback.format_list(large.stack(key))))
+        return '\n'.join(lines)
+
+    def measure(self, keys):
+        recorded = {}
+        for size in self.sizes:
+            self.seed(size)
+            for key in keys:
+                recorded.setdefault(key, []).append(self.record(key))
+        return {key: self.scaling_report(*recorders) for key, recorders in recorded.items()}
+
+    def test_every_route_has_a_request(self):
+        self.assertEqual(route_methods() - set(ROUTE_REQUESTS), set())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for key, report in self.measure(sorted(ROUTE_REQUESTS)).items():
+            with self.subTest(route=key):
+                self.assertIsNone(report, report)
+
+    def test_detector_reports_n_plus_one(self):
+        # Без проекции список обращается к admin отдельным запросом на каждую строку
+        with mock.patch('cars.views.list_projection', lambda queryset, serializer: queryset.select_related(None)), \
+                self.settings(FAST_LIST_SERIALIZATION=False):
+            report = self.measure([('car-list', 'get')])[('car-list', 'get')]
+        self.assertIsNotNone(report)
+        self.assertIn('"cars_admin"', report)
+        self.assertIn('serializers.py', report)
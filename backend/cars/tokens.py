@@ -0,0 +1,126 @@
+"""
+Токены доступа API: подписанный access-токен и непрозрачный refresh-токен с отзывом
+"""
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Admin, AuthToken
+
+ACCESS_SALT = 'cars.tokens.access'
+
+
+class TokenError(Exception):
+    """Токен недействителен, просрочен или отозван"""
+
+
+def access_ttl():
+    return getattr(settings, 'AUTH_ACCESS_TOKEN_TTL', 900)
+
+
+def refresh_ttl():
+    return getattr(settings, 'AUTH_REFRESH_TOKEN_TTL', 30 * 24 * 3600)
+
+
+def state_key(session_id):
+    return f'auth:token:{session_id}'
+
+
+def hash_token(raw):
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def token_pair(session, refresh):
+    access = signing.dumps({'u': session.user_id, 's': session.pk}, salt=ACCESS_SALT)
+    return {'access': access, 'refresh': refresh, 'token_type': 'Bearer', 'expires_in': access_ttl()}
+
+
+def issue_tokens(user, name=''):
+    """Открыть сессию для ``user`` и вернуть пару access/refresh"""
+    refresh = secrets.token_urlsafe(32)
+    session = AuthToken.objects.create(
+        user=user, key_hash=hash_token(refresh), name=name[:200],
+        expires_at=timezone.now() + timedelta(seconds=refresh_ttl()),
+    )
+    return token_pair(session, refresh)
+
+
+def session_active(session_id):
+    """
+    Не отозвана ли сессия: сначала кэш, при промахе — запрос к AuthToken.
+
+    Состояние кэшируется на AUTH_TOKEN_STATE_CACHE_TIMEOUT; отзыв сразу
+    записывает в кэш False, поэтому с общим кэшем (Redis) он действует
+    мгновенно, а с кэшем в памяти процесса — не позже этого таймаута.
+    """
+    active = cache.get(state_key(session_id))
+    if active is None:
+        active = AuthToken.objects.filter(
+            pk=session_id, revoked_at__isnull=True, expires_at__gt=timezone.now()
+        ).exists()
+        cache.set(state_key(session_id), active, getattr(settings, 'AUTH_TOKEN_STATE_CACHE_TIMEOUT', 60))
+    return active
+
+
+def authenticate_access(raw):
+    """
+    Пользователь и id сессии по access-токену.
+
+    Проверка — HMAC подписи и кэш состояния сессии вместо PBKDF2 на
+    каждый запрос; к базе идет один запрос за пользователем.
+    """
+    try:
+        payload = signing.loads(raw, salt=ACCESS_SALT, max_age=access_ttl())
+    except signing.SignatureExpired:
+        raise TokenError('Срок действия токена истек')
+    except signing.BadSignature:
+        raise TokenError('Недействительный токен')
+    if not session_active(payload['s']):
+        raise TokenError('Токен отозван')
+    user = Admin.objects.filter(pk=payload['u'], is_active=True).first()
+    if user is None:
+        raise TokenError('Пользователь не найден или отключен')
+    return user, payload['s']
+
+
+def refresh_tokens(raw):
+    """
+    Обменять refresh-токен на новую пару; старый refresh больше не действует.
+
+    Сессия та же, поэтому уже выданные access-токены работают до истечения.
+    """
+    session = AuthToken.objects.select_related('user').filter(key_hash=hash_token(raw or '')).first()
+    if session is None or not session.is_active or not session.user.is_active:
+        raise TokenError('Недействительный refresh-токен')
+    refresh = secrets.token_urlsafe(32)
+    now = timezone.now()
+    # Условие на старый хеш: из двух одновременных обновлений пройдет одно
+    updated = AuthToken.objects.filter(pk=session.pk, key_hash=session.key_hash).update(
+        key_hash=hash_token(refresh), last_used_at=now, expires_at=now + timedelta(seconds=refresh_ttl()),
+    )
+    if not updated:
+        raise TokenError('Недействительный refresh-токен')
+    return token_pair(session, refresh)
+
+
+def revoke_sessions(sessions):
+    """Отозвать сессии из queryset AuthToken; возвращает их число"""
+    ids = list(sessions.filter(revoked_at__isnull=True).values_list('pk', flat=True))
+    if ids:
+        AuthToken.objects.filter(pk__in=ids).update(revoked_at=timezone.now())
+        timeout = getattr(settings, 'AUTH_TOKEN_STATE_CACHE_TIMEOUT', 60)
+        cache.set_many({state_key(pk): False for pk in ids}, timeout)
+    return len(ids)
+
+
+def revoke_refresh(raw):
+    return revoke_sessions(AuthToken.objects.filter(key_hash=hash_token(raw or '')))
+
+
+def revoke_user_tokens(user):
+    return revoke_sessions(AuthToken.objects.filter(user=user))
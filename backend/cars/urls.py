@@ -2,9 +2,14 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     AdminViewSet, CarViewSet, PartViewSet,
-    LoginView, LogoutView, ProfileView,
+    LoginView, LogoutView, ProfileView, TokenRefreshView, TokenRevokeView,
     ImageUploadView, ImageDeleteView
 )
+from .async_views import (
+    AsyncCatalogListView, AsyncCatalogDetailView, AsyncCatalogStatsView,
+    AsyncImageUploadView, AsyncImageDeleteView
+)
+from .models import Car, Part
 
 router = DefaultRouter()
 router.register(r'admins', AdminViewSet, basename='admin')
@@ -16,6 +21,18 @@ urlpatterns = [
     path('api/login/', LoginView.as_view(), name='login'),
     path('api/logout/', LogoutView.as_view(), name='logout'),
     path('api/profile/', ProfileView.as_view(), name='profile'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('api/token/revoke/', TokenRevokeView.as_view(), name='token-revoke'),
     path('api/images/upload/', ImageUploadView.as_view(), name='image-upload'),
     path('api/images/delete/', ImageDeleteView.as_view(), name='image-delete'),
+
+    # Асинхронные варианты для ASGI-сервера
+    path('api/async/cars/', AsyncCatalogListView.as_view(viewset_class=CarViewSet), name='async-car-list'),
+    path('api/async/cars/stats/', AsyncCatalogStatsView.as_view(model=Car), name='async-car-stats'),
+    path('api/async/cars/<int:pk>/', AsyncCatalogDetailView.as_view(viewset_class=CarViewSet), name='async-car-detail'),
+    path('api/async/parts/', AsyncCatalogListView.as_view(viewset_class=PartViewSet), name='async-part-list'),
+    path('api/async/parts/stats/', AsyncCatalogStatsView.as_view(model=Part), name='async-part-stats'),
+    path('api/async/parts/<int:pk>/', AsyncCatalogDetailView.as_view(viewset_class=PartViewSet), name='async-part-detail'),
+    path('api/async/images/upload/', AsyncImageUploadView.as_view(), name='async-image-upload'),
+    path('api/async/images/delete/', AsyncImageDeleteView.as_view(), name='async-image-delete'),
 ]
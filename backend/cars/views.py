@@ -8,12 +8,26 @@ from django.contrib.auth import authenticate, login, logout
 from .models import Admin, Car, Part
 from .serializers import (
     AdminSerializer, AdminCreateSerializer,
-    CarSerializer, CarListSerializer,
-    PartSerializer, PartListSerializer
+    CarSerializer, CarListSerializer, CarCompactListSerializer, CarImportSerializer,
+    PartSerializer, PartListSerializer, PartCompactListSerializer, PartImportSerializer
 )
-from django.conf import settings
-import boto3
-import os
+from .pagination import CatalogPagination
+from .counters import view_counter
+from .stats import stats_response
+from .facets import facets_response
+from .filters import CarFilter, PartFilter
+from .cache import ResponseCacheMixin
+from .search import CatalogSearchFilter
+from .queries import list_projection
+from .fastpath import FastListMixin
+from .images import ImageStorageError, get_image_storage, upload_images
+from .photos import delete_image
+from .bulk import ImportFormatError, export_response, import_rows, parse_rows
+from .feed import feed_response
+from .authentication import BearerTokenAuthentication
+from .tokens import TokenError, issue_tokens, refresh_tokens, revoke_refresh, revoke_sessions, revoke_user_tokens
+from .models import AuthToken
+import csv
 import uuid
 from django.http import JsonResponse
 
@@ -36,8 +50,7 @@ class LoginView(APIView):
         
         user = authenticate(username=email, password=password)
         if user:
-            login(request, user)
-            return Response({
+            data = {
                 'message': 'Успешный вход',
                 'user': {
                     'id': user.id,
@@ -46,7 +59,13 @@ class LoginView(APIView):
                     'last_name': user.last_name,
                     'role': user.role
                 }
-            })
+            }
+            # {"token": true} — вместо сессии выдать access/refresh-токены для интеграций
+            if request.data.get('token') in (True, 'true', '1', 1):
+                data['tokens'] = issue_tokens(user, name=request.headers.get('User-Agent', ''))
+            else:
+                login(request, user)
+            return Response(data)
         else:
             return Response(
                 {'error': 'Неверные учетные данные'}, 
@@ -60,10 +79,62 @@ class LogoutView(APIView):
     
 
     def post(self, request):
-        logout(request)
+        if isinstance(request.successful_authenticator, BearerTokenAuthentication):
+            revoke_sessions(AuthToken.objects.filter(pk=request.auth))
+        else:
+            logout(request)
         return Response({'message': 'Успешный выход'})
 
 
+def refresh_param(request):
+    """Поле ``refresh`` тела запроса; ValueError, если тело не объект или поле не строка"""
+    if not isinstance(request.data, dict):
+        raise ValueError('Тело запроса должно быть объектом')
+    refresh = request.data.get('refresh')
+    if refresh is not None and not isinstance(refresh, str):
+        raise ValueError('refresh должен быть строкой')
+    return refresh
+
+
+class TokenRefreshView(APIView):
+    """Обмен refresh-токена на новую пару токенов"""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        try:
+            refresh = refresh_param(request)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(refresh_tokens(refresh))
+        except TokenError as error:
+            return Response({'error': str(error)}, status=status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenRevokeView(APIView):
+    """
+    Отзыв токенов: по refresh-токену, текущей сессии access-токена
+    или всех сессий пользователя (``{"all": true}``).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        try:
+            refresh = refresh_param(request)
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        if refresh:
+            revoked = revoke_refresh(refresh)
+        elif request.user.is_authenticated and request.data.get('all') in (True, 'true', '1', 1):
+            revoked = revoke_user_tokens(request.user)
+        elif isinstance(request.successful_authenticator, BearerTokenAuthentication):
+            revoked = revoke_sessions(AuthToken.objects.filter(pk=request.auth))
+        else:
+            return Response({'error': 'Укажите refresh-токен'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'revoked': revoked})
+
+
 class ProfileView(APIView):
     """View для получения профиля пользователя"""
     permission_classes = [permissions.IsAuthenticated]
@@ -79,6 +150,24 @@ class ProfileView(APIView):
         })
 
 
+def bulk_import_response(request, serializer_class, unique_field=None):
+    try:
+        report = import_rows(serializer_class, parse_rows(request), request.user, unique_field=unique_field)
+    except ImportFormatError as error:
+        return Response({'error': str(error)}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    except (UnicodeDecodeError, csv.Error) as error:
+        return Response({'error': f'Ошибка чтения файла: {error}'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(report)
+
+
+def export_queryset_response(request, queryset, serializer_class):
+    output = request.query_params.get('output', 'ndjson')
+    if output not in ('ndjson', 'csv'):
+        return Response({'error': 'output должен быть ndjson или csv'}, status=status.HTTP_400_BAD_REQUEST)
+    fields = ['id'] + serializer_class.Meta.fields + ['views', 'admin_id', 'created_at', 'updated_at']
+    return export_response(queryset, fields, output)
+
+
 class AdminViewSet(viewsets.ModelViewSet):
     """
     ViewSet для управления администраторами.
@@ -109,12 +198,15 @@ class AdminViewSet(viewsets.ModelViewSet):
         return AdminSerializer
 
 
-class CarViewSet(viewsets.ModelViewSet):
+class CarViewSet(ResponseCacheMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления автомобилями.
     
     list:
         Получить список автомобилей с фильтрацией и поиском
+        (?compact=1 — компактное представление, ?fields= — выбор полей)
+    facets:
+        Количество объявлений по значениям фильтров при текущих фильтрах
     create:
         Создать новый автомобиль
     retrieve:
@@ -124,21 +216,27 @@ class CarViewSet(viewsets.ModelViewSet):
     destroy:
         Удалить автомобиль
     """
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['brand', 'model', 'year', 'transmission', 'fuel', 'status', 'admin']
+    filter_backends = [DjangoFilterBackend, CatalogSearchFilter, OrderingFilter]
+    filterset_class = CarFilter
     search_fields = ['brand', 'model', 'vin', 'description']
-    ordering_fields = ['price', 'year', 'mileage', 'created_at', 'views']
+    ordering_fields = ['price', 'price_eur', 'year', 'mileage', 'created_at', 'views']
+    pagination_class = CatalogPagination
     
     def get_queryset(self):
         # type: ignore
-        return Car.objects.select_related('admin')
+        queryset = Car.objects.select_related('admin')
+        if self.action == 'list':
+            queryset = list_projection(queryset, self.get_serializer())
+        elif self.action in ['retrieve', 'update', 'partial_update']:
+            queryset = queryset.prefetch_related('photos')
+        return queryset
     
     def get_permissions(self):
         """
-        Разрешаем публичный доступ для чтения и создания, 
+        Разрешаем публичный доступ для чтения, фида и создания, 
         аутентификация требуется только для редактирования/удаления
         """
-        if self.action in ['list', 'retrieve', 'create']:
+        if self.action in ['list', 'retrieve', 'create', 'feed', 'facets']:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
@@ -146,6 +244,8 @@ class CarViewSet(viewsets.ModelViewSet):
     
     def get_serializer_class(self):
         if self.action == 'list':
+            if self.request.query_params.get('compact') in ('1', 'true'):
+                return CarCompactListSerializer
             return CarListSerializer
         return CarSerializer
     
@@ -159,34 +259,43 @@ class CarViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def increment_views(self, request, pk=None):
         """Увеличить счетчик просмотров"""
-        car = self.get_object()
-        car.views += 1
-        car.save()
-        return Response({'views': car.views})
+        return Response({'views': view_counter.increment(Car, pk)})
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Статистика автомобилей"""
-        # type: ignore
-        total_cars = Car.objects.count()
-        published_cars = Car.objects.filter(status='published').count()
-        draft_cars = Car.objects.filter(status='draft').count()
-        sold_cars = Car.objects.filter(status='sold').count()
-        
-        return Response({
-            'total': total_cars,
-            'published': published_cars,
-            'draft': draft_cars,
-            'sold': sold_cars,
-        })
+        return stats_response(request, Car)
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Счетчики по марке, топливу, коробке, кузову, приводу, состоянию и городу"""
+        return facets_response(request, self, Car)
+    
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """Массовый импорт автомобилей из CSV или NDJSON (upsert по VIN)"""
+        return bulk_import_response(request, CarImportSerializer, unique_field='vin')
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Потоковая выгрузка автомобилей (?output=ndjson|csv) с учетом фильтров"""
+        return export_queryset_response(request, self.filter_queryset(Car.objects.all()), CarImportSerializer)
+    
+    @action(detail=False, methods=['get'])
+    def feed(self, request):
+        """Фид опубликованных автомобилей для площадок (?output=ndjson|csv, ?updated_since=)"""
+        return feed_response(request)
 
 
-class PartViewSet(viewsets.ModelViewSet):
+class PartViewSet(ResponseCacheMixin, FastListMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления запчастями.
     
     list:
         Получить список запчастей с фильтрацией и поиском
+        (?compact=1 — компактное представление, ?fields= — выбор полей)
+    facets:
+        Количество объявлений по значениям фильтров при текущих фильтрах
     create:
         Создать новую запчасть
     retrieve:
@@ -196,21 +305,27 @@ class PartViewSet(viewsets.ModelViewSet):
     destroy:
         Удалить запчасть
     """
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['brand', 'model', 'category', 'condition', 'status', 'admin']
+    filter_backends = [DjangoFilterBackend, CatalogSearchFilter, OrderingFilter]
+    filterset_class = PartFilter
     search_fields = ['name', 'brand', 'model', 'description']
-    ordering_fields = ['price', 'created_at', 'views']
+    ordering_fields = ['price', 'price_eur', 'created_at', 'views']
+    pagination_class = CatalogPagination
     
     def get_queryset(self):
         # type: ignore
-        return Part.objects.select_related('admin')
+        queryset = Part.objects.select_related('admin')
+        if self.action == 'list':
+            queryset = list_projection(queryset, self.get_serializer())
+        elif self.action in ['retrieve', 'update', 'partial_update']:
+            queryset = queryset.prefetch_related('photos')
+        return queryset
     
     def get_permissions(self):
         """
         Разрешаем публичный доступ для чтения, 
         аутентификация требуется только для создания/редактирования/удаления
         """
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'facets']:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
@@ -218,6 +333,8 @@ class PartViewSet(viewsets.ModelViewSet):
     
     def get_serializer_class(self):
         if self.action == 'list':
+            if self.request.query_params.get('compact') in ('1', 'true'):
+                return PartCompactListSerializer
             return PartListSerializer
         return PartSerializer
     
@@ -231,26 +348,27 @@ class PartViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def increment_views(self, request, pk=None):
         """Увеличить счетчик просмотров"""
-        part = self.get_object()
-        part.views += 1
-        part.save()
-        return Response({'views': part.views})
+        return Response({'views': view_counter.increment(Part, pk)})
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Счетчики по марке, категории и состоянию"""
+        return facets_response(request, self, Part)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Статистика запчастей"""
-        # type: ignore
-        total_parts = Part.objects.count()
-        published_parts = Part.objects.filter(status='published').count()
-        draft_parts = Part.objects.filter(status='draft').count()
-        sold_parts = Part.objects.filter(status='sold').count()
-        
-        return Response({
-            'total': total_parts,
-            'draft': draft_parts,
-            'published': published_parts,
-            'sold': sold_parts,
-        })
+        return stats_response(request, Part)
+    
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """Массовый импорт запчастей из CSV или NDJSON"""
+        return bulk_import_response(request, PartImportSerializer)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Потоковая выгрузка запчастей (?output=ndjson|csv) с учетом фильтров"""
+        return export_queryset_response(request, self.filter_queryset(Part.objects.all()), PartImportSerializer)
 
 
 class ImageUploadView(APIView):
@@ -269,65 +387,18 @@ class ImageUploadView(APIView):
                     'error': 'No files provided'
                 }, status=400)
             
-            # Настройки AWS S3
-            if not getattr(settings, 'USE_S3', False):
-                return JsonResponse({
-                    'success': False,
-                    'error': 'S3 upload is disabled. Set USE_S3=True to enable S3 uploads.'
-                }, status=500)
-            
-            if not settings.AWS_ACCESS_KEY_ID or not settings.AWS_SECRET_ACCESS_KEY:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'AWS credentials not configured. Please set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY in environment variables.'
-                }, status=500)
-                
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION
-            )
-            
-            bucket_name = settings.AWS_S3_BUCKET_NAME
-            if not bucket_name:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'AWS S3 bucket not configured'
-                }, status=500)
-            
-            # Проверяем, что bucket существует и доступен
+            # Клиент и проверка bucket кэшируются на процесс
+            storage = get_image_storage()
             try:
-                s3_client.head_bucket(Bucket=bucket_name)
-            except Exception as bucket_error:
+                storage.check()
+            except ImageStorageError as storage_error:
                 return JsonResponse({
                     'success': False,
-                    'error': f'Bucket {bucket_name} not accessible: {str(bucket_error)}'
+                    'error': str(storage_error)
                 }, status=500)
             
-            uploaded_images = []
-            
-            for file in files:
-                # Генерируем уникальное имя файла
-                file_extension = os.path.splitext(file.name)[1]
-                unique_filename = f"{batch_id}/{uuid.uuid4()}{file_extension}"
-                
-                # Загружаем файл в S3
-                s3_client.upload_fileobj(
-                    file,
-                    bucket_name,
-                    unique_filename,
-                    ExtraArgs={
-                        'ContentType': file.content_type
-                    }
-                )
-                
-                # Формируем URL
-                image_url = f"https://{bucket_name}.s3.amazonaws.com/{unique_filename}"
-                uploaded_images.append({
-                    'url': image_url,
-                    'key': unique_filename
-                })
+            # Файлы пачки загружаются параллельно, порядок сохраняется
+            uploaded_images = upload_images(storage, files, batch_id)
             
             return JsonResponse({
                 'success': True,
@@ -356,38 +427,17 @@ class ImageDeleteView(APIView):
                     'error': 'Image key not provided'
                 }, status=400)
             
-            # Настройки AWS S3
-            if not getattr(settings, 'USE_S3', False):
-                return JsonResponse({
-                    'success': False,
-                    'error': 'S3 upload is disabled. Set USE_S3=True to enable S3 uploads.'
-                }, status=500)
-            
-            if not settings.AWS_ACCESS_KEY_ID or not settings.AWS_SECRET_ACCESS_KEY:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'AWS credentials not configured. Please set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY in environment variables.'
-                }, status=500)
-                
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION
-            )
-            
-            bucket_name = settings.AWS_S3_BUCKET_NAME
-            if not bucket_name:
+            storage = get_image_storage()
+            try:
+                storage.check()
+            except ImageStorageError as storage_error:
                 return JsonResponse({
                     'success': False,
-                    'error': 'AWS S3 bucket not configured'
+                    'error': str(storage_error)
                 }, status=500)
             
-            # Удаляем файл из S3
-            s3_client.delete_object(
-                Bucket=bucket_name,
-                Key=image_key
-            )
+            # Удаляем файл из хранилища вместе с производными и ссылками из объявлений
+            delete_image(storage, image_key)
             
             return JsonResponse({
                 'success': True,
@@ -0,0 +1,125 @@
+"""
+Cache backends for CarsPark with hit/miss metrics
+"""
+import logging
+import threading
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+_MISSING = object()
+
+
+def cache_metrics():
+    """
+    Счетчики всех кэшей процесса: ``{alias: {'hits': .., 'misses': .., ...}}``
+    """
+    with _metrics_lock:
+        return {name: dict(counters) for name, counters in _metrics.items()}
+
+
+class MeteredCacheMixin:
+    """
+    Считает попадания, промахи, записи и ошибки бэкенда.
+
+    С опцией ``IGNORE_EXCEPTIONS`` ошибки соединения не пробрасываются
+    ни из одного публичного метода: чтение считается промахом, запись
+    пропускается, и при падении общего кэша приложение (в том числе
+    сессии cached_db) продолжает работать без него.
+    """
+    connection_errors = ()
+
+    def __init__(self, server, params):
+        options = dict(params.get('OPTIONS', {}))
+        self.ignore_exceptions = options.pop('IGNORE_EXCEPTIONS', False)
+        self.metrics_name = options.pop('METRICS_NAME', f'{type(self).__name__}:{server}')
+        super().__init__(server, {**params, 'OPTIONS': options})
+        with _metrics_lock:
+            self.metrics = _metrics.setdefault(self.metrics_name, Counter())
+
+    def count(self, event, amount=1):
+        with _metrics_lock:
+            self.metrics[event] += amount
+
+    def guarded(self, operation, fallback, *args, **kwargs):
+        try:
+            return operation(*args, **kwargs)
+        except self.connection_errors as error:
+            self.count('errors')
+            if not self.ignore_exceptions:
+                raise
+            logger.warning('Кэш %s недоступен: %s', self.metrics_name, error)
+            return fallback
+
+    def get(self, key, default=None, version=None):
+        value = self.guarded(super().get, _MISSING, key, _MISSING, version)
+        self.count('hits' if value is not _MISSING else 'misses')
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.count('sets')
+        return self.guarded(super().set, None, key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.count('sets')
+        return self.guarded(super().add, False, key, value, timeout, version)
+
+    def delete(self, key, version=None):
+        self.count('deletes')
+        return self.guarded(super().delete, False, key, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.guarded(super().incr, 0, key, delta, version)
+
+    def has_key(self, key, version=None):
+        return self.guarded(super().has_key, False, key, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.guarded(super().touch, False, key, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        # При ошибке — все ключи как незаписанные
+        return self.guarded(super().set_many, list(data), data, timeout, version)
+
+    def delete_many(self, keys, version=None):
+        return self.guarded(super().delete_many, None, keys, version)
+
+    def clear(self):
+        return self.guarded(super().clear, None)
+
+
+class MeteredLocMemCache(MeteredCacheMixin, LocMemCache):
+    """Локальный LRU-кэш процесса (вытесняет самые старые по обращению записи)"""
+
+
+class MeteredRedisCache(MeteredCacheMixin, RedisCache):
+    """Общий кэш в Redis (или любом сервере с протоколом Redis)"""
+
+    def get_many(self, keys, version=None):
+        # В отличие от LocMemCache, RedisCache читает пачку одним MGET, минуя get()
+        keys = list(keys)
+        found = self.guarded(super().get_many, {}, keys, version)
+        self.count('hits', len(found))
+        self.count('misses', len(keys) - len(found))
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self.count('sets', len(data))
+        return super().set_many(data, timeout, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.count('deletes', len(keys))
+        return super().delete_many(keys, version)
+
+    @property
+    def connection_errors(self):
+        import redis
+
+        return (redis.ConnectionError, redis.TimeoutError)
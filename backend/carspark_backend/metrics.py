@@ -0,0 +1,234 @@
+"""
+Request metrics for CarsPark in Prometheus text format
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_lock = threading.Lock()
+_registry = []
+
+current_request = ContextVar('current_request_stats', default=None)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_string(names, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.samples = {}
+        with _lock:
+            _registry.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with _lock:
+            samples = sorted(self.samples.items())
+        for values, sample in samples:
+            lines.extend(self.render_sample(values, sample))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels, amount=1):
+        with _lock:
+            self.samples[labels] = self.samples.get(labels, 0) + amount
+
+    def render_sample(self, values, sample):
+        return [f'{self.name}{label_string(self.labels, values)} {format_value(sample)}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        with _lock:
+            sample = self.samples.get(labels)
+            if sample is None:
+                sample = self.samples[labels] = {'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample['buckets'][index] += 1
+            sample['sum'] += value
+            sample['count'] += 1
+
+    def render_sample(self, values, sample):
+        lines = [
+            f'{self.name}_bucket{label_string(self.labels, values, [("le", bound)])} {count}'
+            for bound, count in zip(self.buckets, sample['buckets'])
+        ]
+        lines.append(f'{self.name}_bucket{label_string(self.labels, values, [("le", "+Inf")])} {sample["count"]}')
+        lines.append(f'{self.name}_sum{label_string(self.labels, values)} {format_value(sample["sum"])}')
+        lines.append(f'{self.name}_count{label_string(self.labels, values)} {sample["count"]}')
+        return lines
+
+
+REQUESTS = Counter(
+    'carspark_http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status')
+)
+DURATION = Histogram(
+    'carspark_http_request_duration_seconds', 'Request latency', ('method', 'route'), DURATION_BUCKETS
+)
+DB_QUERIES = Histogram(
+    'carspark_http_request_db_queries', 'SQL queries per request', ('method', 'route'), QUERY_BUCKETS
+)
+DB_SECONDS = Counter(
+    'carspark_http_request_db_seconds_total', 'Time spent in SQL queries', ('method', 'route')
+)
+SERIALIZER_SECONDS = Counter(
+    'carspark_http_request_serializer_seconds_total', 'Time spent serializing responses', ('method', 'route')
+)
+RESPONSE_SIZE = Histogram(
+    'carspark_http_response_size_bytes', 'Response body size', ('method', 'route'), SIZE_BUCKETS
+)
+
+
+class RequestStats:
+    """Счетчики одного запроса: SQL, сериализация и общее время"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = {}
+
+    def add_timing(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """
+    Обертка ``execute_wrapper`` для всех соединений процесса.
+
+    Запрос засчитывается текущему HTTP-запросу из ``current_request``;
+    контекст переходит и в потоки ``sync_to_async``, поэтому учитываются
+    и запросы асинхронных представлений.
+    """
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_wrapper(connection, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+@contextmanager
+def timer(name):
+    """Добавить время блока к метрике ``name`` текущего запроса (например, ``serializer``)"""
+    stats = current_request.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_timing(name, time.perf_counter() - started)
+
+
+def record(request, response, stats):
+    """Записать запрос в метрики процесса и вернуть его длительность"""
+    duration = time.perf_counter() - stats.started
+    match = getattr(request, 'resolver_match', None)
+    route = (match.view_name or match.route) if match else 'unmatched'
+    labels = (request.method, route)
+    REQUESTS.inc(labels + (str(response.status_code),))
+    DURATION.observe(labels, duration)
+    DB_QUERIES.observe(labels, stats.queries)
+    DB_SECONDS.inc(labels, stats.db_time)
+    SERIALIZER_SECONDS.inc(labels, stats.timings.get('serializer', 0.0))
+    if not response.streaming:
+        RESPONSE_SIZE.observe(labels, len(response.content))
+    return duration
+
+
+def debug_headers(response, stats, duration):
+    """Заголовки с показателями запроса (METRICS_DEBUG_HEADERS); Server-Timing виден в DevTools"""
+    timing = [f'total;dur={duration * 1000:.1f}', f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"']
+    timing += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in stats.timings.items()]
+    response['Server-Timing'] = ', '.join(timing)
+    response['X-DB-Queries'] = str(stats.queries)
+    if not response.streaming:
+        response['X-Response-Size'] = str(len(response.content))
+
+
+def cache_lines():
+    from cars.cache import response_cache_metrics
+
+    from .cache import cache_metrics
+
+    lines = [
+        '# HELP carspark_cache_events_total Cache backend events',
+        '# TYPE carspark_cache_events_total counter',
+    ]
+    for name, counters in sorted(cache_metrics().items()):
+        for event, value in sorted(counters.items()):
+            lines.append(f'carspark_cache_events_total{label_string(("cache", "event"), (name, event))} {value}')
+    lines += [
+        '# HELP carspark_response_cache_total API response cache lookups',
+        '# TYPE carspark_response_cache_total counter',
+    ]
+    for outcome, value in sorted(response_cache_metrics().items()):
+        lines.append(f'carspark_response_cache_total{label_string(("outcome",), (outcome,))} {value}')
+    return lines
+
+
+def render_metrics():
+    """
+    Все метрики процесса в текстовом формате Prometheus.
+
+    Значения хранятся в памяти процесса: при нескольких воркерах каждый
+    отдает свои, и Prometheus опрашивает их по отдельности.
+    """
+    with _lock:
+        metrics = list(_registry)
+    lines = [line for metric in metrics for line in metric.render()]
+    return '\n'.join(lines + cache_lines()) + '\n'
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
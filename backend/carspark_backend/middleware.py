@@ -0,0 +1,89 @@
+"""
+Middleware for CarsPark
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .metrics import RequestStats, current_request, debug_headers, install_query_wrapper, record
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, который не переводит ASGI-запросы в поток.
+
+    Исходный WhiteNoiseMiddleware только синхронный, и Django из-за него
+    выполняет всю цепочку middleware и асинхронные представления через
+    поток на запрос. Здесь в асинхронном режиме статика отдается в потоке,
+    а остальные запросы идут дальше без переключения.
+    """
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+    Метрики каждого запроса по маршруту: латентность, число и время
+    SQL-запросов, время сериализации и размер ответа (см. ``metrics.py``).
+
+    С ``METRICS_DEBUG_HEADERS`` те же показатели возвращаются в заголовках
+    ``Server-Timing``, ``X-DB-Queries`` и ``X-Response-Size``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Соединение потока могло открыться до подключения обработчика connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        duration = record(request, response, stats)
+        if getattr(settings, 'METRICS_DEBUG_HEADERS', False):
+            debug_headers(response, stats, duration)
+        return response
@@ -0,0 +1,153 @@
+"""
+Precomputed OpenAPI schema for CarsPark: generated once per code version, served with ETag
+"""
+import hashlib
+import importlib.util
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+import django
+import drf_spectacular
+import rest_framework
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+# Пакеты, от кода которых зависит схема: представления, сериализаторы, urls
+SOURCE_PACKAGES = ('cars', 'carspark_backend')
+SCHEMA_RENDERERS = {'yaml': OpenApiYamlRenderer, 'json': OpenApiJsonRenderer}
+
+_lock = threading.Lock()
+_schemas = {}
+
+
+@lru_cache(maxsize=None)
+def source_digest():
+    """Хеш исходников SOURCE_PACKAGES, версий библиотек и SPECTACULAR_SETTINGS"""
+    digest = hashlib.sha256()
+    for name in (django.get_version(), rest_framework.VERSION, drf_spectacular.__version__):
+        digest.update(name.encode())
+    digest.update(repr(sorted(settings.SPECTACULAR_SETTINGS.items())).encode())
+    for package in SOURCE_PACKAGES:
+        root = Path(importlib.util.find_spec(package).origin).parent
+        for path in sorted(root.rglob('*.py')):
+            digest.update(str(path.relative_to(root)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def code_version():
+    """
+    Версия кода, к которой привязана схема.
+
+    APP_VERSION (например, git SHA из CI) или хеш исходников: схема
+    генерируется заново только после изменения кода.
+    """
+    return getattr(settings, 'APP_VERSION', '') or source_digest()[:16]
+
+
+def schema_path(version, fmt, directory=None):
+    directory = directory or getattr(settings, 'OPENAPI_SCHEMA_DIR', Path(settings.BASE_DIR) / 'openapi')
+    return Path(directory) / f'schema-{version}.{fmt}'
+
+
+def schema_key(version, fmt):
+    return f'openapi:schema:{version}:{fmt}'
+
+
+def generate_schema():
+    """Схема в каждом формате: {'yaml': bytes, 'json': bytes}"""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=spectacular_settings.SERVE_URLCONF)
+    schema = generator.get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+    return {
+        fmt: renderer().render(schema, renderer().media_type, {})
+        for fmt, renderer in SCHEMA_RENDERERS.items()
+    }
+
+
+def schema_entry(body):
+    return hashlib.md5(body).hexdigest(), body
+
+
+def get_schema(fmt):
+    """
+    ETag и тело схемы в формате ``fmt`` для текущей версии кода.
+
+    Порядок поиска: память процесса, общий кэш, файл из
+    ``manage.py generate_openapi_schema``; если нигде нет — генерация
+    (один раз на процесс) с записью в кэш без срока.
+    """
+    version = code_version()
+    entry = _schemas.get((version, fmt))
+    if entry is not None:
+        return entry
+    with _lock:
+        entry = _schemas.get((version, fmt))
+        if entry is None:
+            entry = cache.get(schema_key(version, fmt))
+        if entry is None:
+            path = schema_path(version, fmt)
+            if path.is_file():
+                entry = schema_entry(path.read_bytes())
+                cache.set(schema_key(version, fmt), entry, timeout=None)
+        if entry is None:
+            entries = {key: schema_entry(body) for key, body in generate_schema().items()}
+            cache.set_many({schema_key(version, key): value for key, value in entries.items()}, timeout=None)
+            _schemas.update({(version, key): value for key, value in entries.items()})
+            entry = entries[fmt]
+        _schemas[(version, fmt)] = entry
+    return entry
+
+
+def write_schema_files(directory=None):
+    """Сгенерировать схему в ``directory`` и удалить файлы прежних версий"""
+    version = code_version()
+    paths = []
+    for fmt, body in generate_schema().items():
+        path = schema_path(version, fmt, directory)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+        paths.append(path)
+    for stale in paths[0].parent.glob('schema-*.*'):
+        if stale not in paths:
+            os.remove(stale)
+    return paths
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    /api/schema/ без генерации на каждый запрос.
+
+    Схема берется из get_schema; повторный запрос с If-None-Match получает
+    304. Параметры ``lang`` и ``version`` и OPENAPI_SCHEMA_CACHE=False
+    включают прежнюю генерацию на лету.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if (
+            not getattr(settings, 'OPENAPI_SCHEMA_CACHE', True)
+            or request.GET.get('lang') or request.GET.get('version')
+        ):
+            return super().get(request, *args, **kwargs)
+
+        renderer = request.accepted_renderer
+        etag, body = get_schema(renderer.format)
+        etag = f'"{etag}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=304)
+        else:
+            content_type = request.accepted_media_type
+            if renderer.charset:
+                content_type = f'{content_type}; charset={renderer.charset}'
+            response = HttpResponse(body, content_type=content_type)
+            response['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,138 @@
+"""
+Production application server settings for CarsPark (gunicorn, see gunicorn.conf.py)
+"""
+import math
+import os
+
+WORKER_CLASSES = {
+    # WSGI: фиксированный пул потоков на воркер, постоянные соединения с базой
+    # (DB_CONNECTION_MODE=persistent) по одному на поток; /api/async/ работает
+    # через async_to_sync без выигрыша в параллельности
+    'gthread': 'gthread',
+    # ASGI: /api/async/ ждет S3 и базу без занятых потоков. Синхронные
+    # представления идут в отдельных потоках на запрос, поэтому постоянные
+    # соединения не переиспользуются и копятся — с PostgreSQL
+    # tuned_settings требует DB_CONNECTION_MODE=none
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+
+def read_file(path):
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit():
+    """
+    Доступные процессу ядра: affinity и квота cgroup (лимит ``cpus`` контейнера).
+
+    Дробная квота округляется вверх: 0.5 CPU — это один воркер.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    cpu_max = read_file('/sys/fs/cgroup/cpu.max')
+    if cpu_max:
+        limit, _space, period = cpu_max.partition(' ')
+        if limit != 'max' and period:
+            quota = int(limit) / int(period)
+    else:
+        limit = read_file('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        period = read_file('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if limit and period and int(limit) > 0:
+            quota = int(limit) / int(period)
+    if quota:
+        cpus = min(cpus, max(math.ceil(quota), 1))
+    return cpus
+
+
+def memory_limit():
+    """Память контейнера (memory.max cgroup) или всей машины в байтах; None, если неизвестно"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        value = read_file(path)
+        # Без лимита cgroup v1 отдает почти 2**63
+        if value and value != 'max' and int(value) < 1 << 60:
+            return int(value)
+    meminfo = read_file('/proc/meminfo') or ''
+    for line in meminfo.splitlines():
+        if line.startswith('MemTotal:'):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+def worker_counts(cpus, memory, worker_memory, worker_class='gthread', max_db_connections=None):
+    """
+    Число воркеров и потоков для ``cpus`` ядер и ``memory`` байт.
+
+    Воркеров 2 * CPU + 1, но не больше, чем помещается в 75% памяти при
+    ``worker_memory`` байт на воркер. У gthread по 2 потока на ядро,
+    не меньше 2: запросы ждут базу и S3, а не процессор. Если задан
+    ``max_db_connections``, воркеры и потоки уменьшаются, чтобы постоянные
+    соединения (по одному на поток) поместились в лимит PostgreSQL.
+    """
+    workers = 2 * cpus + 1
+    if memory and worker_memory:
+        workers = min(workers, int(memory * 0.75 // worker_memory))
+    workers = max(workers, 1)
+    threads = max(2, 2 * cpus) if worker_class == 'gthread' else 1
+    if max_db_connections:
+        threads = max(min(threads, max_db_connections // workers), 1)
+        workers = max(min(workers, max_db_connections // threads), 1)
+    return workers, threads
+
+
+def env_int(environ, name, default=None):
+    value = environ.get(name)
+    return int(value) if value else default
+
+
+def tuned_settings(environ=os.environ):
+    """
+    Настройки gunicorn из окружения; незаданные воркеры и потоки подбираются
+    по CPU и памяти контейнера.
+    """
+    worker_class = environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f'Unknown GUNICORN_WORKER_CLASS: {worker_class} (expected gthread or uvicorn)')
+    connection_mode = environ.get('DB_CONNECTION_MODE', 'persistent')
+    if worker_class == 'uvicorn' and environ.get('DATABASE_URL') and connection_mode != 'none':
+        raise ValueError(
+            f'GUNICORN_WORKER_CLASS=uvicorn leaks DB_CONNECTION_MODE={connection_mode} connections; '
+            'set DB_CONNECTION_MODE=none'
+        )
+    cpus = cpu_limit()
+    max_db_connections = env_int(environ, 'GUNICORN_MAX_DB_CONNECTIONS')
+    workers, threads = worker_counts(
+        cpus,
+        memory_limit(),
+        env_int(environ, 'GUNICORN_WORKER_MEMORY_MB', 200) * 1024 * 1024,
+        worker_class,
+        max_db_connections,
+    )
+    explicit_workers = env_int(environ, 'GUNICORN_WORKERS') or env_int(environ, 'WEB_CONCURRENCY')
+    explicit_threads = env_int(environ, 'GUNICORN_THREADS')
+    workers = explicit_workers or workers
+    threads = explicit_threads or threads
+    if max_db_connections:
+        # Подобранное значение подгоняется под явно заданное, явно заданные — только проверяются
+        if explicit_workers and not explicit_threads:
+            threads = max(min(threads, max_db_connections // workers), 1)
+        elif explicit_threads and not explicit_workers:
+            workers = max(min(workers, max_db_connections // threads), 1)
+        if workers * threads > max_db_connections:
+            raise ValueError(
+                f'{workers} workers x {threads} threads exceed GUNICORN_MAX_DB_CONNECTIONS={max_db_connections}'
+            )
+    return {
+        'worker_class': WORKER_CLASSES[worker_class],
+        'wsgi_app': 'carspark_backend.asgi:application' if worker_class == 'uvicorn'
+        else 'carspark_backend.wsgi:application',
+        'workers': workers,
+        'threads': threads,
+        'cpus': cpus,
+    }
@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+from decouple import Csv, config
 from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,9 +50,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'carspark_backend.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'carspark_backend.middleware.AsyncWhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',  # Включаем CSRF обратно
@@ -88,6 +89,7 @@ WSGI_APPLICATION = 'carspark_backend.wsgi.application'
 # Database configuration
 import os
 from urllib.parse import urlparse
+from django.core.exceptions import ImproperlyConfigured
 
 # Check if DATABASE_URL is provided (for production/Docker)
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -105,12 +107,23 @@ if DATABASE_URL:
             'PORT': url.port or '5432',
         }
     }
+
+    # Управление соединениями:
+    #   persistent — соединение живет DB_CONN_MAX_AGE секунд и переиспользуется
+    #                между запросами, перед переиспользованием проверяется
+    #   none       — новое соединение на каждый запрос
+    DB_CONNECTION_MODE = config('DB_CONNECTION_MODE', default='persistent')
+    if DB_CONNECTION_MODE == 'persistent':
+        DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+        DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    elif DB_CONNECTION_MODE != 'none':
+        raise ImproperlyConfigured(f'Unknown DB_CONNECTION_MODE: {DB_CONNECTION_MODE}')
 else:
     # Use SQLite for development
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
         }
     }
 
@@ -173,6 +186,7 @@ CORS_ALLOW_HEADERS = list(default_headers) + [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'cars.authentication.CsrfExemptSessionAuthentication',
+        'cars.authentication.BearerTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -183,12 +197,107 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Токены API (POST /api/login/ с {"token": true}): время жизни access и refresh в секундах
+AUTH_ACCESS_TOKEN_TTL = config('AUTH_ACCESS_TOKEN_TTL', default=900, cast=int)
+AUTH_REFRESH_TOKEN_TTL = config('AUTH_REFRESH_TOKEN_TTL', default=30 * 24 * 3600, cast=int)
+# Сколько секунд кэшируется состояние сессии токена (отозвана или нет)
+AUTH_TOKEN_STATE_CACHE_TIMEOUT = config('AUTH_TOKEN_STATE_CACHE_TIMEOUT', default=60, cast=int)
+
+# Счетчик просмотров: буферизация приращений в памяти процесса
+VIEW_COUNTER_BUFFERED = config('VIEW_COUNTER_BUFFERED', default=False, cast=bool)
+VIEW_COUNTER_FLUSH_INTERVAL = config('VIEW_COUNTER_FLUSH_INTERVAL', default=5, cast=float)
+VIEW_COUNTER_MAX_PENDING = config('VIEW_COUNTER_MAX_PENDING', default=1000, cast=int)
+
+# Метрики запросов (/metrics в формате Prometheus)
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+# Заголовки Server-Timing/X-DB-Queries в каждом ответе; раскрывают число SQL-запросов
+# и тайминги, поэтому включаются только явно (локальная отладка, нагрузочные тесты)
+METRICS_DEBUG_HEADERS = config('METRICS_DEBUG_HEADERS', default=False, cast=bool)
+# Если задан, /metrics требует заголовок Authorization: Bearer <токен>
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# С REDIS_URL кэш общий для всех контейнеров backend, иначе — LRU в памяти процесса
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'carspark_backend.cache.MeteredRedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'carspark',
+            'OPTIONS': {
+                'IGNORE_EXCEPTIONS': config('CACHE_IGNORE_EXCEPTIONS', default=True, cast=bool),
+                'METRICS_NAME': 'default',
+                'socket_connect_timeout': 1,
+                'socket_timeout': 1,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': config('CACHE_BACKEND', default='carspark_backend.cache.MeteredLocMemCache'),
+            'LOCATION': config('CACHE_LOCATION', default='carspark'),
+            'OPTIONS': {
+                'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=5000, cast=int),
+                'METRICS_NAME': 'default',
+            },
+        }
+    }
+
+# Sessions: db, cached_db (чтение из кэша, запись в БД) или cache
+SESSION_STORE = config('SESSION_STORE', default='cached_db' if REDIS_URL else 'db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_STORE}'
+
+# Кэш ответов list/retrieve каталога для анонимных пользователей
+RESPONSE_CACHE_ENABLED = config('RESPONSE_CACHE_ENABLED', default=True, cast=bool)
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=60, cast=int)
+
+# Сборка ответов списков каталога из .values() без создания моделей
+FAST_LIST_SERIALIZATION = config('FAST_LIST_SERIALIZATION', default=True, cast=bool)
+
+# Массовый импорт и экспорт каталога
+BULK_IMPORT_CHUNK_SIZE = config('BULK_IMPORT_CHUNK_SIZE', default=500, cast=int)
+BULK_EXPORT_CHUNK_SIZE = config('BULK_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# Журнал удаленных автомобилей для ?updated_since= фида; более старый запрос получает 410
+FEED_TOMBSTONE_RETENTION_DAYS = config('FEED_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Кэш статистики каталога (инвалидируется сигналами сохранения/удаления)
+STATS_CACHE_TIMEOUT = config('STATS_CACHE_TIMEOUT', default=300, cast=int)
+# Кэш фасетов панели фильтров, по ключу на нормализованный набор фильтров
+FACETS_CACHE_TIMEOUT = config('FACETS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Курсы к евро для price_eur (cars.pricing); строки таблицы ExchangeRate
+# (manage.py set_exchange_rates или админка) переопределяют эти значения
+EXCHANGE_RATES_DEFAULT = {'EUR': '1', 'USD': '0.92', 'RUB': '0.0105'}
+EXCHANGE_RATES_CACHE_TIMEOUT = config('EXCHANGE_RATES_CACHE_TIMEOUT', default=300, cast=int)
+
 # AWS S3 Configuration
 AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID', default='')
 AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY', default='')
 AWS_REGION = config('AWS_REGION', default='eu-west-1')
 AWS_S3_BUCKET_NAME = config('AWS_S3_BUCKET_NAME', default='aslan-auto-img')
 
+# Хранилище фотографий объявлений (cars.images): S3 или локальная папка
+IMAGE_STORAGE_BACKEND = config('IMAGE_STORAGE_BACKEND', default='cars.images.S3ImageStorage')
+IMAGE_UPLOAD_WORKERS = config('IMAGE_UPLOAD_WORKERS', default=4, cast=int)
+# Потоки, в которых асинхронные представления ждут ответа хранилища
+IMAGE_STORAGE_IO_WORKERS = config('IMAGE_STORAGE_IO_WORKERS', default=32, cast=int)
+
+# Производные фотографий (thumb/card/full) создаются в фоне после загрузки
+IMAGE_DERIVATIVES_ENABLED = config('IMAGE_DERIVATIVES_ENABLED', default=True, cast=bool)
+IMAGE_DERIVATIVES_ASYNC = config('IMAGE_DERIVATIVES_ASYNC', default=True, cast=bool)
+IMAGE_DERIVATIVE_FORMAT = config('IMAGE_DERIVATIVE_FORMAT', default='WEBP')
+IMAGE_DERIVATIVE_QUALITY = config('IMAGE_DERIVATIVE_QUALITY', default=82, cast=int)
+IMAGE_DERIVATIVE_WORKERS = config('IMAGE_DERIVATIVE_WORKERS', default=2, cast=int)
+
+# Сборка мусора в хранилище (manage.py collect_orphan_images): файлы без ссылок
+# старше срока удаляются; static/ и media/ лежат в том же бакете и не трогаются
+IMAGE_GC_GRACE_HOURS = config('IMAGE_GC_GRACE_HOURS', default=24, cast=float)
+IMAGE_GC_EXCLUDE_PREFIXES = config('IMAGE_GC_EXCLUDE_PREFIXES', default='static/,media/', cast=Csv())
+
 # AWS S3 Static Files Configuration
 # Отключаем S3 для локальной разработки
 USE_S3 = config('USE_S3', default=False, cast=bool)
@@ -228,6 +337,13 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
 }
 
+# /api/schema/ отдает схему, сгенерированную один раз на версию кода
+# (manage.py generate_openapi_schema при сборке образа или первый запрос), с ETag.
+# Версия — APP_VERSION или хеш исходников
+OPENAPI_SCHEMA_CACHE = config('OPENAPI_SCHEMA_CACHE', default=True, cast=bool)
+OPENAPI_SCHEMA_DIR = config('OPENAPI_SCHEMA_DIR', default=str(BASE_DIR / 'openapi'))
+APP_VERSION = config('APP_VERSION', default='')
+
 # CSRF settings
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:3000",
@@ -17,7 +17,10 @@ from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from drf_spectacular.views import SpectacularSwaggerView, SpectacularRedocView
+
+from .metrics import metrics_view
+from .schema import CachedSpectacularAPIView
 
 
 urlpatterns = [
@@ -25,9 +28,12 @@ urlpatterns = [
     path('', include('cars.urls')),
     
     # API Documentation
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+
+    # Метрики для Prometheus
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Добавляем медиа файлы для разработки
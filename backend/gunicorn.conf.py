@@ -0,0 +1,71 @@
+"""
+Gunicorn configuration for the production image
+
+Запуск: gunicorn -c gunicorn.conf.py
+Воркеры и потоки подбираются по CPU и памяти контейнера (carspark_backend.server),
+переопределяются GUNICORN_WORKERS / GUNICORN_THREADS. Класс воркера —
+GUNICORN_WORKER_CLASS: gthread (WSGI, по умолчанию) или uvicorn (ASGI;
+с PostgreSQL только при DB_CONNECTION_MODE=none, иначе запуск прерывается).
+"""
+import os
+
+from carspark_backend.server import tuned_settings
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carspark_backend.settings')
+
+_tuned = tuned_settings()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+wsgi_app = _tuned['wsgi_app']
+worker_class = _tuned['worker_class']
+workers = _tuned['workers']
+threads = _tuned['threads']
+
+# Приложение импортируется в мастере один раз; воркеры получают готовый код
+# через fork (copy-on-write) и стартуют быстрее
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Перезапуск воркера после N запросов (с разбросом, чтобы не все сразу)
+# ограничивает рост памяти; текущие запросы дорабатываются до graceful_timeout
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# nginx держит к backend постоянные соединения (upstream keepalive, keepalive_timeout 60s);
+# воркер должен закрывать простаивающее соединение позже nginx, иначе nginx
+# отправит запрос в уже закрытый сокет и вернет 502
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 75))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+
+# Заголовки X-Forwarded-* принимаются от nginx из сети docker
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '*')
+# Heartbeat воркеров в памяти, а не на overlay-диске контейнера
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    server.log.info(
+        'CarsPark: %s workers x %s threads (%s, %s CPU)', workers, threads, worker_class, _tuned['cpus']
+    )
+
+
+def post_fork(server, worker):
+    # Соединения, открытые в мастере при preload, не должны делиться между процессами
+    from django.db import connections
+
+    connections.close_all()
+
+
+def worker_exit(server, worker):
+    # Буферизованные просмотры записываются до перезапуска воркера по max_requests
+    from cars.counters import view_counter
+
+    try:
+        view_counter.flush()
+    except Exception:
+        worker.log.exception('Не удалось сохранить счетчики просмотров')
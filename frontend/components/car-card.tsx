@@ -49,10 +49,10 @@ export function CarCard({ car }: CarCardProps) {
           )}
           
           {/* Индикатор количества фото */}
-          {car.photos && car.photos.length > 1 && (
+          {(car.photos_count ?? car.photos?.length ?? 0) > 1 && (
             <div className="absolute top-2 left-2 bg-black bg-opacity-50 text-white text-xs px-2 py-1 rounded flex items-center gap-1">
               <Camera className="h-3 w-3" />
-              {car.photos.length}
+              {car.photos_count ?? car.photos.length}
             </div>
           )}
           
@@ -22,6 +22,8 @@ interface Part {
   city: string
   description: string
   photos: string[]
+  // В списках photos содержит только обложку, общее число — в photos_count
+  photos_count?: number
   status: string
   views: number
   createdAt: string
@@ -90,10 +92,10 @@ export function PartCard({ part, viewMode = 'grid' }: PartCardProps) {
           )}
           
           {/* Индикатор количества фото */}
-          {part.photos && part.photos.length > 1 && (
+          {(part.photos_count ?? part.photos?.length ?? 0) > 1 && (
             <div className="absolute top-2 left-2 bg-black bg-opacity-50 text-white text-xs px-2 py-1 rounded flex items-center gap-1">
               <Camera className="h-3 w-3" />
-              {part.photos.length}
+              {part.photos_count ?? part.photos.length}
             </div>
           )}
           
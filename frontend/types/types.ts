@@ -42,7 +42,9 @@ export interface Car {
   negotiable: boolean
   city: string
   description: string
+  // В списках — только обложка; общее число фотографий в photos_count
   photos: string[]
+  photos_count?: number
   status: 'draft' | 'published' | 'sold'
   views: number
   admin: Admin
@@ -84,7 +86,9 @@ export interface Part {
   negotiable: boolean
   city: string
   description: string
+  // В списках — только обложка; общее число фотографий в photos_count
   photos: string[]
+  photos_count?: number
   status: 'draft' | 'published' | 'sold'
   views: number
   admin: Admin